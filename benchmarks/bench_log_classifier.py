@@ -0,0 +1,160 @@
+"""
+Micro-benchmark: replays an openfortivpn log through the old per-line regex
+fan-out (cert regex + interface/IP regexes + substring check), through
+log_classifier (one alternation of every keyword, run with finditer over
+each reader-sized batch) and through the per-keyword str.find() scans it
+replaced.
+
+The classifier checks all of its rules, the old fan-out only five, and
+runs in the reader thread instead of the GUI thread. On CPython the
+single pass costs about 1.5-2x the str.find() scans per line; it reads
+each batch once and never needs the position sort.
+
+Usage:
+    python benchmarks/bench_log_classifier.py [--log captured.log] [--lines 500000]
+
+Without --log, a representative verbose (-v -v) session is repeated until
+the requested number of lines is reached.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import log_classifier
+from log_classifier import classify_lines
+
+BATCH_SIZE = 200 # Same as VPNRunner.BATCH_MAX_LINES
+
+SAMPLE_LOG = """\
+DEBUG:  openfortivpn 1.21.0
+DEBUG:  Loaded configuration file "/proc/self/fd/0".
+DEBUG:  Resolving gateway host ip
+DEBUG:  Establishing ssl connection
+DEBUG:  SSL_connect: success
+DEBUG:  Gateway certificate validation succeeded.
+INFO:   Connected to gateway.
+DEBUG:  Cookie: SVPNCOOKIE=7a3f1d4e...
+INFO:   Authenticated.
+DEBUG:  Cookie: SVPNCOOKIE=7a3f1d4e...
+INFO:   Remote gateway has allocated a VPN.
+DEBUG:  Gateway certificate validation succeeded.
+DEBUG:  pppd_read_thread
+DEBUG:  gw ---> pppd (24 bytes)
+DEBUG:  ff 03 c0 21 01 01 00 14 02 06 00 00 00 00 05 06 1c 7f 3e 91
+DEBUG:  pppd ---> gw (20 bytes)
+DEBUG:  ff 03 c0 21 02 01 00 14 02 06 00 00 00 00 05 06 1c 7f 3e 91
+Using interface ppp0
+Connect: ppp0 <--> /dev/pts/3
+INFO:   Got addresses: [10.212.134.200], ns [10.0.0.53, 10.0.0.54]
+INFO:   Negotiation complete.
+local  IP address 10.212.134.200
+remote IP address 192.0.2.1
+INFO:   Interface ppp0 is UP.
+INFO:   Setting new routes...
+INFO:   Adding VPN nameservers...
+INFO:   Tunnel is up and running.
+DEBUG:  gw ---> pppd (96 bytes)
+DEBUG:  45 00 00 5c 8f 21 40 00 3f 06 a1 c3 0a 00 00 35 0a d4 86 c8
+DEBUG:  pppd ---> gw (84 bytes)
+DEBUG:  45 00 00 54 12 9a 40 00 40 01 2b 0e 0a d4 86 c8 0a 00 00 35
+DEBUG:  gw ---> pppd (1400 bytes)
+DEBUG:  pppd ---> gw (52 bytes)
+ERROR:  Gateway certificate validation failed, and the certificate digest is not in the local whitelist.
+ERROR:      trusted-cert = 18b3ca13afe20180d70f1efbb949b9dcafb793d0aae246518b6ef909646f23b8
+"""
+
+
+def old_path(lines):
+    cert_regex = re.compile(r"(?:--trusted-cert\s+|trusted-cert\s*=\s*)([a-f0-9]{64})")
+    re_interface = re.compile(r"Using interface (ppp\d+|tun\d+)")
+    re_local_ip = re.compile(r"local  IP address ([\d\.]+)")
+    re_remote_ip = re.compile(r"remote IP address ([\d\.]+)")
+    hits = 0
+    for line in lines:
+        if cert_regex.search(line):
+            hits += 1
+        if re_interface.search(line):
+            hits += 1
+        if re_local_ip.search(line):
+            hits += 1
+        if re_remote_ip.search(line):
+            hits += 1
+        if "Tunnel is up and running" in line:
+            hits += 1
+    return hits
+
+
+def new_path(lines, batch_size=BATCH_SIZE):
+    hits = 0
+    for i in range(0, len(lines), batch_size):
+        for event, _ in classify_lines(lines[i:i + batch_size]):
+            if event in ("cert_error", "interface", "local_ip", "remote_ip", "tunnel_up"):
+                hits += 1
+    return hits
+
+
+def find_path(lines, batch_size=BATCH_SIZE):
+    hits = 0
+    for i in range(0, len(lines), batch_size):
+        text = "\n".join(lines[i:i + batch_size])
+        found = []
+        for keyword, event, value_regex in log_classifier._RULES:
+            start = text.find(keyword)
+            while start != -1:
+                if value_regex is None or value_regex.match(text, start):
+                    found.append((start, event))
+                start = text.find(keyword, start + 1)
+        found.sort()
+        for _, event in found:
+            if event in ("cert_error", "interface", "local_ip", "remote_ip", "tunnel_up"):
+                hits += 1
+    return hits
+
+
+def best_of(fn, lines, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(lines)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", help="Captured openfortivpn log to replay")
+    parser.add_argument("--lines", type=int, default=500000, help="Lines to replay")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, "r", errors="replace") as f:
+            source = [l.strip() for l in f]
+    else:
+        source = SAMPLE_LOG.splitlines()
+    lines = (source * (args.lines // len(source) + 1))[:args.lines]
+
+    old_time, old_hits = best_of(old_path, lines, args.repeat)
+    new_time, new_hits = best_of(new_path, lines, args.repeat)
+    find_time, find_hits = best_of(find_path, lines, args.repeat)
+
+    print(json.dumps({
+        "lines": len(lines),
+        "old_seconds": round(old_time, 4),
+        "new_seconds": round(new_time, 4),
+        "old_lines_per_second": int(len(lines) / old_time),
+        "new_lines_per_second": int(len(lines) / new_time),
+        "speedup": round(old_time / new_time, 2),
+        "find_seconds": round(find_time, 4),
+        "hits_match": old_hits == new_hits == find_hits,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
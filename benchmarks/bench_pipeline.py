@@ -0,0 +1,226 @@
+"""
+Pipeline load test: drives VPNManager against benchmarks/fake_openfortivpn.py
+(no gateway, no root) and measures
+
+  connect         connect_vpn() -> "connected" state, and the delay between
+                  the fake printing "Tunnel is up" and the GUI thread seeing it
+  failover        unreachable -> auth failure -> success, time to "connected"
+  disconnect      how long disconnect_vpn() holds the event loop, and the time
+                  to "disconnected", for a clean exit and for a fake that
+                  ignores SIGTERM (SIGKILL escalation)
+  log_throughput  verbose spam at increasing rates: lines/s delivered to the
+                  log sink and event loop lag (a 10 ms timer's lateness)
+
+Usage:
+    python benchmarks/bench_pipeline.py [--gui] [--rates 2000,10000,50000] [--spam-seconds 3]
+
+--gui sends the log to the real log model, shown in an open LogDialog
+(offscreen), instead of a counter: that decides how many lines/s the UI
+sustains before lagging.
+Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+# Read by privileges at import time
+os.environ["OFVPN_GUI_OPENFORTIVPN"] = os.path.join(BENCH_DIR, "fake_openfortivpn.py")
+os.environ["OFVPN_GUI_PRIVILEGE_MODE"] = "root"
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QEventLoop, QTimer, Qt
+from PySide6.QtWidgets import QApplication
+
+from vpn_manager import VPNManager
+
+LAG_TIMER_MS = 10
+LAG_OK_MS = 50 # p99 lag under this counts as "UI keeps up"
+SPAM_MARKER = "gw ---> pppd" # In every spam line of the fake
+
+
+class Harness:
+    def __init__(self, app, gui):
+        self.app = app
+        self.manager = VPNManager()
+        self.session = self.manager.session("bench")
+        self.states = []
+        self.spam_lines = 0
+        self.first_spam_time = None
+        self.last_spam_time = None
+        self.tunnel_stamp = None # fake-monotonic value of the current attempt
+        self.log_model = None
+        if gui:
+            import main
+            self.log_model = main.LogModel()
+            self.log_dialog = main.LogDialog(self.log_model)
+            self.log_dialog.show()
+        self.session.state_changed.connect(self._on_state)
+        self.session.log_message.connect(self._on_log)
+
+        self.lags = []
+        self._last_tick = None
+        self.lag_timer = QTimer()
+        self.lag_timer.setTimerType(Qt.PreciseTimer)
+        self.lag_timer.setInterval(LAG_TIMER_MS)
+        self.lag_timer.timeout.connect(self._on_tick)
+
+    def _on_state(self, state):
+        self.states.append((time.monotonic(), state))
+
+    def _on_log(self, text):
+        now = time.monotonic()
+        spam = text.count(SPAM_MARKER)
+        if spam:
+            if self.first_spam_time is None:
+                self.first_spam_time = now
+            self.spam_lines += spam
+            self.last_spam_time = now
+        if "fake-monotonic" in text:
+            for line in text.split("\n"):
+                if "fake-monotonic" in line:
+                    self.tunnel_stamp = float(line.rsplit(" ", 1)[1])
+        if self.log_model:
+            self.log_model.append_text(text)
+
+    def _on_tick(self):
+        now = time.monotonic()
+        if self._last_tick is not None:
+            self.lags.append(max(0.0, (now - self._last_tick) * 1000 - LAG_TIMER_MS))
+        self._last_tick = now
+
+    def wait_for(self, predicate, timeout):
+        deadline = time.monotonic() + timeout
+        self.lag_timer.start() # Also guarantees a wakeup at least every 10 ms
+        try:
+            while not predicate():
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"timed out, states: {[s for _, s in self.states[-5:]]}")
+                self.app.processEvents(QEventLoop.WaitForMoreEvents)
+        finally:
+            self.lag_timer.stop()
+            self._last_tick = None
+
+    def state_since(self, state, since):
+        return next((t for t, s in self.states if s == state and t >= since), None)
+
+    def connect(self, gateways, timeout=60):
+        start = time.monotonic()
+        self.tunnel_stamp = None
+        self.manager.connect_vpn("bench", lambda i: f"host = {gateways[i]['host']}\nport = 443\n",
+                                 gateways)
+        self.wait_for(lambda: self.state_since("connected", start), timeout)
+        return start
+
+    def disconnect(self):
+        self.manager.disconnect_vpn("bench")
+        self.wait_for(lambda: self.session.runner is None and self.session.prober is None, 10)
+
+
+def bench_disconnect(h, repeat, stuck=False):
+    if stuck:
+        os.environ["FAKE_OFVPN_IGNORE_SIGTERM"] = "1"
+    calls, totals, lags = [], [], []
+    try:
+        for _ in range(repeat):
+            h.connect([{"host": "fake-success", "port": 443}])
+            start = time.monotonic()
+            h.manager.disconnect_vpn("bench")
+            calls.append((time.monotonic() - start) * 1000)
+            h.lags = []
+            h.wait_for(lambda: h.state_since("disconnected", start), 30)
+            totals.append((h.state_since("disconnected", start) - start) * 1000)
+            lags += h.lags
+            h.wait_for(lambda: h.session.runner is None, 10)
+    finally:
+        os.environ.pop("FAKE_OFVPN_IGNORE_SIGTERM", None)
+    return {
+        "call_ms_max": round(max(calls), 3),
+        "to_disconnected_ms_median": round(statistics.median(totals), 2),
+        "loop_lag_max_ms": round(max(lags or [0.0]), 2),
+    }
+
+
+def bench_connect(h, repeat):
+    totals, deliveries = [], []
+    for _ in range(repeat):
+        start = h.connect([{"host": "fake-success", "port": 443}])
+        connected = h.state_since("connected", start)
+        totals.append((connected - start) * 1000)
+        if h.tunnel_stamp is not None:
+            deliveries.append((connected - h.tunnel_stamp) * 1000)
+        h.disconnect()
+    return {
+        "connect_ms_median": round(statistics.median(totals), 2),
+        "tunnel_up_to_signal_ms_median": round(statistics.median(deliveries), 3) if deliveries else None,
+        "tunnel_up_to_signal_ms_max": round(max(deliveries), 3) if deliveries else None,
+    }
+
+
+def bench_failover(h):
+    failovers_before = sum(1 for _, s in h.states if s == "failover")
+    start = h.connect([{"host": "fake-unreachable", "port": 443},
+                       {"host": "fake-auth_failure", "port": 443},
+                       {"host": "fake-success", "port": 443}])
+    connected = h.state_since("connected", start)
+    failovers = sum(1 for _, s in h.states if s == "failover") - failovers_before
+    h.disconnect()
+    return {"time_to_connected_ms": round((connected - start) * 1000, 2), "failovers": failovers}
+
+
+def bench_throughput(h, rate, seconds):
+    os.environ["FAKE_OFVPN_SPAM_RATE"] = str(rate)
+    os.environ["FAKE_OFVPN_SPAM_SECONDS"] = str(seconds)
+    os.environ["FAKE_OFVPN_SCENARIO"] = "spam"
+    h.spam_lines = 0
+    h.first_spam_time = h.last_spam_time = None
+    expected = int(rate * seconds)
+    try:
+        h.connect([{"host": "spam.invalid", "port": 443}])
+        h.lags = []
+        h.wait_for(lambda: h.spam_lines >= expected, seconds * 20 + 30)
+        elapsed = h.last_spam_time - h.first_spam_time
+        lags = sorted(h.lags) or [0.0]
+        h.disconnect()
+    finally:
+        os.environ.pop("FAKE_OFVPN_SCENARIO")
+    return {
+        "offered_lines_per_second": rate,
+        "delivered_lines_per_second": int(expected / elapsed) if elapsed > 0 else None,
+        "lag_p99_ms": round(lags[int(len(lags) * 0.99) - 1 if len(lags) > 1 else 0], 2),
+        "lag_max_ms": round(lags[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gui", action="store_true", help="Feed the log to the real LogDialog")
+    parser.add_argument("--repeat", type=int, default=5, help="Connect samples")
+    parser.add_argument("--rates", default="2000,10000,50000,100000", help="Spam rates, lines/s")
+    parser.add_argument("--spam-seconds", type=float, default=3)
+    parser.add_argument("--speed", type=float, default=1.0, help="FAKE_OFVPN_SPEED for the fake binary")
+    args = parser.parse_args()
+    os.environ["FAKE_OFVPN_SPEED"] = str(args.speed)
+
+    app = QApplication([sys.argv[0]])
+    h = Harness(app, args.gui)
+    results = {"sink": "LogDialog" if args.gui else "counter"}
+    results["connect"] = bench_connect(h, args.repeat)
+    results["failover"] = bench_failover(h)
+    results["disconnect"] = bench_disconnect(h, args.repeat)
+    results["disconnect_sigterm_ignored"] = bench_disconnect(h, 1, stuck=True)
+    results["log_throughput"] = [bench_throughput(h, int(r), args.spam_seconds)
+                                 for r in args.rates.split(",")]
+    sustained = [r["delivered_lines_per_second"] for r in results["log_throughput"]
+                 if r["lag_p99_ms"] < LAG_OK_MS and r["delivered_lines_per_second"]]
+    results["sustained_lines_per_second"] = max(sustained) if sustained else 0
+    h.manager.blocking_stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
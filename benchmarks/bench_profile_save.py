@@ -0,0 +1,144 @@
+"""
+Profile save benchmark: cost of persisting an edit with 10/100/1000
+profiles, when 0/1/10/100 of them changed their password, plus how many
+writes a burst of rapid edits turns into.
+
+Usage:
+    python benchmarks/bench_profile_save.py [--repeat 5] [--keyring-latency-ms 5] [--output results.json]
+
+Runs against a temporary HOME and the in-memory keyring of bench_startup
+(--keyring-latency-ms mimics a Secret Service round trip). Every profile's
+password is cached beforehand, the worst case for a save that writes every
+cached secret: only the changed ones should reach the keyring.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+import keyring # noqa: E402
+from PySide6.QtCore import QCoreApplication, QEventLoop # noqa: E402
+
+from bench_startup import DummyKeyring, _versions # noqa: E402
+
+PROFILE_COUNTS = (10, 100, 1000)
+CHANGED_COUNTS = (0, 1, 10, 100)
+BURST_EDITS = 50
+
+
+class CountingKeyring(DummyKeyring):
+    def __init__(self, latency_ms):
+        super().__init__()
+        self.latency = latency_ms / 1000
+        self.writes = 0
+
+    def set_password(self, service, username, password):
+        self.writes += 1
+        super().set_password(service, username, password)
+
+
+def _manager(home, count, backend):
+    os.environ["HOME"] = home
+    os.environ.pop("SUDO_USER", None)
+    from profile_manager import ProfileManager
+    shutil.rmtree(os.path.join(home, ".config"), ignore_errors=True)
+    manager = ProfileManager()
+    for i in range(count):
+        manager.add_profile(f"Perfil {i}", f"user{i}", f"password{i}", "",
+                            [{"host": f"vpn{i}.example.com", "port": 443}])
+    manager.flush()
+    for profile in manager.get_profiles():
+        manager.get_password(profile['id']) # Cached, as after connecting to each one
+    backend.writes = 0
+    return manager
+
+
+def measure_save(manager, backend, changed, repeat):
+    """
+    Seconds and keyring writes of one save after renaming a profile and
+    changing `changed` passwords (0: the JSON write alone).
+    """
+    profiles = manager.get_profiles()
+    samples = []
+    writes = 0
+    for n in range(repeat):
+        manager.update_profile(profiles[-1]['id'], {'name': f"Renombrado {n}"})
+        for profile in profiles[:changed]:
+            manager.update_profile(profile['id'], {'password': f"new{n}-{profile['id']}"})
+        backend.writes = 0
+        start = time.perf_counter()
+        manager.flush()
+        samples.append(time.perf_counter() - start)
+        writes = backend.writes
+    return samples, writes
+
+
+def measure_burst(app, manager, backend):
+    """JSON and keyring writes caused by BURST_EDITS edits of one profile in a row."""
+    json_writes = 0
+    write_profiles = manager._write_profiles
+
+    def counted():
+        nonlocal json_writes
+        json_writes += 1
+        write_profiles()
+
+    manager._write_profiles = counted
+    profile = manager.get_profiles()[0]
+    backend.writes = 0
+    for n in range(BURST_EDITS):
+        manager.update_profile(profile['id'], {'password': f"burst{n}", 'name': f"Perfil {n}"})
+    end = time.monotonic() + 2
+    while time.monotonic() < end and json_writes == 0:
+        app.processEvents(QEventLoop.AllEvents, 50)
+    manager._write_profiles = write_profiles
+    return {"edits": BURST_EDITS, "json_writes": json_writes, "keyring_writes": backend.writes}
+
+
+def _summary(samples):
+    ms = [s * 1000 for s in samples]
+    return {"min_ms": round(min(ms), 2), "median_ms": round(statistics.median(ms), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per measurement")
+    parser.add_argument("--keyring-latency-ms", type=float, default=5)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    app = QCoreApplication([sys.argv[0]])
+    backend = CountingKeyring(args.keyring_latency_ms)
+    keyring.set_keyring(backend)
+    home = tempfile.mkdtemp(prefix="ofvpn-bench-")
+    results = {"environment": _versions(), "repeat": args.repeat,
+               "keyring_latency_ms": args.keyring_latency_ms, "save": {}}
+    try:
+        for count in PROFILE_COUNTS:
+            manager = _manager(home, count, backend)
+            for changed in CHANGED_COUNTS:
+                if changed > count:
+                    continue
+                samples, writes = measure_save(manager, backend, changed, args.repeat)
+                results["save"][f"{count}_profiles_{changed}_changed"] = dict(
+                    _summary(samples), keyring_writes=writes)
+        results["burst"] = measure_burst(app, _manager(home, 10, backend), backend)
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
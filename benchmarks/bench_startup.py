@@ -0,0 +1,222 @@
+"""
+Startup benchmark: import time, MainWindow construction, ProfileManager
+load time for 1/100/10000 profiles and time to the first event loop
+iteration, in normal and --minimized mode.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--keyring-latency-ms 0] [--output results.json]
+
+Every sample runs in a fresh interpreter with the offscreen Qt platform,
+a temporary HOME (config dir) and an in-memory keyring backend, so the
+numbers do not depend on the desktop session or on the user's profiles.
+--keyring-latency-ms adds a delay to every keyring call, to mimic a slow
+Secret Service over D-Bus.
+"""
+import time
+_START = time.perf_counter() # Child processes time their imports from here
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import uuid
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, "..", "src")
+PROFILE_COUNTS = (1, 100, 10000)
+
+try:
+    from keyring.backend import KeyringBackend
+except ImportError: # Only the child processes need it
+    KeyringBackend = object
+
+
+class DummyKeyring(KeyringBackend):
+    """In-memory keyring, selected in the children through PYTHON_KEYRING_BACKEND."""
+    priority = 1
+
+    def __init__(self):
+        super().__init__()
+        self.latency = float(os.environ.get("BENCH_KEYRING_LATENCY_MS", "0")) / 1000
+        self.store = {}
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_password(self, service, username):
+        self._wait()
+        return self.store.get((service, username))
+
+    def set_password(self, service, username, password):
+        self._wait()
+        self.store[(service, username)] = password
+
+    def delete_password(self, service, username):
+        self._wait()
+        self.store.pop((service, username), None)
+
+
+# --- Child side: one measurement per process ---
+
+def _child(mode, arg):
+    sys.path.insert(0, SRC_DIR)
+    if mode == "import":
+        import main # noqa: F401
+        return time.perf_counter() - _START
+
+    if mode == "profiles":
+        from profile_manager import ProfileManager
+        start = time.perf_counter()
+        ProfileManager()
+        return time.perf_counter() - start
+
+    if mode == "window":
+        import main
+        from PySide6.QtWidgets import QApplication
+        app = QApplication([sys.argv[0]])
+        start = time.perf_counter()
+        window = main.MainWindow(minimized=(arg == "minimized"))
+        elapsed = time.perf_counter() - start
+        window.vpn_manager.blocking_stop()
+        del app
+        return elapsed
+
+    raise ValueError(mode)
+
+
+# --- Parent side ---
+
+def _write_profiles(home, count):
+    config_dir = os.path.join(home, ".config", "ofvpn-gui")
+    os.makedirs(config_dir, mode=0o700, exist_ok=True)
+    profiles = [{
+        "id": str(uuid.uuid4()),
+        "name": f"Perfil {i}",
+        "username": f"user{i}",
+        "trusted_cert": "",
+        "gateways": [{"host": f"vpn{i}.example.com", "port": 443},
+                     {"host": f"vpn{i}-b.example.com", "port": 10443}],
+        "otp_enabled": False,
+    } for i in range(count)]
+    with open(os.path.join(config_dir, "profiles.json"), "w") as f:
+        json.dump({"profiles": profiles}, f)
+
+
+class Sandbox:
+    """Temporary HOME + environment shared by the child processes."""
+
+    def __init__(self, keyring_latency_ms):
+        self.home = tempfile.mkdtemp(prefix="ofvpn-bench-")
+        self.env = dict(os.environ)
+        self.env.update({
+            "HOME": self.home,
+            "XDG_CONFIG_HOME": os.path.join(self.home, ".config"),
+            "XDG_RUNTIME_DIR": os.path.join(self.home, "run"),
+            "QT_QPA_PLATFORM": "offscreen",
+            "PYTHON_KEYRING_BACKEND": "bench_startup.DummyKeyring",
+            "BENCH_KEYRING_LATENCY_MS": str(keyring_latency_ms),
+            "PYTHONPATH": os.pathsep.join(filter(None, [BENCH_DIR, os.environ.get("PYTHONPATH")])),
+        })
+        self.env.pop("SUDO_USER", None) # ProfileManager would look up the real user's home
+        os.makedirs(self.env["XDG_RUNTIME_DIR"], mode=0o700)
+
+    def profiles(self, count):
+        _write_profiles(self.home, count)
+
+    def child(self, mode, arg=""):
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, arg],
+                              env=self.env, capture_output=True, text=True)
+        # The exit status is not checked: only the printed sample matters, and
+        # Qt teardown at interpreter exit is not part of what is measured
+        lines = proc.stdout.strip().splitlines()
+        if not lines:
+            raise RuntimeError(f"benchmark child '{mode}' failed:\n{proc.stderr}")
+        return float(lines[-1])
+
+    def first_iteration(self, minimized):
+        """Wall time from spawning main.py to its first idle event loop iteration."""
+        cmd = [sys.executable, os.path.join(SRC_DIR, "main.py"), "--startup-report"]
+        if minimized:
+            cmd.append("--minimized")
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, env=self.env, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True)
+        try:
+            for line in proc.stdout:
+                if "event loop idle" in line:
+                    return time.perf_counter() - start
+            raise RuntimeError("main.py exited without a startup report")
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def cleanup(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+
+def _summary(samples):
+    ms = [s * 1000 for s in samples]
+    return {"min_ms": round(min(ms), 2), "median_ms": round(statistics.median(ms), 2)}
+
+
+def _versions():
+    info = {"python": platform.python_version(), "platform": platform.platform()}
+    try:
+        import PySide6
+        info["pyside6"] = PySide6.__version__
+    except ImportError:
+        pass
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                        capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        pass
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per measurement")
+    parser.add_argument("--keyring-latency-ms", type=float, default=0)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(_child(*args.child), flush=True)
+        return
+
+    sandbox = Sandbox(args.keyring_latency_ms)
+    results = {"environment": _versions(), "repeat": args.repeat,
+               "keyring_latency_ms": args.keyring_latency_ms}
+    try:
+        sandbox.profiles(1)
+        results["import_main"] = _summary([sandbox.child("import") for _ in range(args.repeat)])
+        for mode in ("normal", "minimized"):
+            results[f"main_window_init_{mode}"] = _summary(
+                [sandbox.child("window", mode) for _ in range(args.repeat)])
+            results[f"first_event_loop_iteration_{mode}"] = _summary(
+                [sandbox.first_iteration(mode == "minimized") for _ in range(args.repeat)])
+
+        for count in PROFILE_COUNTS:
+            sandbox.profiles(count)
+            results[f"profile_load_{count}"] = _summary(
+                [sandbox.child("profiles") for _ in range(args.repeat)])
+    finally:
+        sandbox.cleanup()
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the openfortivpn binary: replays realistic log scripts so the
+runner, failover logic and log pipeline can be exercised without a Fortinet
+gateway or root.
+
+Point the app at it with:
+    OFVPN_GUI_OPENFORTIVPN=benchmarks/fake_openfortivpn.py OFVPN_GUI_PRIVILEGE_MODE=root
+
+Scenario: a gateway host named "fake-<scenario>" selects it per gateway
+(handy for failover tests), otherwise FAKE_OFVPN_SCENARIO, otherwise
+"success".
+
+    success       Tunnel up, stays up until SIGTERM
+    cert_error    Untrusted gateway certificate, exit 1
+    auth_failure  Credentials rejected, exit 1
+    unreachable   Gateway does not answer, exit 1
+    slow_ppp      Like success, PPP negotiation takes FAKE_OFVPN_PPP_DELAY s (8)
+    drop          Tunnel up, dies after FAKE_OFVPN_DROP_AFTER s (5), exit 1
+    spam          Tunnel up, then verbose pppd dumps at FAKE_OFVPN_SPAM_RATE
+                  lines/s (10000) for FAKE_OFVPN_SPAM_SECONDS s (5), then stays up
+
+FAKE_OFVPN_IGNORE_SIGTERM=1 logs the logout on SIGTERM but keeps running,
+like a stuck openfortivpn, so only SIGKILL ends it.
+
+FAKE_OFVPN_SPEED scales every delay (0.1 = ten times faster). Just before
+"Tunnel is up and running" a "DEBUG:  fake-monotonic <t>" line carries the
+CLOCK_MONOTONIC time, to measure how long the line takes to reach the GUI.
+"""
+import os
+import signal
+import sys
+import time
+
+VERSION = "1.21.0"
+CERT_HASH = "18b3ca13afe20180d70f1efbb949b9dcafb793d0aae246518b6ef909646f23b8"
+SPEED = float(os.environ.get("FAKE_OFVPN_SPEED", "1"))
+
+
+def emit(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def pause(seconds):
+    time.sleep(seconds * SPEED)
+
+
+def read_config(argv):
+    path = argv[argv.index("-c") + 1] if "-c" in argv else None
+    config = {}
+    if path:
+        with open(path) as f:
+            for line in f:
+                key, sep, value = line.partition("=")
+                if sep:
+                    config[key.strip()] = value.strip()
+    return path, config
+
+
+def handshake(path, config):
+    emit(f"DEBUG:  openfortivpn {VERSION}")
+    emit(f'DEBUG:  Loaded configuration file "{path}".')
+    emit("DEBUG:  Resolving gateway host ip")
+    pause(0.05)
+    emit("DEBUG:  Establishing ssl connection")
+    pause(0.15)
+
+
+def bring_up(ppp_delay=0.4):
+    emit("INFO:   Connected to gateway.")
+    pause(0.3)
+    emit("INFO:   Authenticated.")
+    emit("INFO:   Remote gateway has allocated a VPN.")
+    emit("Using interface ppp0")
+    emit("Connect: ppp0 <--> /dev/pts/3")
+    pause(ppp_delay)
+    emit("INFO:   Got addresses: [10.212.134.200], ns [10.0.0.53, 10.0.0.54]")
+    emit("INFO:   Negotiation complete.")
+    emit("local  IP address 10.212.134.200")
+    emit("remote IP address 192.0.2.1")
+    emit("INFO:   Interface ppp0 is UP.")
+    emit("INFO:   Setting new routes...")
+    pause(0.05)
+    emit("INFO:   Adding VPN nameservers...")
+    emit(f"DEBUG:  fake-monotonic {time.monotonic():.6f}")
+    emit("INFO:   Tunnel is up and running.")
+
+
+def spam(rate, seconds):
+    """Verbose pppd packet dumps at a steady rate, written in 1 ms slices."""
+    dump = "DEBUG:  gw ---> pppd (96 bytes) 45 00 00 5c 8f 21 40 00 3f 06 a1 c3 0a 00 00 35\n"
+    total = int(rate * seconds)
+    start = time.monotonic()
+    sent = 0
+    while sent < total:
+        due = min(total, int((time.monotonic() - start) * rate) + 1)
+        if due > sent:
+            sys.stdout.write(dump * (due - sent))
+            sys.stdout.flush()
+            sent = due
+        else:
+            time.sleep(0.001)
+
+
+def stay_up():
+    while True:
+        time.sleep(3600)
+
+
+def on_sigterm(signum, frame):
+    emit("INFO:   Cancelling threads...")
+    emit("INFO:   Cleanup, joining threads...")
+    if os.environ.get("FAKE_OFVPN_IGNORE_SIGTERM") == "1":
+        return # Stuck in the logout
+    emit("INFO:   Closed connection to gateway.")
+    emit("INFO:   Logged out.")
+    sys.exit(0)
+
+
+def main(argv):
+    if "--version" in argv:
+        print(VERSION)
+        return 0
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    path, config = read_config(argv)
+    host = config.get("host", "")
+    scenario = host[len("fake-"):] if host.startswith("fake-") else \
+        os.environ.get("FAKE_OFVPN_SCENARIO", "success")
+
+    handshake(path, config)
+
+    if scenario == "unreachable":
+        pause(1.0)
+        emit("ERROR:  connect: Connection timed out")
+        emit(f"ERROR:  Could not connect to gateway ({host}:{config.get('port', 443)}).")
+        return 1
+    if scenario == "cert_error":
+        emit("ERROR:  Gateway certificate validation failed, and the certificate digest is not in the local whitelist. "
+             "If you trust it, rerun with:")
+        emit(f"ERROR:      --trusted-cert {CERT_HASH}")
+        emit("ERROR:  or add this line to your config file:")
+        emit(f"ERROR:      trusted-cert = {CERT_HASH}")
+        emit("INFO:   Closed connection to gateway.")
+        return 1
+    if scenario == "auth_failure":
+        emit("INFO:   Connected to gateway.")
+        pause(0.3)
+        emit("ERROR:  Could not authenticate to gateway. Please check the password, client certificate, etc.")
+        emit("INFO:   Closed connection to gateway.")
+        return 1
+
+    bring_up(float(os.environ.get("FAKE_OFVPN_PPP_DELAY", "8")) if scenario == "slow_ppp" else 0.4)
+
+    if scenario == "drop":
+        pause(float(os.environ.get("FAKE_OFVPN_DROP_AFTER", "5")))
+        emit("ERROR:  pppd: The link was terminated by the peer.")
+        emit("INFO:   Terminated pppd.")
+        emit("INFO:   Closed connection to gateway.")
+        return 1
+    if scenario == "spam":
+        spam(float(os.environ.get("FAKE_OFVPN_SPAM_RATE", "10000")),
+             float(os.environ.get("FAKE_OFVPN_SPAM_SECONDS", "5")))
+    stay_up()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
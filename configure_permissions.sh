@@ -9,6 +9,7 @@ else
     USER_NAME=$(whoami)
 fi
 SUDOERS_FILE="/etc/sudoers.d/openfortivpn-gui"
+KILL_HELPER="/usr/local/sbin/openfortivpn-gui-kill"
 
 echo "=== Configuración de Sudo Sin Contraseña para OpenFortiVPN GUI ==="
 echo "Usuario actual: $USER_NAME"
@@ -16,7 +17,7 @@ echo "Archivo destino: $SUDOERS_FILE"
 echo ""
 echo "Este script creará una regla en sudoers que permite ejecutar:"
 echo "1. /usr/bin/openfortivpn"
-echo "2. /usr/bin/killall openfortivpn"
+echo "2. $KILL_HELPER (envía TERM o KILL a un PID, solo si es openfortivpn)"
 echo "Sin solicitar contraseña."
 echo ""
 echo "Se requerirá su contraseña de sudo una última vez para aplicar los cambios."
@@ -27,8 +28,30 @@ if [[ $confirm != "s" && $confirm != "S" ]]; then
     exit 1
 fi
 
+# Helper de cierre: la GUI detiene su propio openfortivpn por PID. Un "kill"
+# genérico en sudoers permitiría matar cualquier proceso, y killall también
+# cerraría los túneles de otros perfiles.
+HELPER_FILE=$(mktemp)
+cat > "$HELPER_FILE" <<'HELPER'
+#!/bin/sh
+# Instalado por openfortivpn-gui (configure_permissions.sh)
+# Uso: openfortivpn-gui-kill TERM|KILL PID
+case "$1" in
+    TERM|KILL) ;;
+    *) echo "Señal no permitida: $1" >&2; exit 2 ;;
+esac
+case "$2" in
+    ''|*[!0-9]*) echo "PID inválido: $2" >&2; exit 2 ;;
+esac
+if [ "$(cat "/proc/$2/comm" 2>/dev/null)" != "openfortivpn" ]; then
+    echo "El proceso $2 no es openfortivpn" >&2
+    exit 1
+fi
+exec /bin/kill -s "$1" "$2"
+HELPER
+
 # Definir la regla
-RULE="$USER_NAME ALL=(ALL) NOPASSWD: /usr/bin/openfortivpn, /usr/bin/killall openfortivpn"
+RULE="$USER_NAME ALL=(ALL) NOPASSWD: /usr/bin/openfortivpn, $KILL_HELPER"
 
 # Crear archivo temporal
 TMP_FILE=$(mktemp)
@@ -37,10 +60,11 @@ echo "$RULE" > "$TMP_FILE"
 # Validar sintaxis
 if visudo -cf "$TMP_FILE"; then
     echo "Sintaxis verificada. Aplicando..."
+    sudo install -o root -g root -m 0755 "$HELPER_FILE" "$KILL_HELPER"
     sudo install -m 0440 "$TMP_FILE" "$SUDOERS_FILE"
     echo "¡Listo! Ahora puede usar openfortivpn-gui sin contraseña."
 else
     echo "Error: La regla generada no es válida. No se aplicaron cambios."
 fi
 
-rm "$TMP_FILE"
+rm "$TMP_FILE" "$HELPER_FILE"
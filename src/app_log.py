@@ -0,0 +1,197 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+SUBSYSTEMS = ("runner", "manager", "profiles", "ui")
+DEFAULT_LEVEL = logging.INFO
+LEVELS_ENV = "OFVPN_GUI_LOG_LEVELS" # Same syntax as --log-levels, see parse_levels
+QUEUE_SIZE = 10000 # Records waiting per destination; past that they are dropped (and counted)
+BATCH_MAX = 500 # Records written between two flushes
+FILE_BYTES = 5 * 1024 * 1024 # The log file rotates at this size
+FILE_BACKUPS = 3 # debug.log.1 .. .3 (VPN output is archived per session, see session_archive)
+STOP_TIMEOUT = 2.0 # Seconds given to each writer to drain on exit
+
+_STOP = object()
+
+
+def get_logger(subsystem):
+    """Logger of one of SUBSYSTEMS: ofvpn.runner (openfortivpn output), ofvpn.ui, ..."""
+    return logging.getLogger(f"ofvpn.{subsystem}")
+
+
+def parse_levels(spec):
+    """
+    "DEBUG" (every subsystem) or "runner=WARNING,ui=DEBUG" -> {subsystem: level}.
+    Unknown subsystems or levels raise ValueError.
+    """
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, level = item.rpartition("=")
+        targets = [name] if name else SUBSYSTEMS
+        if name and name not in SUBSYSTEMS:
+            raise ValueError(f"Subsistema de log desconocido: {name}")
+        value = logging.getLevelName(level.upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Nivel de log desconocido: {level}")
+        for target in targets:
+            levels[target] = value
+    return levels
+
+
+class _BatchFlush:
+    """Handler mixin: flush() waits for the end of the writer's batch."""
+    in_batch = False
+
+    def flush(self):
+        if not self.in_batch:
+            super().flush()
+
+
+class BatchStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class BatchFileHandler(_BatchFlush, logging.handlers.RotatingFileHandler):
+    pass
+
+
+class LineStampFormatter(logging.Formatter):
+    """Time on every line of a multi-line message (a batch of openfortivpn output)."""
+
+    def format(self, record):
+        stamp = self.formatTime(record, self.datefmt)
+        return "\n".join(f"{stamp} {line}" for line in record.getMessage().splitlines())
+
+
+class LogWriter(threading.Thread):
+    """
+    One destination (log file, terminal) written by its own thread, one
+    flush per batch of queued records. The queue is bounded and never
+    blocks the caller: with a stalled destination (full disk, stdout pipe
+    nobody reads) records are dropped and counted instead.
+    """
+
+    def __init__(self, handler):
+        super().__init__(name=f"log-writer-{type(handler).__name__}", daemon=True)
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+
+    def put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < BATCH_MAX:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                batch.insert(0, logging.makeLogRecord({
+                    "name": "ofvpn.log", "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": f"{dropped} mensajes de log descartados (destino lento)"}))
+            self.handler.in_batch = True
+            try:
+                for record in batch:
+                    if record is not _STOP:
+                        self.handler.handle(record)
+            finally:
+                self.handler.in_batch = False
+            self.handler.flush()
+            if _STOP in batch:
+                return
+
+    def stop(self):
+        try:
+            self.queue.put(_STOP, timeout=STOP_TIMEOUT)
+        except queue.Full:
+            return # Stalled destination: it is a daemon thread, do not wait for it
+        self.join(STOP_TIMEOUT)
+
+
+class QueueFanout(logging.Handler):
+    """
+    The only handler the loggers see: renders the message once, in the
+    calling thread, and queues the record for every writer. Never does I/O.
+    """
+
+    def __init__(self, writers):
+        super().__init__()
+        self.writers = writers
+
+    def emit(self, record):
+        try:
+            # Like QueueHandler.prepare: args may change once the caller returns
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            for writer in self.writers:
+                if record.levelno >= writer.handler.level:
+                    writer.put(record)
+        except Exception:
+            self.handleError(record)
+
+
+class LogPipeline:
+    """What setup() built; stop() drains the writers (also run at exit)."""
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def stop(self):
+        for writer in self.writers:
+            writer.stop()
+        self.writers = []
+
+
+def setup(log_file=None, console=True, console_stamp=False, levels=None):
+    """
+    Routes the ofvpn.* loggers (and warnings from any other library)
+    through one writer thread per destination: log_file (rotating) and/or
+    stdout. levels: {subsystem: level}, DEFAULT_LEVEL for the rest;
+    LEVELS_ENV is applied first.
+    """
+    handlers = []
+    if log_file:
+        handler = BatchFileHandler(log_file, maxBytes=FILE_BYTES, backupCount=FILE_BACKUPS)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+        handlers.append(handler)
+    if console:
+        handler = BatchStreamHandler(sys.stdout)
+        handler.setFormatter(LineStampFormatter(datefmt="%H:%M:%S") if console_stamp
+                             else logging.Formatter('%(message)s'))
+        handlers.append(handler)
+
+    writers = [LogWriter(handler) for handler in handlers]
+    for writer in writers:
+        writer.start()
+    fanout = QueueFanout(writers)
+
+    root = logging.getLogger()
+    root.handlers = [fanout]
+    root.setLevel(logging.WARNING) # Third-party libraries
+    app = logging.getLogger("ofvpn")
+    app.handlers = [fanout]
+    app.propagate = False
+    app.setLevel(logging.DEBUG) # Filtered per subsystem below
+
+    configured = parse_levels(os.environ.get(LEVELS_ENV))
+    configured.update(levels or {})
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel(configured.get(subsystem, DEFAULT_LEVEL))
+
+    pipeline = LogPipeline(writers)
+    atexit.register(pipeline.stop)
+    return pipeline
@@ -19,7 +19,7 @@ class ProfileEditorDialog(QDialog):
         self.name_edit = QLineEdit(profile['name'] if profile else "")
         self.user_edit = QLineEdit(profile['username'] if profile else "")
         
-        self.pass_edit = QLineEdit(profile['password'] if profile else "")
+        self.pass_edit = QLineEdit(profile.get('password', '') if profile else "")
         self.pass_edit.setEchoMode(QLineEdit.Password)
         self.pass_edit.setPlaceholderText("(Opcional)")
         
@@ -28,11 +28,24 @@ class ProfileEditorDialog(QDialog):
         self.otp_check = QCheckBox("Conexión requiere OTP (2FA)")
         self.otp_check.setChecked(profile.get('otp_enabled', False) if profile else False)
         
+        self.reconnect_check = QCheckBox("Reconectar automáticamente si se cae")
+        self.reconnect_check.setChecked(profile.get('auto_reconnect', False) if profile else False)
+        
+        self.by_ip_check = QCheckBox("Conectar a la IP ya resuelta (requiere Trusted Cert)")
+        self.by_ip_check.setChecked(profile.get('connect_by_ip', False) if profile else False)
+        self.by_ip_check.setToolTip("Evita que openfortivpn vuelva a consultar el DNS; el nombre se envía como SNI")
+        
+        self.latency_edit = QLineEdit(profile.get('latency_target', '') if profile else "")
+        self.latency_edit.setPlaceholderText("(Opcional) host[:puerto], por defecto IP remota")
+        
         layout.addRow("Nombre del Perfil:", self.name_edit)
         layout.addRow("Usuario:", self.user_edit)
         layout.addRow("Contraseña:", self.pass_edit)
         layout.addRow("Trusted Cert (Hash):", self.cert_edit)
         layout.addRow("", self.otp_check)
+        layout.addRow("", self.reconnect_check)
+        layout.addRow("", self.by_ip_check)
+        layout.addRow("Destino de latencia:", self.latency_edit)
         
         # Gateways Section
         gw_label = QLabel("Gateways (Failover Order):")
@@ -125,7 +138,10 @@ class ProfileEditorDialog(QDialog):
             'password': self.pass_edit.text(),
             'trusted_cert': self.cert_edit.text(),
             'gateways': gateways,
-            'otp_enabled': self.otp_check.isChecked()
+            'otp_enabled': self.otp_check.isChecked(),
+            'latency_target': self.latency_edit.text().strip(),
+            'auto_reconnect': self.reconnect_check.isChecked(),
+            'connect_by_ip': self.by_ip_check.isChecked()
         }
 
 class ConfigDialog(QDialog):
@@ -148,8 +164,8 @@ class ConfigDialog(QDialog):
         add_btn = QPushButton("Nuevo")
         add_btn.clicked.connect(self.add_profile)
         
-        edit_btn = QPushButton("Editar")
-        edit_btn.clicked.connect(self.edit_profile)
+        self.edit_btn = QPushButton("Editar")
+        self.edit_btn.clicked.connect(self.edit_profile)
         
         del_btn = QPushButton("Eliminar")
         del_btn.clicked.connect(self.delete_profile)
@@ -159,7 +175,7 @@ class ConfigDialog(QDialog):
         
 
         btn_layout.addWidget(add_btn)
-        btn_layout.addWidget(edit_btn)
+        btn_layout.addWidget(self.edit_btn)
         btn_layout.addWidget(del_btn)
         
         # Autostart Checkbox
@@ -247,7 +263,7 @@ class ConfigDialog(QDialog):
 
     def edit_profile(self):
         item = self.profile_list.currentItem()
-        if not item:
+        if not item or not self.edit_btn.isEnabled(): # Already opening one
             return
             
         profile_id = item.data(Qt.UserRole)
@@ -256,10 +272,19 @@ class ConfigDialog(QDialog):
         if not profile:
             return
 
-        dialog = ProfileEditorDialog(profile, parent=self)
+        # Read from the keyring on a worker thread; the editor opens once it is there
+        self.edit_btn.setEnabled(False)
+        self.profile_manager.fetch_password(profile_id,
+                                            lambda password: self.open_editor(profile, password))
+
+    def open_editor(self, profile, password):
+        self.edit_btn.setEnabled(True)
+        if not self.isVisible() or profile not in self.profile_manager.get_profiles():
+            return # Closed, or the profile deleted, meanwhile
+        dialog = ProfileEditorDialog(dict(profile, password=password), parent=self)
         if dialog.exec():
             data = dialog.get_data()
-            self.profile_manager.update_profile(profile_id, data)
+            self.profile_manager.update_profile(profile['id'], data)
             self.refresh_list()
 
     def delete_profile(self):
@@ -0,0 +1,90 @@
+import collections
+
+import log_classifier
+
+HISTORY_SIZE = 50 # Connection attempts kept in memory
+
+# Milestones in the order openfortivpn reaches them, with the name of the
+# phase that ends there. openfortivpn does not log name resolution at the
+# default verbosity, so DNS is part of the gateway phase. A milestone missing
+# from the output (e.g. no VPN nameservers) is folded into the next phase.
+MILESTONES = (
+    (log_classifier.EVENT_SPAWNED, None),
+    (log_classifier.EVENT_PRIVILEGE_GRANTED, "privilegios"),
+    (log_classifier.EVENT_GATEWAY_CONNECTED, "DNS+TCP/TLS"),
+    (log_classifier.EVENT_AUTHENTICATED, "autenticación"),
+    (log_classifier.EVENT_PPP_NEGOTIATED, "PPP"),
+    (log_classifier.EVENT_INTERFACE_UP, "interfaz"),
+    (log_classifier.EVENT_ROUTES_SET, "rutas"),
+    (log_classifier.EVENT_TUNNEL_UP, "DNS VPN"),
+)
+_ORDER = {event: i for i, (event, _) in enumerate(MILESTONES)}
+
+
+class PhaseTimer:
+    """Timestamps the milestones of one connection attempt."""
+
+    def __init__(self, gateway=None):
+        self.gateway = gateway
+        self.marks = {} # milestone -> monotonic time
+
+    def mark(self, event, t):
+        """Records the first time a milestone is seen. Returns False for other events."""
+        if event not in _ORDER:
+            return False
+        self.marks.setdefault(event, t)
+        return True
+
+    def breakdown(self):
+        """[(phase, seconds)] between consecutive milestones that were seen."""
+        phases = []
+        prev = None
+        skipped = []
+        for event, label in MILESTONES:
+            t = self.marks.get(event)
+            if t is None:
+                if prev is not None and label:
+                    skipped.append(label)
+                continue
+            if prev is not None:
+                phases.append(("+".join(skipped + [label]), t - prev))
+            skipped = []
+            prev = t
+        return phases
+
+    def total(self):
+        return sum(seconds for _, seconds in self.breakdown())
+
+    def record(self, ok):
+        """Snapshot stored in the history."""
+        return {
+            "gateway": self.gateway,
+            "ok": ok,
+            "phases": self.breakdown(),
+            "total": self.total(),
+        }
+
+
+def format_record(record):
+    phases = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in record["phases"])
+    state = "" if record["ok"] else " (fallido)"
+    return f"Tiempos de conexión{state}: {phases or 'sin datos'} | total {record['total']:.2f} s"
+
+
+class PhaseHistory:
+    """Rolling history of per-attempt phase breakdowns."""
+
+    def __init__(self, size=HISTORY_SIZE):
+        self.records = collections.deque(maxlen=size)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def medians(self):
+        """{phase: median seconds} over the successful attempts in the history."""
+        samples = collections.defaultdict(list)
+        for record in self.records:
+            if record["ok"]:
+                for name, seconds in record["phases"]:
+                    samples[name].append(seconds)
+        return {name: sorted(values)[len(values) // 2] for name, values in samples.items()}
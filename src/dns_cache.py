@@ -0,0 +1,125 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QThread, Signal
+
+DEFAULT_TTL = 300 # Seconds, when the record's own TTL is unknown (getaddrinfo)
+MIN_TTL = 30 # Keep very short TTLs long enough to cover one connect
+MAX_TTL = 3600
+MAX_WORKERS = 8
+
+
+def resolve_host(host):
+    """
+    Resolves host to its IPv4/IPv6 addresses (IPv4 first).
+    Returns (addresses, ttl): the record TTL when dnspython is installed,
+    otherwise getaddrinfo (nsswitch, /etc/hosts) with DEFAULT_TTL.
+    Raises OSError when the name does not resolve.
+    """
+    try:
+        import dns.resolver # Optional: the only way to learn the real TTL
+    except ImportError:
+        dns = None
+
+    if dns is not None:
+        addresses, ttls = [], []
+        for rdtype in ("A", "AAAA"):
+            try:
+                answer = dns.resolver.resolve(host, rdtype)
+            except Exception:
+                continue
+            addresses += [r.to_text() for r in answer]
+            ttls.append(answer.rrset.ttl)
+        if addresses:
+            return addresses, min(ttls)
+        # Not in DNS: may still be in /etc/hosts, fall through
+
+    infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    addresses = []
+    for family, _, _, _, sockaddr in sorted(infos, key=lambda info: info[0] != socket.AF_INET):
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses, DEFAULT_TTL
+
+
+def _is_ip(host):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except OSError:
+            pass
+    return False
+
+
+class DNSCache:
+    """
+    Gateway host -> addresses, each entry evicted when its TTL expires.
+    Thread-safe: filled by DNSPrefetcher, read from the GUI thread and
+    from the gateway probes.
+    """
+
+    def __init__(self):
+        self._entries = {} # host -> (addresses, expires_at monotonic)
+        self._lock = threading.Lock()
+
+    def put(self, host, addresses, ttl):
+        ttl = min(MAX_TTL, max(MIN_TTL, ttl))
+        with self._lock:
+            self._entries[host] = (addresses, time.monotonic() + ttl)
+
+    def get(self, host):
+        """Cached addresses of host, None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry and entry[1] <= time.monotonic():
+                del self._entries[host]
+                entry = None
+        return entry[0] if entry else None
+
+    def address(self, host):
+        """First cached address of host (None if not cached)."""
+        addresses = self.get(host)
+        return addresses[0] if addresses else None
+
+    def missing(self, hosts):
+        """Hosts that still need a lookup (IP literals never do)."""
+        return [h for h in dict.fromkeys(hosts) if not _is_ip(h) and self.get(h) is None]
+
+    def lookup(self, host):
+        """Resolves host now and caches it. Returns a result dict (see DNSPrefetcher)."""
+        start = time.monotonic()
+        result = {'host': host, 'addresses': [], 'ttl': None, 'ms': None, 'error': None}
+        try:
+            result['addresses'], result['ttl'] = resolve_host(host)
+            self.put(host, result['addresses'], result['ttl'])
+        except (OSError, UnicodeError) as e:
+            result['error'] = str(e)
+        result['ms'] = (time.monotonic() - start) * 1000
+        return result
+
+
+def format_result(result):
+    if result['error']:
+        return f"DNS {result['host']}: error ({result['error']}) en {result['ms']:.0f} ms"
+    return (f"DNS {result['host']}: {', '.join(result['addresses'][:3])} "
+            f"en {result['ms']:.0f} ms (TTL {result['ttl']} s)")
+
+
+class DNSPrefetcher(QThread):
+    """
+    Resolves gateway hosts concurrently ahead of the connection, so neither
+    the probes nor (with connect-by-IP) openfortivpn wait on a slow resolver.
+    """
+    resolved = Signal(list) # [{'host', 'addresses', 'ttl', 'ms', 'error'}]
+
+    def __init__(self, cache, hosts):
+        super().__init__()
+        self.cache = cache
+        self.hosts = hosts
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(self.hosts))) as pool:
+            results = list(pool.map(self.cache.lookup, self.hosts))
+        self.resolved.emit(results)
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+
+from PySide6.QtCore import QCoreApplication, QTimer
+
+import app_log
+
+log = app_log.get_logger("manager")
+
+HEALTH_FILE = "gateway_health.json" # Next to profiles.json
+ATTEMPTS_KEPT = 20 # Per gateway
+HALF_LIFE = 3 * 24 * 3600 # An attempt counts half as much after 3 days
+FORGET_AFTER = 90 * 24 * 3600 # Gateways not tried for this long are dropped
+DEFAULT_CONNECT_SECONDS = 10.0 # Assumed connect time of a gateway never seen up
+SAVE_DELAY_MS = 2000 # Attempts recorded within this window (a failover burst) are written together
+DEGRADED_RATE = 0.5 # Success rate below which a gateway is degraded (a new one sits at 0.5)
+
+
+def gateway_key(gateway):
+    return f"{gateway['host']}:{gateway.get('port', 443)}"
+
+
+class GatewayHealth:
+    """
+    Persistent per-gateway track record: recent attempts (outcome, connect
+    time), last failure reason and last success. Used to put the gateways
+    most likely to come up quickly at the front of the failover queue.
+    Keyed by host:port, so a gateway shared by several profiles has one record.
+    """
+
+    def __init__(self, config_dir):
+        self.path = os.path.join(config_dir, HEALTH_FILE)
+        self.gateways = {}
+        self._save_pending = False
+        self._save_timer = None # Created on first record, see schedule_save
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                self.gateways = json.load(f).get('gateways', {})
+        except (OSError, ValueError, AttributeError):
+            self.gateways = {}
+
+    def schedule_save(self):
+        """
+        Schedules a save: attempts recorded within SAVE_DELAY_MS are
+        written together, off the path of each failover step. Without a Qt
+        event loop (scripts) the write happens right away. flush() forces it.
+        """
+        self._save_pending = True
+        if QCoreApplication.instance() is None:
+            self.flush()
+            return
+        if self._save_timer is None:
+            self._save_timer = QTimer()
+            self._save_timer.setSingleShot(True)
+            self._save_timer.setInterval(SAVE_DELAY_MS)
+            self._save_timer.timeout.connect(self.flush)
+        if not self._save_timer.isActive():
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes a pending save now (no-op if there is none)."""
+        if self._save_timer is not None:
+            self._save_timer.stop()
+        if self._save_pending:
+            self._save_pending = False
+            self.save()
+
+    def save(self):
+        now = time.time()
+        self.gateways = {key: entry for key, entry in self.gateways.items()
+                         if entry['attempts'] and now - entry['attempts'][-1]['t'] < FORGET_AFTER}
+        # Temp file plus rename: a crash mid-write keeps the previous history
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'gateways': self.gateways}, f, indent=4)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log.error(f"Error saving gateway health: {e}")
+
+    def record(self, gateway, ok, seconds, reason=None):
+        """One finished attempt: ok with its connect time, or failed with a reason."""
+        now = time.time()
+        entry = self.gateways.setdefault(gateway_key(gateway), {
+            'attempts': [], 'last_success': None, 'last_failure': None, 'last_failure_reason': None})
+        entry['attempts'] = (entry['attempts'] + [{'t': now, 'ok': ok, 'seconds': round(seconds, 3)}])[-ATTEMPTS_KEPT:]
+        if ok:
+            entry['last_success'] = now
+        else:
+            entry['last_failure'] = now
+            entry['last_failure_reason'] = reason
+        self.schedule_save()
+
+    def success_rate(self, gateway, now=None):
+        """
+        Decayed success rate: recent attempts weigh more, and a neutral prior
+        (one success, one failure) keeps a single result from deciding.
+        """
+        entry = self.gateways.get(gateway_key(gateway))
+        now = now or time.time()
+        ok = total = 0.0
+        for attempt in entry['attempts'] if entry else ():
+            weight = 0.5 ** (max(0.0, now - attempt['t']) / HALF_LIFE)
+            total += weight
+            ok += weight * attempt['ok']
+        return (ok + 1) / (total + 2)
+
+    def median_connect(self, gateway):
+        """Median connect time (s) of the successful attempts, None if never up."""
+        entry = self.gateways.get(gateway_key(gateway))
+        times = sorted(a['seconds'] for a in entry['attempts'] if a['ok']) if entry else []
+        return times[len(times) // 2] if times else None
+
+    def cost(self, gateway, now=None):
+        """
+        Expected seconds spent on this gateway per tunnel it brings up:
+        connect time / success rate. Trying gateways by increasing cost
+        minimises the expected time to connect.
+        """
+        seconds = self.median_connect(gateway) or DEFAULT_CONNECT_SECONDS
+        return seconds / self.success_rate(gateway, now)
+
+    def degraded(self, gateway, now=None):
+        """
+        Coarse health bucket: True if the gateway fails more often than not
+        lately. Used where a live measurement (probe latency) should decide
+        between gateways with a similar record.
+        """
+        return self.success_rate(gateway, now) < DEGRADED_RATE
+
+    def order(self, gateways):
+        """Indexes of `gateways` by increasing cost; ties keep the profile order."""
+        now = time.time()
+        return sorted(range(len(gateways)), key=lambda i: self.cost(gateways[i], now))
+
+    def summary(self, gateway):
+        """One line for the log, None if the gateway has no history."""
+        entry = self.gateways.get(gateway_key(gateway))
+        if not entry or not entry['attempts']:
+            return None
+        now = time.time()
+        attempts = entry['attempts']
+        parts = [f"{sum(a['ok'] for a in attempts)}/{len(attempts)} intentos OK"]
+        median = self.median_connect(gateway)
+        if median is not None:
+            parts.append(f"mediana {median:.1f} s")
+        if entry['last_success']:
+            parts.append(f"último éxito hace {_ago(now - entry['last_success'])}")
+        if entry['last_failure_reason'] and (entry['last_failure'] or 0) > (entry['last_success'] or 0):
+            parts.append(f"último fallo: {entry['last_failure_reason']}")
+        return ", ".join(parts)
+
+
+def _ago(seconds):
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f} min"
+    if seconds < 172800:
+        return f"{seconds / 3600:.0f} h"
+    return f"{seconds / 86400:.0f} d"
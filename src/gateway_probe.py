@@ -0,0 +1,82 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QThread, Signal
+
+PROBE_TIMEOUT = 3.0 # Seconds, per step (TCP connect and TLS handshake)
+
+
+def probe_gateway(host, port, timeout=PROBE_TIMEOUT, address=None):
+    """
+    Measures TCP connect and TLS handshake time against a single gateway.
+    address: pre-resolved IP of host (see dns_cache), skips the lookup.
+    Returns a dict: {'ok': bool, 'tcp_ms': float, 'tls_ms': float, 'error': str}
+    """
+    import ssl # Only needed once a probe runs, keeps it off the startup path
+
+    result = {'ok': False, 'tcp_ms': None, 'tls_ms': None, 'error': None}
+
+    # Certificate pinning is enforced later by openfortivpn (trusted-cert),
+    # here we only care whether the handshake completes and how fast.
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    start = time.monotonic()
+    try:
+        sock = socket.create_connection((address or host, port), timeout=timeout)
+    except (OSError, ValueError) as e:
+        result['error'] = f"TCP: {e}"
+        return result
+    result['tcp_ms'] = (time.monotonic() - start) * 1000
+
+    try:
+        sock.settimeout(timeout)
+        tls_start = time.monotonic()
+        with context.wrap_socket(sock, server_hostname=host) as tls_sock:
+            result['tls_ms'] = (time.monotonic() - tls_start) * 1000
+        result['ok'] = True
+    except (OSError, ssl.SSLError) as e:
+        result['error'] = f"TLS: {e}"
+    finally:
+        sock.close()
+
+    return result
+
+
+def rank_probe_results(results):
+    """
+    Orders probe results: healthy gateways first (fastest first), then the
+    unreachable ones in their original order so they are still tried last.
+    """
+    healthy = [r for r in results if r['ok']]
+    unhealthy = [r for r in results if not r['ok']]
+    healthy.sort(key=lambda r: r['tcp_ms'] + r['tls_ms'])
+    return healthy + unhealthy
+
+
+class GatewayProber(QThread):
+    """
+    Thread that probes every gateway of a profile concurrently.
+    """
+    probe_finished = Signal(list) # Ranked list of result dicts (see probe_gateway + 'index')
+
+    def __init__(self, gateways, timeout=PROBE_TIMEOUT, dns_cache=None):
+        super().__init__()
+        self.gateways = gateways
+        self.timeout = timeout
+        self.dns_cache = dns_cache
+
+    def _probe(self, index):
+        gateway = self.gateways[index]
+        address = self.dns_cache.address(gateway['host']) if self.dns_cache else None
+        result = probe_gateway(gateway['host'], gateway.get('port', 443), self.timeout, address)
+        result['index'] = index
+        result['host'] = gateway['host']
+        result['port'] = gateway.get('port', 443)
+        return result
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=len(self.gateways)) as pool:
+            results = list(pool.map(self._probe, range(len(self.gateways))))
+        self.probe_finished.emit(rank_probe_results(results))
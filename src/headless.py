@@ -0,0 +1,460 @@
+"""
+Headless mode for servers, CI runners and unattended machines.
+
+Drives ProfileManager and VPNManager with QtCore only: no QApplication,
+widgets, tray icon, pixmaps or dialogs.
+
+    headless.py daemon [--metrics-port N | --metrics-socket PATH]
+    headless.py connect PROFILE [--otp CODE] [--password-stdin]
+                                               (foreground if no daemon runs)
+    headless.py disconnect [PROFILE]           (all tunnels if no profile)
+    headless.py status
+    headless.py list
+    headless.py logs [--event TYPE] [--since 30d] [--profile NAME] [--grep TEXT]
+                                               (archived sessions, see session_archive)
+
+Every command takes --log-levels before it (e.g. "runner=WARNING,manager=DEBUG").
+
+The daemon runs one tunnel per profile, several at once if asked. It
+takes commands on a Unix socket only its user can open, one JSON object
+per line: {"cmd": "connect", "profile": ..., "password": ..., "otp": ...},
+{"cmd": "disconnect", "profile": ...}, {"cmd": "status"}.
+"""
+import argparse
+import functools
+import getpass
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from PySide6.QtCore import QCoreApplication, QObject, QSocketNotifier, QTimer
+
+from profile_manager import ProfileManager
+from gateway_health import GatewayHealth
+from session_archive import SessionArchive, ARCHIVED_EVENTS
+from dns_cache import format_result
+from vpn_manager import VPNManager
+from privileged_helper import runtime_dir
+import app_log
+
+REQUEST_TIMEOUT = 2.0 # Seconds a control client gets to send its request
+MAX_REQUEST = 65536 # Bytes; a request is one short JSON line
+
+
+def control_socket_path():
+    return os.path.join(runtime_dir(), "control.sock")
+
+
+_daemon_log = app_log.get_logger("manager")
+_output_log = app_log.get_logger("runner")
+
+
+def log(text):
+    _daemon_log.info(text)
+
+
+class HeadlessDaemon(QObject):
+    def __init__(self, exit_on_disconnect=False):
+        super().__init__()
+        self.exit_on_disconnect = exit_on_disconnect # Foreground connect: exit once every tunnel is down
+        self.profile_manager = ProfileManager()
+        config_dir = self.profile_manager.config_dir
+        self.vpn_manager = VPNManager(health=GatewayHealth(config_dir), archive=SessionArchive(config_dir))
+        self.info = {} # Session id -> {"last_error", "was_connected", "link"}
+        self.server = None
+        self.notifiers = []
+
+        self.vpn_manager.session_added.connect(self._on_session_added)
+        self.vpn_manager.dns_resolved.connect(self._on_dns_resolved)
+
+    # --- Control socket ---
+
+    def listen(self, path=None):
+        path = path or control_socket_path()
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077) # Created owner-only: never connectable by others, not even briefly
+        try:
+            self.server.bind(path)
+        finally:
+            os.umask(umask)
+        self.server.listen(4)
+        self.server_path = path
+        self._watch(self.server.fileno(), self._on_client)
+
+    def _watch(self, fd, callback):
+        notifier = QSocketNotifier(fd, QSocketNotifier.Read)
+        notifier.activated.connect(callback)
+        self.notifiers.append(notifier)
+
+    def _on_client(self):
+        try:
+            conn, _ = self.server.accept()
+        except OSError:
+            return
+        # Read as data arrives, never blocking the event loop every tunnel's
+        # signals go through; a client that has not sent its line within
+        # REQUEST_TIMEOUT is dropped
+        conn.setblocking(False)
+        client = {"conn": conn, "data": b""}
+        client["notifier"] = QSocketNotifier(conn.fileno(), QSocketNotifier.Read)
+        client["notifier"].activated.connect(lambda: self._on_client_data(client))
+        QTimer.singleShot(int(REQUEST_TIMEOUT * 1000), lambda: self._close_client(client))
+
+    def _on_client_data(self, client):
+        if client["conn"] is None:
+            return
+        try:
+            chunk = client["conn"].recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        client["data"] += chunk
+        if chunk and b"\n" not in chunk and len(client["data"]) < MAX_REQUEST:
+            return # Wait for the rest of the line
+        line = client["data"].split(b"\n", 1)[0]
+        try:
+            reply = self.handle(json.loads(line))
+        except ValueError as e:
+            reply = {"error": f"bad request: {e}"}
+        try:
+            client["conn"].sendall((json.dumps(reply) + "\n").encode())
+        except OSError:
+            pass
+        self._close_client(client)
+
+    def _close_client(self, client):
+        if client["conn"] is None:
+            return # Answered before the timeout
+        client["notifier"].setEnabled(False)
+        client["notifier"].deleteLater()
+        client["conn"].close()
+        client["conn"] = None
+
+    def handle(self, request):
+        if not isinstance(request, dict):
+            return {"error": "bad request: expected a JSON object"}
+        cmd = request.get("cmd")
+        if cmd == "connect":
+            return self.connect(request.get("profile"), request.get("password"), request.get("otp"))
+        if cmd == "disconnect":
+            name = request.get("profile")
+            if name is None:
+                self.vpn_manager.disconnect_vpn()
+                return {"ok": True}
+            profile = self._find_profile(name)
+            if not profile:
+                return {"error": f"perfil no encontrado: {name}"}
+            self.vpn_manager.disconnect_vpn(profile['id'])
+            return {"ok": True}
+        if cmd == "status":
+            return self.status()
+        return {"error": f"unknown command: {cmd}"}
+
+    # --- Commands ---
+
+    def _find_profile(self, name):
+        return next((p for p in self.profile_manager.get_profiles()
+                     if name in (p['name'], p['id'])), None)
+
+    def connect(self, name, password=None, otp=None):
+        profile = self._find_profile(name)
+        if not profile:
+            return {"error": f"perfil no encontrado: {name}"}
+        session = self.vpn_manager.sessions.get(profile['id'])
+        if session and session.is_active():
+            return {"error": f"{profile['name']} ya tiene una conexión en curso ({session.state})"}
+        if not profile.get('gateways'):
+            return {"error": "el perfil no tiene gateways"}
+        if not password and not self.profile_manager.get_password(profile['id']):
+            return {"need": "password", "username": profile['username']}
+        if profile.get('otp_enabled') and not otp:
+            return {"need": "otp"}
+
+        config_factory = functools.partial(
+            self.profile_manager.render_openfortivpn_config,
+            profile['id'],
+            runtime_password=password or None,
+            runtime_otp=otp or None
+        )
+        # An OTP cannot be replayed, so those profiles never auto-reconnect
+        auto_reconnect = profile.get('auto_reconnect', False) and not profile.get('otp_enabled')
+        self.info[profile['id']] = {"last_error": None, "was_connected": False, "link": {}}
+        self.vpn_manager.connect_vpn(profile['id'], config_factory, profile['gateways'],
+                                     name=profile['name'],
+                                     latency_target=profile.get('latency_target'),
+                                     auto_reconnect=auto_reconnect,
+                                     connect_by_ip=self.profile_manager.connects_by_ip(profile))
+        return {"ok": True}
+
+    def status(self):
+        return {"sessions": [self._session_status(s) for s in self.vpn_manager.sessions.values()]}
+
+    def _session_status(self, session):
+        info = self.info.get(session.session_id, {})
+        link = info.get("link") or {}
+        gateway = session.current_gateway() if session.state != "disconnected" else None
+        history = session.phase_history.records
+        return {
+            "state": session.state,
+            "profile": session.name,
+            "gateway": f"{gateway['host']}:{gateway.get('port', 443)}" if gateway else None,
+            "interface": session.session_data.get("interface"),
+            "local_ip": session.session_data.get("local_ip"),
+            "remote_ip": session.session_data.get("remote_ip"),
+            "rx_bytes": link.get("rx_bytes"),
+            "tx_bytes": link.get("tx_bytes"),
+            "last_connect_seconds": round(history[-1]["total"], 3) if history else None,
+            "last_error": info.get("last_error"),
+        }
+
+    # --- VPNSession signals ---
+
+    def _on_session_added(self, session):
+        session.state_changed.connect(lambda state: self._on_state_changed(session, state))
+        session.log_message.connect(lambda text: self._log(session, text))
+        session.connection_failed.connect(lambda reason: self._on_connection_failed(session, reason))
+        session.cert_trust_needed.connect(lambda cert_hash: self._on_cert_trust_needed(session, cert_hash))
+        session.link_stats_updated.connect(lambda counters: self._on_link_stats(session, counters))
+
+    def _log(self, session, text):
+        if len(self.vpn_manager.sessions) > 1:
+            text = "\n".join(f"[{session.name}] {line}" for line in text.splitlines())
+        _output_log.info(text)
+
+    def _on_state_changed(self, session, state):
+        info = self.info.setdefault(session.session_id, {"last_error": None, "was_connected": False, "link": {}})
+        if state == "connected":
+            info["was_connected"] = True
+        # session.state is updated before this slot runs, so compare with what we logged
+        if state != info.get("logged_state"):
+            info["logged_state"] = state
+            self._log(session, f"Estado: {state}")
+        if state != "connected":
+            info["link"] = {}
+        if state == "disconnected" and self.exit_on_disconnect:
+            # Next loop iteration: connection_failed and cert_trust_needed are
+            # emitted right after "disconnected" and decide the exit code
+            QTimer.singleShot(0, lambda: self._exit_if_done(info))
+
+    def _exit_if_done(self, info):
+        if any(s.state != "disconnected" for s in self.vpn_manager.sessions.values()):
+            return
+        QCoreApplication.instance().exit(0 if info["was_connected"] and not info["last_error"] else 1)
+
+    def _on_connection_failed(self, session, reason):
+        self.info[session.session_id]["last_error"] = reason
+        self._log(session, f"Error: {reason}")
+
+    def _on_cert_trust_needed(self, session, cert_hash):
+        self.info[session.session_id]["last_error"] = f"certificado no confiable: {cert_hash}"
+        self._log(session, f"El gateway presentó un certificado no confiable: {cert_hash}")
+        self._log(session, "Agregue el hash como 'Trusted Cert' del perfil y vuelva a conectar.")
+
+    def _on_dns_resolved(self, results):
+        for result in results:
+            log(format_result(result))
+
+    def prefetch_dns(self):
+        """Daemon start: resolve every profile's gateways before the first connect."""
+        self.vpn_manager.prefetch_dns([g for p in self.profile_manager.get_profiles()
+                                       for g in p.get('gateways', [])])
+
+    def _on_link_stats(self, session, counters):
+        self.info[session.session_id]["link"] = counters
+
+    # --- Lifecycle ---
+
+    def install_signal_handlers(self):
+        """SIGINT/SIGTERM stop the tunnel and quit, even while Qt owns the loop."""
+        read_end, write_end = socket.socketpair()
+        read_end.setblocking(False)
+        write_end.setblocking(False)
+        self._signal_sockets = (read_end, write_end)
+        signal.set_wakeup_fd(write_end.fileno())
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: None) # Handled through the wakeup fd
+        self._watch(read_end.fileno(), self._on_signal)
+
+    def _on_signal(self):
+        try:
+            self._signal_sockets[0].recv(64)
+        except OSError:
+            pass
+        log("Deteniendo...")
+        QCoreApplication.instance().exit(0)
+
+    def shutdown(self):
+        self.vpn_manager.blocking_stop()
+        if self.server:
+            self.server.close()
+            try:
+                os.remove(self.server_path)
+            except OSError:
+                pass
+
+
+def send_command(request, path=None):
+    """Sends one request to the running daemon. Raises OSError if there is none."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(path or control_socket_path())
+        conn.sendall((json.dumps(request) + "\n").encode())
+        return json.loads(conn.makefile("rb").readline() or b"{}")
+
+
+def _prompt_missing(reply, request):
+    """Fills in what the daemon asked for. Returns False if it cannot be asked."""
+    if not sys.stdin.isatty():
+        return False
+    if reply["need"] == "password":
+        request["password"] = getpass.getpass(f"Contraseña para {reply['username']}: ")
+    else:
+        request["otp"] = input("Código OTP/Token: ").strip()
+    return True
+
+
+def run_daemon(args, initial_request=None):
+    # Stamped lines on stdout, written by a background thread (see app_log)
+    app_log.setup(console_stamp=True, levels=app_log.parse_levels(args.log_levels))
+    app = QCoreApplication(sys.argv[:1])
+    daemon = HeadlessDaemon(exit_on_disconnect=initial_request is not None)
+    daemon.install_signal_handlers()
+
+    if initial_request:
+        while True:
+            reply = daemon.handle(initial_request)
+            if "need" in reply and _prompt_missing(reply, initial_request):
+                continue
+            break
+        if "ok" not in reply:
+            print(f"Error: {reply.get('error') or 'falta ' + reply['need']}", file=sys.stderr)
+            daemon.shutdown()
+            return 1
+        if not daemon.vpn_manager.active_sessions():
+            daemon.shutdown() # Failed before the event loop started (e.g. bad config)
+            return 1
+
+    try:
+        daemon.listen()
+    except OSError as e:
+        print(f"No se pudo abrir el socket de control: {e}", file=sys.stderr)
+    if not initial_request:
+        daemon.prefetch_dns()
+
+    exporter = None
+    if getattr(args, "metrics_port", None) or getattr(args, "metrics_socket", None):
+        from metrics_exporter import MetricsExporter
+        exporter = MetricsExporter(daemon.vpn_manager, port=args.metrics_port,
+                                   socket_path=args.metrics_socket)
+        exporter.start()
+
+    code = app.exec()
+    daemon.shutdown()
+    if exporter:
+        exporter.stop()
+    return code
+
+
+def parse_since(value):
+    """'30d', '12h', '45m' (ago) or 'YYYY-MM-DD' -> epoch seconds."""
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if value[-1:] in units and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * units[value[-1]]
+    return time.mktime(time.strptime(value, "%Y-%m-%d"))
+
+
+def show_logs(args):
+    archive = SessionArchive(ProfileManager().config_dir)
+    since = parse_since(args.since) if args.since else None
+    if not (args.event or args.grep):
+        # Session list: what there is to search
+        for session in archive.sessions():
+            if since and session.get("end", time.time()) < since:
+                continue
+            if args.profile and session.get("profile") != args.profile:
+                continue
+            start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["start"]))
+            duration = f"{session['end'] - session['start']:.0f} s" if "end" in session else "sin cerrar"
+            counts = ", ".join(f"{k}={v}" for k, v in sorted(session.get("counts", {}).items()))
+            print(f"{start}\t{session.get('profile')}\t{duration}\t{session.get('lines', '?')} líneas\t{counts}")
+        return 0
+    for session, _number, line in archive.search(event=args.event, since=since,
+                                                 profile=args.profile, text=args.grep):
+        print(f"[{session.get('profile')}] {line}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="openfortivpn-gui sin interfaz gráfica")
+    parser.add_argument("--log-levels", help="Nivel de log por subsistema: DEBUG o runner=WARNING,manager=DEBUG")
+    sub = parser.add_subparsers(dest="command", required=True)
+    daemon_parser = sub.add_parser("daemon", help="Queda en ejecución y acepta comandos")
+    daemon_parser.add_argument("--metrics-port", type=int)
+    daemon_parser.add_argument("--metrics-socket")
+    connect_parser = sub.add_parser("connect", help="Conecta un perfil (por nombre o id)")
+    connect_parser.add_argument("profile")
+    connect_parser.add_argument("--otp")
+    connect_parser.add_argument("--password-stdin", action="store_true",
+                                help="Lee la contraseña de la entrada estándar (sin prompt)")
+    disconnect_parser = sub.add_parser("disconnect", help="Desconecta un túnel del daemon (todos si no se indica)")
+    disconnect_parser.add_argument("profile", nargs="?")
+    sub.add_parser("status", help="Estado de los túneles del daemon (JSON)")
+    sub.add_parser("list", help="Lista los perfiles")
+    logs_parser = sub.add_parser("logs", help="Busca en el archivo de sesiones (lista las sesiones sin filtros)")
+    logs_parser.add_argument("--event", choices=sorted(ARCHIVED_EVENTS))
+    logs_parser.add_argument("--since", help="30d, 12h, 45m o AAAA-MM-DD")
+    logs_parser.add_argument("--profile")
+    logs_parser.add_argument("--grep", help="Texto a buscar en las líneas")
+    args = parser.parse_args(argv)
+
+    if args.command == "daemon":
+        return run_daemon(args)
+
+    if args.command == "logs":
+        return show_logs(args)
+
+    if args.command == "list":
+        for p in ProfileManager().get_profiles():
+            gateways = ", ".join(f"{g['host']}:{g.get('port', 443)}" for g in p.get('gateways', []))
+            print(f"{p['name']}\t{p['username']}\t{gateways}")
+        return 0
+
+    if args.command == "connect":
+        request = {"cmd": "connect", "profile": args.profile, "otp": args.otp}
+        if args.password_stdin:
+            request["password"] = sys.stdin.readline().rstrip("\n")
+        try:
+            reply = send_command(request)
+            while "need" in reply and _prompt_missing(reply, request):
+                reply = send_command(request)
+        except OSError:
+            # No daemon: run this one session in the foreground
+            return run_daemon(args, initial_request=request)
+    else:
+        request = {"cmd": args.command}
+        if getattr(args, "profile", None):
+            request["profile"] = args.profile
+        try:
+            reply = send_command(request)
+        except OSError:
+            if args.command == "status":
+                print(json.dumps({"sessions": [], "daemon": False}))
+                return 0
+            print("No hay un daemon en ejecución.", file=sys.stderr)
+            return 1
+
+    if "error" in reply or "need" in reply:
+        print(f"Error: {reply.get('error') or 'falta ' + reply['need']}", file=sys.stderr)
+        return 1
+    if args.command == "status":
+        print(json.dumps(reply, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
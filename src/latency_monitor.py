@@ -0,0 +1,124 @@
+import errno
+import math
+import socket
+import threading
+import time
+from array import array
+from PySide6.QtCore import QThread, Signal
+
+PROBE_INTERVAL = 5.0 # Seconds between probes
+PROBE_TIMEOUT = 2.0 # A probe without answer after this counts as lost
+DEFAULT_PORT = 443
+
+# Answers that still prove the packet made the round trip
+_ANSWERED_ERRNOS = (errno.ECONNREFUSED, errno.ECONNRESET)
+
+
+class LatencyHistogram:
+    """
+    Log-spaced latency histogram (0.1 ms .. ~30 s, ~6% resolution).
+    Fixed memory, O(1) inserts, percentiles from the cumulative counts.
+    """
+    MIN_MS = 0.1
+    GROWTH = 1.06
+
+    def __init__(self):
+        self.buckets = int(math.log(300000) / math.log(self.GROWTH)) + 1
+        self.counts = array('L', bytes(array('L').itemsize * self.buckets))
+        self.total = 0
+
+    def add(self, ms):
+        i = 0 if ms <= self.MIN_MS else int(math.log(ms / self.MIN_MS) / math.log(self.GROWTH)) + 1
+        self.counts[min(i, self.buckets - 1)] += 1
+        self.total += 1
+
+    def percentile(self, p):
+        """Upper bound (ms) of the bucket holding the p-th percentile, None if empty."""
+        if not self.total:
+            return None
+        rank = math.ceil(self.total * p / 100)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.MIN_MS * self.GROWTH ** i
+        return None
+
+
+def parse_target(target, default_port=DEFAULT_PORT):
+    """'host', 'host:port' or 'udp://host:port' -> (proto, host, port)."""
+    proto = "tcp"
+    if "://" in target:
+        proto, target = target.split("://", 1)
+    host, sep, port = target.rpartition(":")
+    if not sep or not port.isdigit():
+        host, port = target, default_port
+    return proto.lower(), host, int(port)
+
+
+def probe_rtt(proto, host, port, timeout=PROBE_TIMEOUT):
+    """
+    One round trip to host:port. TCP: connect() time (a RST counts as an
+    answer). UDP: echo request; an ICMP port unreachable also counts.
+    Returns the RTT in ms, or None if the probe was lost.
+    """
+    start = time.monotonic()
+    if proto == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect((host, port))
+            sock.send(b"ofvpn-gui")
+            sock.recv(64)
+        except OSError as e:
+            if e.errno not in _ANSWERED_ERRNOS:
+                return None
+        finally:
+            sock.close()
+    else:
+        try:
+            socket.create_connection((host, port), timeout=timeout).close()
+        except OSError as e:
+            if e.errno not in _ANSWERED_ERRNOS:
+                return None
+    return (time.monotonic() - start) * 1000
+
+
+class LatencyMonitor(QThread):
+    """
+    Periodically measures in-tunnel RTT to a target and reports latency
+    percentiles and loss.
+    """
+    latency_updated = Signal(dict) # {target, last_ms, p50, p95, p99, loss_pct, sent}
+
+    def __init__(self, target, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT):
+        super().__init__()
+        self.proto, self.host, self.port = parse_target(target)
+        self.interval = interval
+        self.timeout = timeout
+        self.histogram = LatencyHistogram()
+        self.sent = 0
+        self.lost = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rtt = probe_rtt(self.proto, self.host, self.port, self.timeout)
+            self.sent += 1
+            if rtt is None:
+                self.lost += 1
+            else:
+                self.histogram.add(rtt)
+            self.latency_updated.emit({
+                "target": f"{self.proto}://{self.host}:{self.port}",
+                "last_ms": rtt,
+                "p50": self.histogram.percentile(50),
+                "p95": self.histogram.percentile(95),
+                "p99": self.histogram.percentile(99),
+                "loss_pct": self.lost * 100.0 / self.sent,
+                "sent": self.sent,
+            })
+            self._stop_event.wait(self.interval)
@@ -0,0 +1,103 @@
+import os
+import threading
+from PySide6.QtCore import QThread, Signal
+
+PROC_NET_DEV = "/proc/net/dev"
+
+# Column order of /proc/net/dev after "iface:" (the ones we keep)
+_COLUMNS = {
+    "rx_bytes": 0, "rx_packets": 1, "rx_errors": 2, "rx_drops": 3,
+    "tx_bytes": 8, "tx_packets": 9, "tx_errors": 10, "tx_drops": 11,
+}
+
+
+def parse_proc_net_dev(text, interfaces=None):
+    """
+    Parses /proc/net/dev content.
+    Returns {iface: {'rx_bytes', 'rx_packets', 'rx_errors', 'rx_drops', 'tx_...'}},
+    limited to `interfaces` when given.
+    """
+    stats = {}
+    for line in text.splitlines()[2:]: # Skip the two header lines
+        name, sep, values = line.partition(":")
+        if not sep:
+            continue
+        name = name.strip()
+        if interfaces is not None and name not in interfaces:
+            continue
+        fields = values.split()
+        stats[name] = {key: int(fields[col]) for key, col in _COLUMNS.items()}
+    return stats
+
+
+def _pread_all(fd, chunk=1 << 16):
+    """Reads a procfs file from offset 0 without reopening it."""
+    data = os.pread(fd, chunk, 0)
+    while len(data) % chunk == 0 and data:
+        more = os.pread(fd, chunk, len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+class LinkStatsCollector(QThread):
+    """
+    Samples link counters for the watched interfaces once per interval, off
+    the GUI thread. Each tick is a single read of /proc/net/dev (kept open,
+    re-read with pread) instead of an exists()+open() pair per counter.
+    Runs only while at least one interface is watched.
+    """
+    stats_sampled = Signal(dict) # {iface: counters} for the watched interfaces
+
+    def __init__(self, interval=1.0):
+        super().__init__()
+        self.interval = interval
+        self._interfaces = set()
+        self._active = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def watch(self, iface):
+        with self._lock:
+            self._interfaces.add(iface)
+            need_start = not self._active
+            self._active = True
+        if need_start:
+            self.wait() # A previous run may still be returning
+            self._wakeup.clear()
+            self.start()
+
+    def unwatch(self, iface):
+        with self._lock:
+            self._interfaces.discard(iface)
+            empty = not self._interfaces
+        if empty:
+            self._wakeup.set() # Let the thread notice right away
+
+    def run(self):
+        try:
+            fd = os.open(PROC_NET_DEV, os.O_RDONLY)
+        except OSError:
+            with self._lock:
+                self._active = False
+            return
+
+        try:
+            while True:
+                with self._lock:
+                    if not self._interfaces:
+                        self._active = False
+                        break
+                    interfaces = set(self._interfaces)
+
+                try:
+                    text = _pread_all(fd).decode("ascii", "replace")
+                    self.stats_sampled.emit(parse_proc_net_dev(text, interfaces))
+                except (OSError, ValueError, IndexError):
+                    pass # Interface might be gone mid-read
+
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+        finally:
+            os.close(fd)
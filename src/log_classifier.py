@@ -0,0 +1,90 @@
+import re
+
+# Event types emitted for classified openfortivpn output lines
+EVENT_CERT_ERROR = "cert_error"                   # value: certificate hash
+EVENT_INTERFACE = "interface"                     # value: ppp0 / tun0
+EVENT_LOCAL_IP = "local_ip"                       # value: address
+EVENT_REMOTE_IP = "remote_ip"                     # value: address
+EVENT_TUNNEL_UP = "tunnel_up"
+EVENT_AUTH_FAILURE = "auth_failure"
+EVENT_DNS_FAILURE = "dns_failure"
+EVENT_GATEWAY_UNREACHABLE = "gateway_unreachable"
+EVENT_TLS_FAILURE = "tls_failure"
+EVENT_PERMISSION_DENIED = "permission_denied"     # sudo/pkexec refused or not root
+
+# Events that explain why an attempt failed
+FAILURE_EVENTS = frozenset((
+    EVENT_AUTH_FAILURE, EVENT_DNS_FAILURE, EVENT_GATEWAY_UNREACHABLE, EVENT_TLS_FAILURE,
+))
+
+# Connection milestones (see connection_timing)
+EVENT_GATEWAY_CONNECTED = "gateway_connected"     # DNS + TCP + TLS handshake done
+EVENT_AUTHENTICATED = "authenticated"
+EVENT_PPP_NEGOTIATED = "ppp_negotiated"
+EVENT_INTERFACE_UP = "interface_up"
+EVENT_ROUTES_SET = "routes_set"
+# Emitted by VPNRunner itself, not matched in the output
+EVENT_SPAWNED = "spawned"
+EVENT_PRIVILEGE_GRANTED = "privilege_granted"     # sudo/pkexec let openfortivpn start
+
+# (keyword, event, value regex anchored at the keyword or None).
+# The keywords form one alternation (_KEYWORDS) matched over each batch;
+# the value regex only runs where its keyword was found. Value regexes
+# use [ \t], never \s: the batch is joined with newlines and a value must
+# not be picked up from the next line.
+_RULES = (
+    # "ERROR:      trusted-cert = <hash>" or "--trusted-cert <hash>"
+    ("trusted-cert", EVENT_CERT_ERROR, re.compile(r"trusted-cert(?:[ \t]+|[ \t]*=[ \t]*)([a-f0-9]{64})")),
+    ("Using interface ", EVENT_INTERFACE, re.compile(r"Using interface (ppp\d+|tun\d+)")),
+    ("local  IP address ", EVENT_LOCAL_IP, re.compile(r"local  IP address ([\d\.]+)")),
+    ("remote IP address ", EVENT_REMOTE_IP, re.compile(r"remote IP address ([\d\.]+)")),
+    ("Connected to gateway.", EVENT_GATEWAY_CONNECTED, None),
+    ("Authenticated.", EVENT_AUTHENTICATED, None),
+    ("Negotiation complete.", EVENT_PPP_NEGOTIATED, None),
+    (" is UP.", EVENT_INTERFACE_UP, None),                 # "Interface ppp0 is UP."
+    ("Adding VPN nameservers", EVENT_ROUTES_SET, None),    # Printed once routes are set
+    ("Tunnel is up and running", EVENT_TUNNEL_UP, None),
+    ("Could not authenticate to gateway", EVENT_AUTH_FAILURE, None),
+    ("VPN authentication failed", EVENT_AUTH_FAILURE, None),
+    ("Could not resolve host", EVENT_DNS_FAILURE, None),
+    ("Could not connect to gateway", EVENT_GATEWAY_UNREACHABLE, None),
+    ("Connection refused", EVENT_GATEWAY_UNREACHABLE, None),
+    ("Connection timed out", EVENT_GATEWAY_UNREACHABLE, None),
+    ("No route to host", EVENT_GATEWAY_UNREACHABLE, None),
+    ("SSL_connect", EVENT_TLS_FAILURE, None),
+    ("a password is required", EVENT_PERMISSION_DENIED, None),          # sudo -n
+    ("Not authorized", EVENT_PERMISSION_DENIED, None),                  # pkexec
+    ("not spawned with root privileges", EVENT_PERMISSION_DENIED, None), # openfortivpn
+)
+
+# One empty named group after each keyword: match.lastgroup says which
+# rule matched. Wrapping the keyword itself in the group would hide the
+# literal first characters from the re engine's prefix scan (~15x slower).
+_KEYWORDS = re.compile("|".join(f"{re.escape(keyword)}(?P<r{i}>)" for i, (keyword, _, _) in enumerate(_RULES)))
+_RULE_BY_GROUP = {f"r{i}": rule for i, rule in enumerate(_RULES)}
+
+
+def classify_lines(lines):
+    """
+    Tags a batch of output lines in a single pass: one alternation of
+    every keyword over the joined text, then the value regex only where
+    a keyword was found. Returns a list of (event_type, value) tuples in
+    output order; value is None for events that carry no data.
+    """
+    text = "\n".join(lines)
+    found = []
+    for match in _KEYWORDS.finditer(text):
+        _keyword, event, value_regex = _RULE_BY_GROUP[match.lastgroup]
+        if value_regex is None:
+            found.append((event, None))
+        else:
+            value = value_regex.match(text, match.start())
+            if value:
+                found.append((event, value.group(1)))
+    return found
+
+
+def classify(line):
+    """Single-line convenience wrapper: first event of the line, or None."""
+    events = classify_lines((line,))
+    return events[0] if events else None
@@ -0,0 +1,209 @@
+import collections
+from PySide6.QtCore import Qt, QObject, QTimer, Signal
+from PySide6.QtGui import QKeySequence, QGuiApplication, QPainter, QPalette
+from PySide6.QtWidgets import QAbstractScrollArea
+
+DEFAULT_MAX_LINES = 20000 # Lines kept for the log window (--log-lines)
+FLUSH_INTERVAL_MS = 50 # Appends are coalesced into one update per interval
+TEXT_MARGIN = 4 # px, left of every line
+
+
+class LineRing:
+    """
+    Fixed-capacity ring of log lines, stored UTF-8 encoded (about half the
+    size of str for this mostly-ASCII output). O(1) append and indexing;
+    once full, each append drops the oldest line.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._lines = [None] * self.capacity
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, i):
+        return self._lines[(self._start + i) % self.capacity].decode("utf-8", "replace")
+
+    def append(self, line):
+        """Returns True when the oldest line was dropped to make room."""
+        data = line.encode("utf-8", "replace")
+        if self._len < self.capacity:
+            self._lines[(self._start + self._len) % self.capacity] = data
+            self._len += 1
+            return False
+        self._lines[self._start] = data
+        self._start = (self._start + 1) % self.capacity
+        return True
+
+
+class LogModel(QObject):
+    """
+    The last max_lines log lines. Lives as long as the window, whether or
+    not the log dialog was ever opened; appends are buffered and applied
+    once every FLUSH_INTERVAL_MS.
+
+    Lines are addressed by row (0 = oldest kept). first_line counts the
+    lines dropped so far, so first_line + row is stable across drops.
+    """
+    appended = Signal(int, int) # lines added, lines dropped from the top
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, parent=None):
+        super().__init__(parent)
+        self.lines = LineRing(max_lines)
+        self.first_line = 0
+        self.longest = 0 # Characters in the longest line seen (horizontal scroll range)
+        self._pending = collections.deque(maxlen=self.lines.capacity) # Bounded as well
+        self._overflowed = 0 # Pushed out of _pending before reaching the ring
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def append_text(self, text):
+        """Queues one or more newline-separated lines."""
+        lines = text.split("\n")
+        self._overflowed += max(0, len(self._pending) + len(lines) - self.lines.capacity)
+        self._pending.extend(lines)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        if not self._pending:
+            return
+        added = len(self._pending)
+        dropped = self._overflowed
+        self._overflowed = 0
+        while self._pending:
+            line = self._pending.popleft()
+            self.longest = max(self.longest, len(line))
+            dropped += self.lines.append(line)
+        self.first_line += dropped
+        self.appended.emit(added, dropped)
+
+    def text(self, start=0, end=None):
+        """Rows start..end-1 as one string."""
+        end = len(self.lines) if end is None else end
+        return "\n".join(self.lines[i] for i in range(max(0, start), min(end, len(self.lines))))
+
+
+class LogView(QAbstractScrollArea):
+    """
+    Virtualized view of a LogModel: paints only the lines in the viewport,
+    so an update costs the same with 100 lines or 100000. Follows the tail
+    while scrolled to the bottom; while hidden it ignores appends and
+    catches up when shown. Drag to select lines, Ctrl+C to copy them.
+    """
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self._follow = True
+        self._selection = None # (anchor, current) absolute line numbers
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+        model.appended.connect(self._on_appended)
+
+    def line_height(self):
+        return self.fontMetrics().lineSpacing()
+
+    def visible_rows(self):
+        return max(1, self.viewport().height() // self.line_height())
+
+    def update_scrollbars(self):
+        rows = self.visible_rows()
+        vbar = self.verticalScrollBar()
+        vbar.blockSignals(True) # Range changes must not turn following off
+        vbar.setRange(0, max(0, len(self.model) - rows))
+        vbar.setPageStep(rows)
+        vbar.blockSignals(False)
+        hbar = self.horizontalScrollBar()
+        width = self.model.longest * self.fontMetrics().averageCharWidth() + 2 * TEXT_MARGIN
+        hbar.setRange(0, max(0, width - self.viewport().width()))
+        hbar.setPageStep(self.viewport().width())
+        if self._follow:
+            vbar.setValue(vbar.maximum())
+
+    def _on_scrolled(self, value):
+        self._follow = value >= self.verticalScrollBar().maximum()
+
+    def _on_appended(self, added, dropped):
+        if not self.isVisible():
+            return # showEvent catches up
+        vbar = self.verticalScrollBar()
+        if not self._follow and dropped:
+            # Keep the lines being read in place
+            vbar.blockSignals(True)
+            vbar.setValue(vbar.value() - dropped)
+            vbar.blockSignals(False)
+        self.update_scrollbars()
+        self.viewport().update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_scrollbars()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        height = self.line_height()
+        ascent = self.fontMetrics().ascent()
+        first = self.verticalScrollBar().value()
+        x = TEXT_MARGIN - self.horizontalScrollBar().value()
+        selected = self._selected_rows()
+        palette = self.palette()
+        for row in range(first, min(len(self.model), first + self.visible_rows() + 1)):
+            y = (row - first) * height
+            if selected and selected[0] <= row < selected[1]:
+                painter.fillRect(0, y, self.viewport().width(), height, palette.color(QPalette.Highlight))
+                painter.setPen(palette.color(QPalette.HighlightedText))
+            else:
+                painter.setPen(palette.color(QPalette.Text))
+            painter.drawText(x, y + ascent, self.model.lines[row])
+
+    # --- Selection ---
+
+    def _line_at(self, pos):
+        row = self.verticalScrollBar().value() + int(pos.y()) // self.line_height()
+        return self.model.first_line + min(max(0, row), max(0, len(self.model) - 1))
+
+    def _selected_rows(self):
+        """Selected rows as a [start, end) range of the model, None if nothing is selected."""
+        if self._selection is None or not len(self.model):
+            return None
+        low, high = sorted(self._selection)
+        start = max(0, low - self.model.first_line)
+        end = high - self.model.first_line + 1
+        return (start, end) if end > start else None
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            line = self._line_at(event.position())
+            self._selection = (line, line)
+            self.viewport().update()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self._selection and event.buttons() & Qt.LeftButton:
+            self._selection = (self._selection[0], self._line_at(event.position()))
+            self.viewport().update()
+        super().mouseMoveEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            selected = self._selected_rows()
+            if selected:
+                QGuiApplication.clipboard().setText(self.model.text(*selected))
+            return
+        if event.matches(QKeySequence.SelectAll):
+            self._selection = (self.model.first_line, self.model.first_line + len(self.model) - 1)
+            self.viewport().update()
+            return
+        super().keyPressEvent(event)
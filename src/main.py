@@ -1,6 +1,10 @@
+import time
+_START = time.perf_counter() # Before the heavy imports, for --startup-report
+
 import sys
 import os
 import subprocess
+import functools
 from PySide6.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                                QWidget, QLabel, QComboBox, QMessageBox, QHBoxLayout,
                                QInputDialog, QLineEdit, QDialog, QTextEdit, QSystemTrayIcon,
@@ -9,28 +13,61 @@ from PySide6.QtGui import QIcon, QPixmap, QAction, QPainter, QColor
 from PySide6.QtCore import Qt, QSize, QTimer
 from vpn_manager import VPNManager
 from profile_manager import ProfileManager
-from config_dialog import ConfigDialog
-from stats_panel import StatsPanel
-import migration_utils
+from gateway_health import GatewayHealth
+from session_archive import SessionArchive
+from dns_cache import format_result as format_dns_result
+from log_classifier import EVENT_AUTH_FAILURE
+from stats_panel import StatsPanel, format_rate
+from log_view import LogModel, LogView, DEFAULT_MAX_LINES
+from privileged_helper import HelperClient
+import app_log
+# config_dialog, migration_utils and metrics_exporter are imported where used:
+# none of them is needed before the tray icon is up
+
+log = app_log.get_logger("ui")
+output_log = app_log.get_logger("runner") # openfortivpn output and session messages
+
+STATE_LABELS = {
+    "connecting": "Conectando",
+    "connected": "Conectado",
+    "failover": "Failover",
+    "reconnecting": "Reconectando",
+    "disconnecting": "Desconectando",
+    "disconnected": "Desconectado",
+}
+
+
+class StartupReport:
+    """Milestones of the startup, printed once the event loop is idle (--startup-report)."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.marks = [("imports", time.perf_counter() - _START)] if enabled else []
+
+    def mark(self, name):
+        if self.enabled:
+            self.marks.append((name, time.perf_counter() - _START))
+
+    def report(self):
+        if not self.enabled:
+            return
+        self.mark("event loop idle")
+        lines = [f"  {name:<24}{t * 1000:8.1f} ms" for name, t in self.marks]
+        text = "Startup report (since interpreter start):\n" + "\n".join(lines)
+        log.info(text)
 
 class LogDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, model, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Logs de Conexión (Verbose)")
         self.resize(600, 400)
         layout = QVBoxLayout()
-        self.text_edit = QTextEdit()
-        self.text_edit.setReadOnly(True)
-        self.text_edit.setStyleSheet("font-family: monospace; font-size: 10px; background: #222; color: #eee;")
-        layout.addWidget(self.text_edit)
+        # Only the visible lines are laid out, however long the model is
+        self.view = LogView(model)
+        self.view.setStyleSheet("font-family: monospace; font-size: 10px; background: #222; color: #eee;")
+        layout.addWidget(self.view)
         self.setLayout(layout)
 
-    def append_log(self, text):
-        self.text_edit.append(text)
-        # Auto scroll
-        sb = self.text_edit.verticalScrollBar()
-        sb.setValue(sb.maximum())
-
 class HelpDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -67,8 +104,10 @@ class HelpDialog(QDialog):
         self.setLayout(layout)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, use_helper=False, minimized=False, startup=None, log_lines=DEFAULT_MAX_LINES):
         super().__init__()
+        self._force_quit = False
+        self.startup = startup or StartupReport(False)
 
         self.setWindowTitle("ofvpn-gui")
         self.resize(400, 550) # Taller for logos
@@ -82,30 +121,46 @@ class MainWindow(QMainWindow):
             self.app_icon = QIcon()
         
         # Managers
-        self.vpn_manager = VPNManager()
+        # Optional long-lived privileged helper (--helper): one pkexec per session
+        self.helper = HelperClient() if use_helper else None
         self.profile_manager = ProfileManager()
+        self.vpn_manager = VPNManager(helper=self.helper,
+                                      health=GatewayHealth(self.profile_manager.config_dir),
+                                      archive=SessionArchive(self.profile_manager.config_dir))
+        self.startup.mark("managers")
         
-        # Log Dialog
-        self.log_dialog = LogDialog(self)
+        # Log: the model keeps the last log_lines lines from the start,
+        # the dialog showing it is built the first time it is opened
+        self.log_model = LogModel(log_lines, self)
+        self.log_dialog = None
         
         # System Tray
         self.init_system_tray()
+        self.startup.mark("tray icon")
 
-        # UI
+        # UI (the logo is scaled on first show: nobody sees it while minimized)
+        self.logo_loaded = False
         self.setup_ui()
+        if not minimized:
+            self.load_logo()
+        self.startup.mark("main window")
         
-        # Signals
-        self.vpn_manager.state_changed.connect(self.on_vpn_state_changed)
-        self.vpn_manager.log_message.connect(self.on_log_message)
-        self.vpn_manager.connection_failed.connect(self.on_connection_failed)
-        self.vpn_manager.cert_trust_needed.connect(self.on_cert_trust_needed)
-        self.vpn_manager.connection_details_received.connect(self.on_connection_details)
-        self.vpn_manager.traffic_stats_updated.connect(self.on_traffic_updated)
+        # Signals: one VPNSession per profile, wired as it is created
+        self.vpn_manager.session_added.connect(self.on_session_added)
+        self.vpn_manager.dns_resolved.connect(self.on_dns_resolved)
+        self.profile_combo.currentIndexChanged.connect(self.on_profile_selected)
+        # Resolve the selected profile's gateways while the user gets to the button
+        QTimer.singleShot(0, self.prefetch_selected_profile)
 
         # Migration Check (Post-Startup)
         QTimer.singleShot(1000, self.check_migrations)
 
+    def showEvent(self, event):
+        self.load_logo()
+        super().showEvent(event)
+
     def check_migrations(self):
+        import migration_utils
         legacy = migration_utils.detect_legacy_configs()
         if not legacy:
             return
@@ -192,7 +247,7 @@ class MainWindow(QMainWindow):
                 
                 subprocess.Popen(cmd)
             except Exception as e:
-                print(f"Failed to send notification: {e}")
+                log.warning(f"Failed to send notification: {e}")
                 # Fallback to Qt tray message if native fails
                 self.tray_icon.showMessage(title, message, QSystemTrayIcon.Information, 3000)
         else:
@@ -211,6 +266,11 @@ class MainWindow(QMainWindow):
         self.action_show.triggered.connect(self.toggle_window)
         tray_menu.addAction(self.action_show)
         
+        self.action_disconnect_all = QAction("Desconectar todos", self)
+        self.action_disconnect_all.triggered.connect(lambda: self.vpn_manager.disconnect_vpn())
+        self.action_disconnect_all.setEnabled(False)
+        tray_menu.addAction(self.action_disconnect_all)
+        
         tray_menu.addSeparator()
         
         self.action_quit = QAction("Salir", self)
@@ -232,11 +292,6 @@ class MainWindow(QMainWindow):
         if reason == QSystemTrayIcon.Trigger:
             self.toggle_window()
 
-    def quit_app(self):
-        # Explicit quit from Tray
-        self.vpn_manager.blocking_stop()
-        QApplication.quit()
-
     def setup_ui(self):
         # Central Widget
         central_widget = QWidget()
@@ -266,17 +321,11 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(profile_layout)
         
-        # Branding (Logo)
+        # Branding (Logo), pixmap set by load_logo()
         logo_layout = QVBoxLayout()
-        logo_lbl = QLabel()
-        logo_path = os.path.join(os.path.dirname(__file__), "..", "assets", "openfortivpn_isologo.png")
-        if os.path.exists(logo_path):
-            pixmap = QPixmap(logo_path)
-            # Resize bigger (200)
-            pixmap = pixmap.scaledToWidth(200, Qt.SmoothTransformation)
-            logo_lbl.setPixmap(pixmap)
-            logo_lbl.setAlignment(Qt.AlignCenter)
-            logo_layout.addWidget(logo_lbl)
+        self.logo_lbl = QLabel()
+        self.logo_lbl.setAlignment(Qt.AlignCenter)
+        logo_layout.addWidget(self.logo_lbl)
             
         title_lbl = QLabel("OpenFortiVPN by ciex")
         title_lbl.setAlignment(Qt.AlignCenter)
@@ -297,6 +346,12 @@ class MainWindow(QMainWindow):
         self.connect_button.setStyleSheet("font-size: 16px; padding: 15px; font-weight: bold;")
         layout.addWidget(self.connect_button)
         
+        # Every running tunnel (profiles can be connected at the same time)
+        self.tunnels_label = QLabel()
+        self.tunnels_label.setStyleSheet("font-size: 10px; color: #cccccc; margin: 4px;")
+        self.tunnels_label.hide()
+        layout.addWidget(self.tunnels_label)
+        
         # Traffic Stats Panel
         self.stats_panel = StatsPanel()
         layout.addWidget(self.stats_panel)
@@ -312,14 +367,115 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(tools_layout)
         
+    def load_logo(self):
+        if self.logo_loaded:
+            return
+        self.logo_loaded = True
+        logo_path = os.path.join(os.path.dirname(__file__), "..", "assets", "openfortivpn_isologo.png")
+        if os.path.exists(logo_path):
+            pixmap = QPixmap(logo_path)
+            # Resize bigger (200)
+            pixmap = pixmap.scaledToWidth(200, Qt.SmoothTransformation)
+            self.logo_lbl.setPixmap(pixmap)
+        else:
+            self.logo_lbl.hide()
+
+    def ensure_log_dialog(self):
+        if self.log_dialog is None:
+            self.log_dialog = LogDialog(self.log_model, self)
+        return self.log_dialog
+
     def show_logs(self):
-        self.log_dialog.show()
-        self.log_dialog.raise_()
-        self.log_dialog.activateWindow()
-        
+        dialog = self.ensure_log_dialog()
+        dialog.show()
+        dialog.raise_()
+        dialog.activateWindow()
+        
+    def current_session(self):
+        """VPNSession of the profile selected in the combo (None if never connected)."""
+        return self.vpn_manager.sessions.get(self.profile_combo.currentData())
+
+    def on_session_added(self, session):
+        def selected_only(slot):
+            # Status label, button and stats panel show the selected profile only
+            return lambda *args: slot(*args) if session is self.current_session() else None
+
+        session.state_changed.connect(functools.partial(self.on_session_state_changed, session))
+        session.log_message.connect(functools.partial(self.on_session_log, session))
+        session.connection_failed.connect(functools.partial(self.on_connection_failed, session))
+        session.cert_trust_needed.connect(functools.partial(self.on_cert_trust_needed, session))
+        session.traffic_rates_updated.connect(self.update_tunnels_summary)
+        session.connection_details_received.connect(selected_only(self.on_connection_details))
+        session.traffic_stats_updated.connect(selected_only(self.on_traffic_updated))
+        session.link_stats_updated.connect(selected_only(self.stats_panel.update_link_stats))
+        session.traffic_rates_updated.connect(selected_only(self.stats_panel.update_rates))
+        session.latency_updated.connect(selected_only(self.stats_panel.update_latency))
+        if session is self.current_session():
+            self.stats_panel.set_history(session.traffic_history)
+
+    def prefetch_selected_profile(self):
+        profile_id = self.profile_combo.currentData()
+        profile = next((p for p in self.profile_manager.get_profiles() if p['id'] == profile_id), None)
+        if profile and profile.get('gateways'):
+            self.vpn_manager.prefetch_dns(profile['gateways'])
+
+    def on_dns_resolved(self, results):
+        for result in results:
+            self.on_log_message(format_dns_result(result))
+
+    def on_profile_selected(self):
+        """Shows the tunnel of the newly selected profile."""
+        self.prefetch_selected_profile()
+        session = self.current_session()
+        self.stats_panel.reset()
+        if session is None:
+            self.on_vpn_state_changed("disconnected")
+            return
+        self.stats_panel.set_history(session.traffic_history)
+        self.on_vpn_state_changed(session.state)
+        if session.state == "connected":
+            self.stats_panel.update_details(session.session_data)
+
+    def on_session_state_changed(self, session, state):
+        if state == "failover":
+            self.send_notification("Failover", f"{session.name}: cambiando a servidor de respaldo...", "critical")
+        elif state == "connected":
+            gateway = session.current_gateway()
+            gateway_host = gateway['host'] if gateway else "VPN"
+            self.send_notification("Conectado", f"{session.name}: conexión establecida con {gateway_host}")
+        if session is self.current_session():
+            self.on_vpn_state_changed(state)
+        self.update_tunnels_summary()
+
+    def update_tunnels_summary(self):
+        """Per-tunnel state and throughput, in the window and the tray tooltip."""
+        lines = []
+        for session in self.vpn_manager.sessions.values():
+            if session.state == "disconnected":
+                continue
+            line = f"{session.name}: {STATE_LABELS.get(session.state, session.state)}"
+            if session.state == "connected":
+                history = session.traffic_history
+                line += f" · ↓ {format_rate(history.rx_ewma)} ↑ {format_rate(history.tx_ewma)}"
+            lines.append(line)
+        self.action_disconnect_all.setEnabled(bool(lines))
+        self.tray_icon.setToolTip("ofvpn-gui\n" + "\n".join(lines) if lines else "ofvpn-gui: Desconectado")
+        # The selected tunnel already fills the window: list them only when there are several
+        if len(lines) > 1:
+            self.tunnels_label.setText("\n".join(lines))
+            self.tunnels_label.show()
+        else:
+            self.tunnels_label.hide()
+
+    def on_session_log(self, session, text):
+        if len(self.vpn_manager.sessions) > 1:
+            # Several profiles used in this run: tell their output apart
+            text = "\n".join(f"[{session.name}] {line}" for line in text.split("\n"))
+        self.on_log_message(text)
+
     def on_log_message(self, text):
-        print(text) # Still print to stdout
-        self.log_dialog.append_log(text)
+        output_log.info(text) # Still on stdout (and debug.log), written off the GUI thread
+        self.log_model.append_text(text)
 
     def on_connection_details(self, data):
         self.stats_panel.update_details(data)
@@ -346,6 +502,7 @@ class MainWindow(QMainWindow):
                 self.profile_combo.setCurrentIndex(index)
 
     def open_config(self):
+        from config_dialog import ConfigDialog
         dialog = ConfigDialog(self.profile_manager, self)
         dialog.exec()
         self.update_profile_combo()
@@ -358,67 +515,109 @@ class MainWindow(QMainWindow):
                 self.connect_button.setChecked(False)
                 return
 
-            # Retrieve profile to check requirements
-            profile = next((p for p in self.profile_manager.get_profiles() if p['id'] == profile_id), None)
-            if not profile:
-                 return
-
-            runtime_password = None
-            runtime_otp = None
-
-            # Check if password is empty -> Prompt
-            if not profile.get('password'):
-                pwd, ok = QInputDialog.getText(self, "Contraseña Requerida", 
-                                               f"Contraseña para {profile['username']}:", QLineEdit.Password)
-                if ok and pwd:
-                    runtime_password = pwd
-                else:
-                    self.connect_button.setChecked(False)
-                    return # User cancelled
-
-            # Check if OTP is enabled -> Prompt
-            if profile.get('otp_enabled'):
-                otp, ok = QInputDialog.getText(self, "OTP Requerido", 
-                                               "Ingrese código OTP/Token:", QLineEdit.Normal)
-                if ok and otp:
-                    runtime_otp = otp
-                else:
-                    self.connect_button.setChecked(False)
-                    return # User cancelled
-
-            try:
-                # Generate all configs for failover with runtime creds
-                config_paths = self.profile_manager.generate_all_openfortivpn_configs(
-                    profile_id, 
-                    runtime_password=runtime_password,
-                    runtime_otp=runtime_otp
-                )
-                self.vpn_manager.connect_vpn(config_paths)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", str(e))
-                self.connect_button.setChecked(False)
+            # The first keyring access happens here, on a worker thread: an
+            # unlock prompt must not freeze the window
+            self.connect_button.setEnabled(False)
+            self.status_label.setText("Leyendo contraseña del llavero...")
+            self.profile_manager.fetch_password(profile_id,
+                                                functools.partial(self.continue_connection, profile_id))
         else:
-            self.vpn_manager.disconnect_vpn()
+            self.vpn_manager.disconnect_vpn(self.profile_combo.currentData())
+
+    def continue_connection(self, profile_id, stored_password):
+        """Second half of toggle_connection, once the stored password was read."""
+        selected = profile_id == self.profile_combo.currentData()
+        if selected:
+            self.connect_button.setEnabled(True)
+        # Retrieve profile to check requirements (it may be gone by now)
+        profile = next((p for p in self.profile_manager.get_profiles() if p['id'] == profile_id), None)
+        if not profile:
+            self.cancel_connection(selected)
+            return
 
-    def on_connection_failed(self, reason):
-        QMessageBox.warning(self, "Fallo de Conexión", reason)
+        # The stored password travels with the factory: a relaunch must not
+        # hit the keyring again from the GUI thread
+        runtime_password = stored_password or None
+        runtime_otp = None
+
+        # Check if password is empty -> Prompt
+        if not stored_password:
+            pwd, ok = QInputDialog.getText(self, "Contraseña Requerida", 
+                                           f"Contraseña para {profile['username']}:", QLineEdit.Password)
+            if ok and pwd:
+                runtime_password = pwd
+            else:
+                self.cancel_connection(selected)
+                return # User cancelled
+
+        # Check if OTP is enabled -> Prompt
+        if profile.get('otp_enabled'):
+            otp, ok = QInputDialog.getText(self, "OTP Requerido", 
+                                           "Ingrese código OTP/Token:", QLineEdit.Normal)
+            if ok and otp:
+                runtime_otp = otp
+            else:
+                self.cancel_connection(selected)
+                return # User cancelled
+
+        try:
+            if not profile.get('gateways'):
+                raise ValueError("Profile invalid or no gateways")
+            # Keep the runtime credentials in memory so a dropped tunnel can be
+            # relaunched without prompting again. An OTP cannot be replayed.
+            auto_reconnect = profile.get('auto_reconnect', False)
+            if auto_reconnect and profile.get('otp_enabled'):
+                self.on_log_message("Reconexión automática no disponible: el perfil usa OTP.")
+                auto_reconnect = False
+            # Configs are rendered in memory, one per attempt, when needed
+            config_factory = functools.partial(
+                self.profile_manager.render_openfortivpn_config,
+                profile_id,
+                runtime_password=runtime_password,
+                runtime_otp=runtime_otp
+            )
+            # Other profiles' tunnels keep running: each one is its own session
+            session = self.vpn_manager.connect_vpn(profile_id, config_factory, profile['gateways'],
+                                                   name=profile['name'],
+                                                   latency_target=profile.get('latency_target'),
+                                                   auto_reconnect=auto_reconnect,
+                                                   connect_by_ip=self.profile_manager.connects_by_ip(profile))
+            if selected:
+                # Replaces "Leyendo contraseña..." also when the session refused to
+                # start (still shutting down the previous attempt)
+                self.on_vpn_state_changed(session.state)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e))
+            self.cancel_connection(selected)
+
+    def cancel_connection(self, selected):
+        """A connect that never started: back to disconnected if its profile is still shown."""
+        session = self.current_session()
+        if selected and (session is None or session.state == "disconnected"):
+            self.on_vpn_state_changed("disconnected")
+
+    def on_connection_failed(self, session, reason):
+        if session.last_failure_reason == EVENT_AUTH_FAILURE:
+            # The password may have been changed in the keyring: read it again next time
+            self.profile_manager.invalidate_password(session.session_id)
+        self.send_notification("Fallo de Conexión", f"{session.name}: {reason}", "critical")
+        QMessageBox.warning(self, "Fallo de Conexión", f"{session.name}: {reason}")
+        if session is not self.current_session():
+            return
         self.connect_button.setChecked(False)
         self.status_label.setText("Fallo de Conexión")
         self.status_label.setStyleSheet("color: red; font-size: 14px; margin: 10px;")
         self.connect_button.setText("Conectar")
         self.connect_button.setEnabled(True)
         self.stats_panel.reset()
-        self.send_notification("Fallo de Conexión", reason, "critical")
 
-    def on_cert_trust_needed(self, cert_hash):
-        profile_id = self.profile_combo.currentData()
-        if not profile_id:
-            return
+    def on_cert_trust_needed(self, session, cert_hash):
+        profile_id = session.session_id
 
         reply = QMessageBox.question(
             self, 
             "Certificado No Confiable", 
-            f"El gateway presentó un certificado nuevo.\nHash: {cert_hash}\n\n¿Desea confiar en este certificado y actualizar el perfil?",
+            f"El gateway de {session.name} presentó un certificado nuevo.\nHash: {cert_hash}\n\n¿Desea confiar en este certificado y actualizar el perfil?",
             QMessageBox.Yes | QMessageBox.No
         )
         
@@ -427,6 +626,8 @@ class MainWindow(QMainWindow):
             self.profile_manager.update_profile(profile_id, {'trusted_cert': cert_hash})
             QMessageBox.information(self, "Actualizado", "Certificado actualizado. Intente conectar nuevamente.")
         
+        if session is not self.current_session():
+            return
         self.connect_button.setChecked(False)
         self.status_label.setText("Certificado Actualizado" if reply == QMessageBox.Yes else "Conexión Cancelada")
         self.status_label.setStyleSheet("color: orange; font-size: 14px; margin: 10px;")
@@ -435,6 +636,7 @@ class MainWindow(QMainWindow):
         self.stats_panel.reset()
 
     def on_vpn_state_changed(self, state):
+        """Window state for the selected profile's session (see on_session_state_changed)."""
 
         if state == "connecting":
             self.status_label.setText("Conectando...")
@@ -442,48 +644,55 @@ class MainWindow(QMainWindow):
             self.connect_button.setEnabled(True)
             self.connect_button.setStyleSheet("background-color: #ff9800; color: white; font-size: 16px; padding: 15px; font-weight: bold; border-radius: 5px;")
             self.stats_panel.reset()
+        elif state == "reconnecting":
+             self.status_label.setText("Reconectando...")
+             self.status_label.setStyleSheet("color: #ff9800; font-size: 14px; margin: 10px;")
+             self.connect_button.setText("Cancelar")
+             self.connect_button.setChecked(True)
+             self.connect_button.setStyleSheet("background-color: #ff9800; color: white; font-size: 16px; padding: 15px; font-weight: bold; border-radius: 5px;")
         elif state == "failover":
              self.status_label.setText("Reintentando (Failover)...")
              self.status_label.setStyleSheet("color: #ff9800; font-size: 14px; margin: 10px;")
              self.connect_button.setStyleSheet("background-color: #ff9800; color: white; font-size: 16px; padding: 15px; font-weight: bold; border-radius: 5px;")
-             self.send_notification("Failover", "Cambiando a servidor de respaldo...", "critical")
+        elif state == "disconnecting":
+            self.status_label.setText("Desconectando...")
+            self.status_label.setStyleSheet("color: #cccccc; font-size: 14px; margin: 10px;")
+            self.connect_button.setText("Desconectando...")
+            self.connect_button.setChecked(False)
+            self.connect_button.setEnabled(False) # Re-enabled once the process is gone
         elif state == "connected":
             # Get Gateway info
-            profile_id = self.profile_combo.currentData()
             gateway_host = "VPN" # Default
-            if profile_id:
-                 profile = next((p for p in self.profile_manager.get_profiles() if p['id'] == profile_id), None)
-                 if profile and self.vpn_manager.current_attempt_index < len(profile['gateways']):
-                     gateway = profile['gateways'][self.vpn_manager.current_attempt_index]
-                     gateway_host = f"{gateway['host']}"
+            session = self.current_session()
+            gateway = session.current_gateway() if session else None
+            if gateway:
+                gateway_host = f"{gateway['host']}"
 
             self.status_label.setText(f"CONECTADO A {gateway_host}")
             self.status_label.setStyleSheet("color: #4caf50; font-weight: bold; font-size: 14px; margin: 10px;")
             self.connect_button.setText("Desconectar")
             self.connect_button.setChecked(True)
             self.connect_button.setStyleSheet("background-color: #f44336; color: white; font-size: 16px; padding: 15px; font-weight: bold; border-radius: 5px;")
-            self.send_notification("Conectado", f"Conexión establecida con {gateway_host}")
-            self.tray_icon.setToolTip(f"ofvpn-gui: Conectado a {gateway_host}")
         elif state == "disconnected":
             # Only reset if not handled by failed handler
             self.status_label.setText("Desconectado")
             self.status_label.setStyleSheet("color: #cccccc; font-size: 14px; margin: 10px;")
             self.connect_button.setText("Conectar")
             self.connect_button.setChecked(False)
+            self.connect_button.setEnabled(True)
             # Reset style to default (or explicit gray)
             self.connect_button.setStyleSheet("font-size: 16px; padding: 15px; font-weight: bold;") 
             self.stats_panel.reset()
-            self.tray_icon.setToolTip("ofvpn-gui: Desconectado")
-
-    def show_logs(self):
-        self.log_dialog.show()
 
     def show_help(self):
         dialog = HelpDialog(self)
         dialog.exec()
 
     def quit_app(self):
-        """Force application exit, bypassing minimize-to-tray."""
+        """
+        Force application exit, bypassing minimize-to-tray. Tunnels are
+        stopped once the event loop returns (see main), for every quit path.
+        """
         self._force_quit = True
         QApplication.quit()
 
@@ -491,7 +700,6 @@ class MainWindow(QMainWindow):
         # Check if we should quit or minimize
         if self._force_quit:
             # Explicit quit requested (e.g. from Tray)
-            self.vpn_manager.blocking_stop()
             event.accept()
         elif self.tray_icon.isVisible():
             # User clicked 'X', minimize to tray
@@ -499,13 +707,11 @@ class MainWindow(QMainWindow):
             self.send_notification("OpenFortiVPN GUI", "La aplicación sigue ejecutándose en segundo plano.")
             event.ignore()
         else:
-            # Fallback (tray not active)
-            self.vpn_manager.blocking_stop()
+            # Fallback (tray not active): the app quits, main() stops the tunnels
             event.accept()
 
 from styles import apply_dark_theme
 
-import logging
 import traceback
 
 def setup_logging():
@@ -519,21 +725,29 @@ def setup_logging():
             
     log_file = os.path.join(log_dir, "debug.log")
     
-    logging.basicConfig(
-        filename=log_file,
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
+    # Levels per subsystem: --log-levels runner=WARNING,ui=DEBUG (INFO by default)
+    app_log.setup(log_file=log_file, levels=app_log.parse_levels(flag_value("--log-levels")))
     return log_file
 
+def flag_value(flag):
+    """Value given as '--flag value' or '--flag=value' on the command line, or None."""
+    for i, arg in enumerate(sys.argv):
+        if arg == flag and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(flag + "="):
+            return arg.split("=", 1)[1]
+    return None
+
 if __name__ == "__main__":
+    startup = StartupReport("--startup-report" in sys.argv)
+
     # Setup global logging
     try:
         log_file = setup_logging()
-        logging.info("=== Application Startup ===")
-        logging.info(f"Args: {sys.argv}")
-        logging.info(f"CWD: {os.getcwd()}")
-        logging.info(f"User: {os.environ.get('USER')} (UID: {os.getuid()})")
+        log.info("=== Application Startup ===")
+        log.info(f"Args: {sys.argv}")
+        log.info(f"CWD: {os.getcwd()}")
+        log.info(f"User: {os.environ.get('USER')} (UID: {os.getuid()})")
         
     except Exception as e:
         print(f"Failed to setup logging: {e}")
@@ -546,29 +760,55 @@ if __name__ == "__main__":
             # This assumes standard systemd location: /run/user/<uid>/bus
             dbus_address = f"unix:path=/run/user/{sudo_uid}/bus"
             os.environ['DBUS_SESSION_BUS_ADDRESS'] = dbus_address
-            logging.info(f"Injected DBUS_SESSION_BUS_ADDRESS: {dbus_address}")
+            log.info(f"Injected DBUS_SESSION_BUS_ADDRESS: {dbus_address}")
 
         app = QApplication(sys.argv)
         apply_dark_theme(app)
         
-        logging.info("Initializing MainWindow...")
-        window = MainWindow()
+        log.info("Initializing MainWindow...")
+        startup.mark("QApplication")
+        window = MainWindow(use_helper="--helper" in sys.argv,
+                            minimized="--minimized" in sys.argv,
+                            startup=startup,
+                            log_lines=int(flag_value("--log-lines") or DEFAULT_MAX_LINES))
+
+        # Optional OpenMetrics endpoint: --metrics-port N (127.0.0.1) or --metrics-socket PATH
+        metrics_port = flag_value("--metrics-port")
+        metrics_socket = flag_value("--metrics-socket")
+        exporter = None
+        if metrics_port or metrics_socket:
+            from metrics_exporter import MetricsExporter
+            exporter = MetricsExporter(window.vpn_manager,
+                                       port=int(metrics_port) if metrics_port else None,
+                                       socket_path=metrics_socket)
+            exporter.start()
+            log.info(f"Metrics exporter on {metrics_socket or '127.0.0.1:' + metrics_port}")
         
         # Check for minimized flag (e.g. from autostart)
         if "--minimized" in sys.argv:
-            logging.info("Starting minimized to tray...")
+            log.info("Starting minimized to tray...")
             # Window not shown, but tray icon is initialized in __init__
         else:
-            logging.info("Showing window...")
+            log.info("Showing window...")
             window.show()
             
-        logging.info("Entering event loop...")
+        log.info("Entering event loop...")
+        # Runs once the first batch of events (show, paint) has been processed
+        QTimer.singleShot(0, startup.report)
         exit_code = app.exec()
-        logging.info(f"Application exit with code {exit_code}")
+        window.profile_manager.flush() # A profile edit still waiting to be coalesced
+        if exporter:
+            exporter.stop()
+        # Every quit path gets here, including the tray's Quit with the window
+        # hidden (no closeEvent): stop the runners before their threads go away
+        window.vpn_manager.blocking_stop()
+        if window.helper:
+            # Closing the session makes the helper stop its tunnels and exit
+            window.helper.close()
+        log.info(f"Application exit with code {exit_code}")
         sys.exit(exit_code)
         
     except Exception as e:
         err_msg = f"Fatal Error: {str(e)}\n{traceback.format_exc()}"
-        logging.critical(err_msg)
-        print(err_msg)
+        log.critical(err_msg)
         sys.exit(1)
@@ -0,0 +1,204 @@
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PySide6.QtCore import QObject
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+STATES = ("disconnected", "connecting", "connected", "failover", "reconnecting", "disconnecting")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class _SessionMetrics:
+    """What the exporter tracks for one VPNSession between renders."""
+
+    def __init__(self, session):
+        self.session = session
+        self.state = session.state
+        self.state_since = time.time()
+        self.failovers = 0
+        self.reconnects = 0
+        self.link = {} # Counters of the tunnel interface (see link_stats)
+        self.latency = None # Last latency_monitor report
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.exporter.snapshot() # Precomputed: no work, no locks held long
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return "unix" if isinstance(self.client_address, (str, bytes)) else super().address_string()
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the output
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        conn, _ = self.socket.accept()
+        return conn, "unix"
+
+
+class MetricsExporter(QObject):
+    """
+    Serves tunnel metrics as OpenMetrics text on 127.0.0.1:<port> or on a
+    Unix socket, one series per tunnel (label "profile"). The text is
+    rendered in the GUI thread whenever a watched signal fires (at most
+    about once per second per tunnel) and swapped in atomically; the server
+    thread only copies the latest snapshot, so a scrape never touches the
+    event loop.
+    """
+
+    def __init__(self, vpn_manager, port=None, socket_path=None):
+        super().__init__()
+        self.vpn_manager = vpn_manager
+        self.port = port
+        self.socket_path = socket_path
+        self.server = None
+        self._snapshot = b"# EOF\n"
+
+        self.start_time = time.time()
+        self.tracked = {} # Session id -> _SessionMetrics
+
+        vpn_manager.session_added.connect(self._on_session_added)
+        for session in vpn_manager.sessions.values():
+            self._on_session_added(session)
+        self._render()
+
+    def start(self):
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            umask = os.umask(0o077) # Created owner-only: never connectable by others, not even briefly
+            try:
+                self.server = _UnixHTTPServer(self.socket_path, _MetricsHandler)
+            finally:
+                os.umask(umask)
+        else:
+            # Loopback only: tunnel health is nobody else's business
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), _MetricsHandler)
+            self.server.daemon_threads = True
+        self.server.exporter = self
+        threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True).start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            if self.socket_path:
+                try:
+                    os.remove(self.socket_path)
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        return self._snapshot # Reference swap in _render(), atomic under the GIL
+
+    def _on_session_added(self, session):
+        tracked = self.tracked[session.session_id] = _SessionMetrics(session)
+        session.state_changed.connect(lambda state: self._on_state_changed(tracked, state))
+        session.link_stats_updated.connect(lambda stats: self._on_link_stats(tracked, stats))
+        session.latency_updated.connect(lambda data: self._on_latency(tracked, data))
+        self._render()
+
+    def _on_state_changed(self, tracked, state):
+        if state == "failover":
+            tracked.failovers += 1
+        elif state == "reconnecting":
+            tracked.reconnects += 1
+        if state != tracked.state:
+            tracked.state = state
+            tracked.state_since = time.time()
+        if state != "connected":
+            tracked.link = {}
+            tracked.latency = None
+        self._render()
+
+    def _on_link_stats(self, tracked, stats):
+        tracked.link = stats
+        self._render()
+
+    def _on_latency(self, tracked, data):
+        tracked.latency = data
+        self._render()
+
+    def _render(self):
+        sessions = list(self.tracked.values())
+        out = []
+
+        def metric(name, kind, help_text, samples):
+            out.append(f"# TYPE {name} {kind}")
+            out.append(f"# HELP {name} {help_text}")
+            for suffix, labels, value in samples:
+                out.append(f"{name}{suffix}{labels} {value}")
+
+        def profile(t, **labels):
+            return _labels(profile=t.session.name, **labels)
+
+        metric("ofvpn_state", "stateset", "Current tunnel state.",
+               [("", profile(t, ofvpn_state=s), int(s == t.state)) for t in sessions for s in STATES])
+        metric("ofvpn_state_change_timestamp_seconds", "gauge", "Time of the last state change.",
+               [("", profile(t), f"{t.state_since:.3f}") for t in sessions])
+        metric("ofvpn_process_start_time_seconds", "gauge", "Start time of the GUI process.",
+               [("", "", f"{self.start_time:.3f}")])
+
+        def gateway_index(t):
+            index = t.session.current_gateway_index() if t.state != "disconnected" else None
+            return -1 if index is None else index
+
+        metric("ofvpn_gateway_index", "gauge", "Profile index of the current gateway, -1 if none.",
+               [("", profile(t), gateway_index(t)) for t in sessions])
+        metric("ofvpn_failovers", "counter", "Switches to the next gateway after a failed attempt.",
+               [("_total", profile(t), t.failovers) for t in sessions])
+        metric("ofvpn_reconnects", "counter", "Reconnect rounds after a dropped tunnel.",
+               [("_total", profile(t), t.reconnects) for t in sessions])
+
+        timed = [(t, t.session.phase_history.records[-1]) for t in sessions if t.session.phase_history.records]
+        if timed:
+            metric("ofvpn_connect_duration_seconds", "gauge", "Duration of the last connection attempt.",
+                   [("", profile(t, ok=str(last["ok"]).lower()), f"{last['total']:.3f}") for t, last in timed])
+            metric("ofvpn_connect_phase_seconds", "gauge", "Phase breakdown of the last connection attempt.",
+                   [("", profile(t, phase=name), f"{seconds:.3f}")
+                    for t, last in timed for name, seconds in last["phases"]])
+
+        linked = [t for t in sessions if t.link]
+        if linked:
+            metric("ofvpn_receive_bytes", "counter", "Bytes received on the tunnel interface.",
+                   [("_total", profile(t), t.link["rx_bytes"]) for t in linked])
+            metric("ofvpn_transmit_bytes", "counter", "Bytes sent on the tunnel interface.",
+                   [("_total", profile(t), t.link["tx_bytes"]) for t in linked])
+            metric("ofvpn_link_errors", "counter", "Receive and transmit errors on the tunnel interface.",
+                   [("_total", profile(t), t.link["rx_errors"] + t.link["tx_errors"]) for t in linked])
+
+        probed = [t for t in sessions if t.latency]
+        if probed:
+            samples = [("", profile(t, quantile=q), f"{t.latency[key] / 1000:.6f}")
+                       for t in probed
+                       for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99"))
+                       if t.latency[key] is not None]
+            if samples:
+                metric("ofvpn_latency_seconds", "gauge", "In-tunnel round-trip time quantiles.", samples)
+            metric("ofvpn_latency_loss_ratio", "gauge", "Share of lost latency probes.",
+                   [("", profile(t), f"{t.latency['loss_pct'] / 100:.4f}") for t in probed])
+
+        out.append("# EOF")
+        self._snapshot = ("\n".join(out) + "\n").encode()
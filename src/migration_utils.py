@@ -1,6 +1,10 @@
 import os
 import re
 
+import app_log
+
+log = app_log.get_logger("profiles")
+
 LEGACY_PATHS = [
     os.path.expanduser("~/.openfortivpn/config"),
     "/etc/openfortivpn/config"
@@ -23,7 +27,7 @@ def detect_legacy_configs():
                     'content': content
                 })
             except Exception as e:
-                print(f"Error parsing {path}: {e}")
+                log.error(f"Error parsing {path}: {e}")
     return found
 
 def parse_config(path):
@@ -65,7 +69,7 @@ def secure_delete(path):
         # Remove
         os.remove(path)
     except Exception as e:
-        print(f"Error secure deleting {path}: {e}")
+        log.error(f"Error secure deleting {path}: {e}")
         # Try normal remove if overwrite failed (e.g. permissions, though we checked write access ideally)
         if os.path.exists(path):
             os.remove(path)
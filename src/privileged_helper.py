@@ -0,0 +1,367 @@
+"""
+Long-lived privileged helper for openfortivpn-gui.
+
+Started once per session (through pkexec, or directly when already root)
+and reached over a Unix socket only the GUI user can connect to. It starts
+openfortivpn instances, streams their output back and kills them by exact
+PID, so connects and gateway failovers skip a fresh privilege escalation.
+
+Protocol: one JSON object per line in both directions.
+    -> {"cmd": "hello"}      Session connection. When it closes, the helper
+                              stops every child and exits.
+    -> {"cmd": "start"}      Sent with a readable config descriptor (memfd,
+                              SCM_RIGHTS). Replies {"pid": N}, then
+                              {"out": "<line>"}... and finally {"exit": code}.
+    -> {"cmd": "stop"}       On a start connection: terminate that child.
+    <- {"error": "..."}      Request refused.
+
+This module only uses the standard library: it runs as root under pkexec,
+with a sanitized environment and without the GUI's virtualenv.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import privileges
+
+STOP_GRACE = 2.0 # Seconds between SIGTERM and SIGKILL
+START_TIMEOUT = 60.0 # Seconds to wait for the helper socket (includes the polkit prompt)
+RUN_DIR = "/run/openfortivpn-gui" # Helper sockets, in a directory only root can write
+# The keys profile_manager.render_openfortivpn_config writes. Anything else
+# (pppd-plugin, pppd-call, pppd-log...) would let the user run code as root.
+ALLOWED_CONFIG_KEYS = frozenset(("host", "port", "username", "password", "trusted-cert", "sni", "otp"))
+MAX_CONFIG_SIZE = 65536
+
+
+def runtime_dir(uid=None):
+    """
+    The user's private directory for the GUI's own sockets (created if
+    missing). The /tmp fallback is shared: the directory is only accepted
+    if lstat() shows a real directory owned by uid with mode 0700, since
+    another user may have created it first.
+    """
+    uid = os.getuid() if uid is None else uid
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    path = os.path.join(base, f"ofvpn-gui-{uid}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or stat.S_IMODE(st.st_mode) != 0o700:
+        raise RuntimeError(f"{path} no es un directorio privado (0700) del usuario {uid}, no se usa")
+    return path
+
+
+def helper_socket_path(uid=None):
+    """Where the helper of uid listens. Chosen by the helper itself, not by the caller."""
+    uid = os.getuid() if uid is None else uid
+    return os.path.join(RUN_DIR, f"helper-{uid}.sock")
+
+
+def _send(conn, obj):
+    conn.sendall((json.dumps(obj) + "\n").encode())
+
+
+def _peer_uid(conn):
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    return uid
+
+
+# --- Server side (runs as root) ---
+
+def check_config(fd):
+    """
+    Reads the config behind fd (without moving its offset). Returns None
+    if it only sets ALLOWED_CONFIG_KEYS, else why it is refused.
+    """
+    size = os.fstat(fd).st_size
+    if size > MAX_CONFIG_SIZE:
+        return "config too large"
+    try:
+        text = os.pread(fd, size, 0).decode()
+    except (OSError, UnicodeDecodeError) as e:
+        return f"unreadable config: {e}"
+    for line in text.split("\n"): # A value can never span lines
+        if "\r" in line or "\0" in line:
+            return "control character in config"
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        key, sep, _value = line.partition("=")
+        if not sep or key.strip() not in ALLOWED_CONFIG_KEYS:
+            return f"config key not allowed: {key.strip()}"
+    return None
+
+
+def _open_run_dir():
+    """
+    Opens RUN_DIR, creating it, once checked that root owns it and nobody
+    else can write to it: names inside it can then be removed, bound and
+    chowned without another user swapping in a symlink.
+    """
+    try:
+        os.mkdir(RUN_DIR, 0o711)
+    except FileExistsError:
+        pass
+    fd = os.open(RUN_DIR, os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW)
+    st = os.fstat(fd)
+    if st.st_uid != 0 or st.st_mode & 0o022:
+        os.close(fd)
+        raise RuntimeError(f"{RUN_DIR} must be owned by root and writable only by it")
+    os.fchmod(fd, 0o711) # Users may reach their socket, not list the others
+    return fd
+
+
+class HelperServer:
+    def __init__(self, allowed_uid):
+        self.socket_path = helper_socket_path(allowed_uid)
+        self.allowed_uid = allowed_uid
+        self.children = set()
+        self.lock = threading.Lock()
+        self.session_closed = threading.Event()
+
+    def serve(self):
+        dir_fd = _open_run_dir()
+        name = os.path.basename(self.socket_path)
+        try:
+            os.unlink(name, dir_fd=dir_fd) # Stale socket from a crashed session
+        except FileNotFoundError:
+            pass
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077) # Created 0700: nobody else can connect, not even briefly
+        try:
+            srv.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chown(name, self.allowed_uid, -1, dir_fd=dir_fd, follow_symlinks=False)
+        os.close(dir_fd)
+        srv.listen(8)
+
+        threading.Thread(target=self._accept_loop, args=(srv,), daemon=True).start()
+        self.session_closed.wait()
+
+        # Session over (GUI exited or crashed): no orphaned tunnels
+        with self.lock:
+            children = list(self.children)
+        for proc in children:
+            self._terminate(proc)
+        srv.close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    def _accept_loop(self, srv):
+        while True:
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            if _peer_uid(conn) not in (self.allowed_uid, 0):
+                return
+            try:
+                data, fds, _flags, _addr = socket.recv_fds(conn, 4096, 1)
+                request = json.loads(data.decode())
+            except (OSError, ValueError):
+                return
+
+            cmd = request.get("cmd")
+            if cmd == "hello":
+                _send(conn, {"ok": True})
+                # Block until the GUI closes the session connection
+                while conn.recv(4096):
+                    pass
+                self.session_closed.set()
+            elif cmd == "start" and fds:
+                error = check_config(fds[0])
+                if error:
+                    os.close(fds[0])
+                    _send(conn, {"error": error})
+                else:
+                    self._run_child(conn, fds[0])
+            else:
+                for fd in fds:
+                    os.close(fd)
+                _send(conn, {"error": f"bad request: {cmd}"})
+
+    def _run_child(self, conn, config_fd):
+        try:
+            proc = subprocess.Popen(
+                [privileges.OPENFORTIVPN, "-c", "/proc/self/fd/0"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=config_fd, # Same delivery as the direct path, see vpn_manager.config_fd
+                start_new_session=True # Own process group, killed by exact PID
+            )
+        except OSError as e:
+            _send(conn, {"error": str(e)})
+            return
+        finally:
+            os.close(config_fd)
+
+        with self.lock:
+            self.children.add(proc)
+        _send(conn, {"pid": proc.pid})
+
+        # "stop" requests (or the client going away) arrive on the same socket
+        threading.Thread(target=self._watch_client, args=(conn, proc), daemon=True).start()
+
+        try:
+            for raw in proc.stdout:
+                _send(conn, {"out": raw.decode("utf-8", "replace").rstrip("\n")})
+        except OSError:
+            self._terminate(proc)
+        code = proc.wait()
+        with self.lock:
+            self.children.discard(proc)
+        try:
+            _send(conn, {"exit": code})
+            # Wakes _watch_client (blocked in recv) and lets the client see EOF;
+            # a plain close() would wait for that thread
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _watch_client(self, conn, proc):
+        try:
+            while True:
+                data = conn.recv(4096)
+                if not data or b'"stop"' in data:
+                    break
+        except OSError:
+            pass
+        self._terminate(proc)
+
+    def _terminate(self, proc):
+        if proc.poll() is not None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+            proc.wait(timeout=STOP_GRACE)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        except ProcessLookupError:
+            pass
+
+
+# --- Client side (runs in the GUI) ---
+
+class HelperUnavailable(RuntimeError):
+    """The helper could not be started, e.g. the polkit prompt was cancelled."""
+
+
+class HelperClient:
+    """
+    Starts the helper on first use and keeps its session connection open
+    until close(). Thread-safe: runners call open_tunnel() from their own thread.
+    A failed start is remembered: later attempts (failover, reconnect) fail
+    at once instead of prompting again, until reset().
+    """
+    def __init__(self):
+        self.socket_path = helper_socket_path()
+        self.process = None
+        self.session = None
+        self.failure = None # Why the last start failed
+        self.lock = threading.Lock()
+
+    def ensure_started(self):
+        with self.lock:
+            if self.session:
+                return
+            if self.failure:
+                raise HelperUnavailable(self.failure)
+            try:
+                self._spawn()
+            except (OSError, RuntimeError) as e:
+                self.failure = f"No se pudo iniciar el helper privilegiado: {e}"
+                raise HelperUnavailable(self.failure)
+
+    def reset(self):
+        """Forgets a failed start, so the next open_tunnel() tries (and prompts) again."""
+        with self.lock:
+            self.failure = None
+
+    def _spawn(self):
+        # The helper picks the socket path from the uid and binds it under
+        # RUN_DIR, which only root can write
+        cmd = [sys.executable, os.path.abspath(__file__), "--uid", str(os.getuid())]
+        # sudoers only allows openfortivpn itself, so escalate through pkexec
+        if privileges.get_mode() != privileges.MODE_ROOT:
+            cmd = ["pkexec"] + cmd
+        self.process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                code, self.process = self.process.returncode, None
+                if code == 126: # pkexec: dialog dismissed or authentication failed
+                    raise RuntimeError("autenticación cancelada o rechazada")
+                raise RuntimeError(f"terminó con código {code}")
+            try:
+                session = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                session.connect(self.socket_path)
+                _send(session, {"cmd": "hello"})
+                session.recv(4096) # {"ok": true}
+                self.session = session
+                return
+            except OSError:
+                session.close()
+                time.sleep(0.1)
+        self.process.terminate() # Nobody answered the prompt
+        self.process = None
+        raise RuntimeError(f"sin respuesta en {START_TIMEOUT:.0f} s")
+
+    def open_tunnel(self, config_fd):
+        """
+        Asks the helper to start openfortivpn with the config readable from
+        config_fd (the caller keeps ownership of it).
+        Returns the connected socket: the caller reads JSON lines from it
+        and may send {"cmd": "stop"}.
+        """
+        self.ensure_started()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.socket_path)
+        socket.send_fds(conn, [json.dumps({"cmd": "start"}).encode() + b"\n"], [config_fd])
+        return conn
+
+    def close(self):
+        """Ends the session: the helper stops all tunnels and exits."""
+        with self.lock:
+            if self.session:
+                self.session.close()
+                self.session = None
+            if self.process:
+                try:
+                    self.process.wait(timeout=STOP_GRACE + 1)
+                except subprocess.TimeoutExpired:
+                    pass
+                self.process = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="openfortivpn-gui privileged helper")
+    parser.add_argument("--uid", type=int, required=True)
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        sys.exit("privileged_helper must run as root")
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Terminal Ctrl+C is for the GUI
+    HelperServer(args.uid).serve()
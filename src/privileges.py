@@ -0,0 +1,166 @@
+import os
+import subprocess
+import threading
+
+# How openfortivpn (and the kill fallback) gets its root privileges
+MODE_ROOT = "root"       # Already running as root
+MODE_SUDO = "sudo"       # Passwordless sudo rule (configure_permissions.sh)
+MODE_PKEXEC = "pkexec"   # Polkit prompt
+
+# Both overridable for local testing without a gateway or root, e.g. with
+# benchmarks/fake_openfortivpn.py and OFVPN_GUI_PRIVILEGE_MODE=root
+OPENFORTIVPN = os.environ.get("OFVPN_GUI_OPENFORTIVPN", "openfortivpn")
+_FORCED_MODE = os.environ.get("OFVPN_GUI_PRIVILEGE_MODE")
+
+# Installed by configure_permissions.sh and allowed by its sudoers rule:
+# sends TERM or KILL to a PID, only if that process is openfortivpn
+KILL_HELPER = "/usr/local/sbin/openfortivpn-gui-kill"
+
+_lock = threading.Lock()
+_mode = None
+_probe_thread = None
+
+
+def detect_mode():
+    """Works out the privilege mode. Spawns a process, avoid on hot paths."""
+    if _FORCED_MODE in (MODE_ROOT, MODE_SUDO, MODE_PKEXEC):
+        return _FORCED_MODE
+    if os.geteuid() == 0:
+        return MODE_ROOT
+    try:
+        # Check specific permission for openfortivpn instead of generic 'true'
+        # This aligns with the restricted sudoers rule.
+        if subprocess.call(
+            ["sudo", "-n", OPENFORTIVPN, "--version"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        ) == 0:
+            return MODE_SUDO
+    except OSError:
+        pass
+    return MODE_PKEXEC
+
+
+def _probe():
+    global _mode
+    mode = detect_mode()
+    with _lock:
+        _mode = mode
+
+
+def probe_in_background():
+    """Starts detecting the privilege mode without blocking the caller."""
+    global _probe_thread
+    with _lock:
+        if _mode is not None or (_probe_thread and _probe_thread.is_alive()):
+            return
+        _probe_thread = threading.Thread(target=_probe, name="privilege-probe", daemon=True)
+        _probe_thread.start()
+
+
+def get_mode():
+    """
+    Cached privilege mode. Only waits for (or runs) the probe if it has not
+    finished yet, so connect/disconnect normally do no subprocess work.
+    """
+    with _lock:
+        if _mode is not None:
+            return _mode
+        thread = _probe_thread
+    if thread:
+        thread.join()
+    else:
+        _probe()
+    with _lock:
+        return _mode or MODE_PKEXEC
+
+
+def invalidate():
+    """Forgets the cached mode (e.g. after a permission error) and re-probes."""
+    global _mode
+    with _lock:
+        _mode = None
+    probe_in_background()
+
+
+def wrap_command(args):
+    """Prefixes args with whatever is needed to run them as root."""
+    mode = get_mode()
+    if mode == MODE_ROOT:
+        return list(args)
+    if mode == MODE_SUDO:
+        return ["sudo"] + list(args)
+    return ["pkexec"] + list(args)
+
+
+def kill_command(pid, signame):
+    """
+    Command that sends SIG<signame> ("TERM" or "KILL") to a root-owned
+    openfortivpn. The sudoers rule does not allow a plain kill, so sudo
+    goes through KILL_HELPER; installs configured before it existed (see
+    kill_helper_missing) ask through pkexec instead.
+    """
+    if kill_helper_missing():
+        return ["pkexec", "kill", f"-{signame}", str(pid)]
+    if get_mode() == MODE_SUDO:
+        return ["sudo", "-n", KILL_HELPER, signame, str(pid)]
+    return wrap_command(["kill", f"-{signame}", str(pid)])
+
+
+def kill_helper_missing():
+    """True in sudo mode without KILL_HELPER: configure_permissions.sh predates it."""
+    return get_mode() == MODE_SUDO and not os.access(KILL_HELPER, os.X_OK)
+
+
+def _read_proc(pid, name):
+    try:
+        with open(f"/proc/{pid}/{name}") as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def find_process(pid, target=None, depth=3):
+    """
+    PID of `target` (the openfortivpn binary) among pid and its
+    descendants, or None: pkexec execs in place, sudo forks. Only reads
+    /proc, cheap enough to poll.
+    """
+    target = (target or os.path.basename(OPENFORTIVPN))[:15] # comm is truncated to 15 chars
+    pending = [pid]
+    for _ in range(depth):
+        children = []
+        for p in pending:
+            if _read_proc(p, "comm").strip() == target:
+                return int(p)
+            children += _read_proc(p, f"task/{p}/children").split()
+        pending = children
+    return None
+
+
+def running(pid, target=None):
+    """True while pid is still `target` and not a zombie. /proc only."""
+    target = (target or os.path.basename(OPENFORTIVPN))[:15]
+    if _read_proc(pid, "comm").strip() != target:
+        return False
+    stat = _read_proc(pid, "stat")
+    return bool(stat) and stat.rsplit(")", 1)[-1].split()[0] not in ("Z", "X")
+
+
+def can_signal(pid):
+    """False if pid belongs to another user (root), so kill() needs kill_command()."""
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def escalated(pid, target=None, depth=3):
+    """
+    True once `target` runs as pid or one of its descendants, i.e. the
+    sudo/pkexec wrapper started at pid was granted root.
+    """
+    return find_process(pid, target, depth) is not None
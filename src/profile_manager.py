@@ -1,11 +1,48 @@
+import atexit
 import json
 import os
 import uuid
-import tempfile
 import pwd
-import keyring
+
+from PySide6.QtCore import QCoreApplication, QThread, QTimer, Signal
+
+import app_log
+import thread_refs
+
+log = app_log.get_logger("profiles")
 
 KEYRING_SERVICE = "ofvpn-gui"
+SAVE_DELAY_MS = 300 # Edits within this window are written together
+
+
+def _keyring():
+    # Imported on first use: keyring and its backend discovery cost ~0.2 s,
+    # which autostart (--minimized) should not pay before the tray appears
+    import keyring
+    return keyring
+
+
+def _read_password(profile_id):
+    """Keyring read, "" if nothing is stored. May block on an unlock prompt."""
+    try:
+        return _keyring().get_password(KEYRING_SERVICE, profile_id) or ""
+    except Exception as e:
+        log.error(f"Error retrieving password for {profile_id}: {e}")
+        return ""
+
+
+class PasswordFetcher(QThread):
+    """Reads one profile's password off the GUI thread (see ProfileManager.fetch_password)."""
+    fetched = Signal(str, str) # profile id, password ("" if none)
+
+    def __init__(self, profile_id, parent=None):
+        super().__init__(parent)
+        self.profile_id = profile_id
+        self.invalidated = False # Set by invalidate_password: do not cache the result
+
+    def run(self):
+        self.fetched.emit(self.profile_id, _read_password(self.profile_id))
+
 
 class ProfileManager:
     def __init__(self):
@@ -24,8 +61,17 @@ class ProfileManager:
             
         self.profiles_path = os.path.join(self.config_dir, "profiles.json")
         self.profiles = []
+        # Passwords read from (or to be written to) the keyring, by profile
+        # id; never part of the profile dicts. See get_password.
+        self._secrets = {}
+        self._dirty_secrets = set() # Profile ids whose password the keyring does not have yet
+        self._save_pending = False
+        self._save_timer = None # Created on first save, see save_profiles
+        self._fetches = {} # profile id -> (PasswordFetcher, [callbacks]) in flight
+        self._fetchers = set() # Referenced until their thread finished
         self._ensure_config_dir()
         self.load_profiles()
+        atexit.register(self.flush) # A save still waiting for its timer
 
     def _ensure_config_dir(self):
         if not os.path.exists(self.config_dir):
@@ -49,75 +95,101 @@ class ProfileManager:
                     pid = p['id']
                     
                     # Migration: Check if password exists in JSON
-                    json_password = p.get('password')
+                    json_password = p.pop('password', None)
                     if json_password:
                         # Move to keyring
                         try:
-                            keyring.set_password(KEYRING_SERVICE, pid, json_password)
+                            _keyring().set_password(KEYRING_SERVICE, pid, json_password)
                             migrated = True
                         except Exception as e:
-                            print(f"Error migrating password for {pid}: {e}")
+                            log.error(f"Error migrating password for {pid}: {e}")
                             
-                    # Load from keyring (always authoritative)
-                    try:
-                        stored_password = keyring.get_password(KEYRING_SERVICE, pid)
-                    except Exception as e:
-                        print(f"Error retrieving password for {pid}: {e}")
-                        stored_password = None
-                        
-                    # Reconstruct profile in memory with password available for UI/Use
-                    p['password'] = stored_password if stored_password else ""
+                    # The password itself is fetched from the keyring on first
+                    # use (get_password), not for every profile at startup
                     self.profiles.append(p)
+                self._secrets = {} # Stale once the file was (re)loaded
+                self._dirty_secrets.clear()
                 
                 # If we migrated passwords, save immediately to scrub them from JSON
                 if migrated:
-                    self.save_profiles()
+                    self._write_profiles()
                     
         except (json.JSONDecodeError, IOError):
             self.profiles = []
 
     def save_profiles(self):
-        # Prepare list for JSON serialization (EXCLUDING passwords)
-        clean_profiles = []
-        for p in self.profiles:
-            # Create a copy to modify for saving
-            clean_p = p.copy()
-            
-            # Remove sensitive data from JSON copy
-            if 'password' in clean_p:
-                del clean_p['password']
-                
-            clean_profiles.append(clean_p)
-            
-            # Save password to keyring (Source of Truth)
-            if p.get('password'):
+        """
+        Schedules a write of the profiles: edits made within SAVE_DELAY_MS
+        are coalesced into one. Without a Qt event loop to run the timer
+        (scripts) the write happens right away. flush() forces it.
+        """
+        self._save_pending = True
+        if QCoreApplication.instance() is None:
+            self.flush()
+            return
+        if self._save_timer is None:
+            self._save_timer = QTimer()
+            self._save_timer.setSingleShot(True)
+            self._save_timer.setInterval(SAVE_DELAY_MS)
+            self._save_timer.timeout.connect(self.flush)
+        if not self._save_timer.isActive():
+            self._save_timer.start()
+
+    def flush(self):
+        """Writes a pending save now (no-op if there is none)."""
+        if self._save_timer is not None:
+            self._save_timer.stop()
+        if not self._save_pending:
+            return
+        self._save_pending = False
+        # Passwords are only in the keyring (Source of Truth), never in the JSON.
+        # Only the ones that changed are written: each one is a D-Bus round trip
+        for profile_id in list(self._dirty_secrets):
+            password = self._secrets.get(profile_id)
+            if password:
                 try:
-                    keyring.set_password(KEYRING_SERVICE, p['id'], p['password'])
+                    _keyring().set_password(KEYRING_SERVICE, profile_id, password)
                 except Exception as e:
-                    print(f"Error saving password to keyring: {e}")
-            else:
-                # If password is empty, maybe we should delete it from keyring?
-                # For now, let's just leave it or set empty. 
-                # keyring.delete_password might raise if not found.
-                pass
-
-        data = {'profiles': clean_profiles}
-        with open(self.profiles_path, 'w') as f:
-            json.dump(data, f, indent=4)
-
-    def add_profile(self, name, username, password, trusted_cert, gateways, otp_enabled=False):
+                    log.error(f"Error saving password to keyring: {e}")
+                    continue # Still dirty: retried on the next save
+            self._dirty_secrets.discard(profile_id)
+        self._write_profiles()
+
+    def _write_profiles(self):
+        # Temp file plus rename: a crash mid-write leaves the previous file intact.
+        # Owner-only like the rest of the config, and synced before the rename
+        # so a crash cannot leave an empty profiles.json behind (ext4/xfs)
+        tmp = self.profiles_path + ".tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w') as f:
+                json.dump({'profiles': self.profiles}, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.profiles_path)
+        except OSError as e:
+            log.error(f"Error saving profiles: {e}")
+
+    def add_profile(self, name, username, password, trusted_cert, gateways, otp_enabled=False,
+                    latency_target='', auto_reconnect=False, connect_by_ip=False):
         """
         gateways: list of dicts {'host': '...', 'port': 443}
+        latency_target: optional in-tunnel RTT target 'host[:port]' (remote IP if empty)
+        auto_reconnect: relaunch automatically (with backoff) if the tunnel drops
+        connect_by_ip: connect to the pre-resolved gateway IP (see connects_by_ip)
         """
         profile = {
             'id': str(uuid.uuid4()),
             'name': name,
             'username': username,
-            'password': password, 
             'trusted_cert': trusted_cert,
             'gateways': gateways,
-            'otp_enabled': otp_enabled
+            'otp_enabled': otp_enabled,
+            'latency_target': latency_target,
+            'auto_reconnect': auto_reconnect,
+            'connect_by_ip': connect_by_ip
         }
+        self._set_secret(profile['id'], password)
         self.profiles.append(profile)
         self.save_profiles()
         return profile
@@ -125,25 +197,94 @@ class ProfileManager:
     def delete_profile(self, profile_id):
         # Remove from keyring first
         try:
-            keyring.delete_password(KEYRING_SERVICE, profile_id)
+            _keyring().delete_password(KEYRING_SERVICE, profile_id)
         except Exception:
             pass # Ignore if not found
+        self._dirty_secrets.discard(profile_id)
+        self.invalidate_password(profile_id)
             
         self.profiles = [p for p in self.profiles if p['id'] != profile_id]
         self.save_profiles()
 
+    def get_password(self, profile_id):
+        """
+        Stored password of a profile ("" if none). Read from the keyring on
+        first use and cached afterwards; blocks while the keyring unlocks,
+        so the GUI uses fetch_password instead.
+        """
+        if not any(p['id'] == profile_id for p in self.profiles):
+            return ""
+        if profile_id not in self._secrets:
+            self._secrets[profile_id] = _read_password(profile_id)
+        return self._secrets[profile_id]
+
+    def fetch_password(self, profile_id, callback):
+        """
+        Like get_password, but a keyring read runs on a PasswordFetcher:
+        callback(password) is called on the GUI thread once it is there,
+        right away on a cache hit.
+        """
+        if profile_id in self._secrets or not any(p['id'] == profile_id for p in self.profiles):
+            callback(self.get_password(profile_id))
+            return
+        if profile_id in self._fetches:
+            self._fetches[profile_id][1].append(callback) # Same read already in flight
+            return
+        fetcher = PasswordFetcher(profile_id)
+        self._fetches[profile_id] = (fetcher, [callback])
+        fetcher.fetched.connect(self._on_password_fetched)
+        thread_refs.keep_until_finished(fetcher, self._fetchers)
+        fetcher.start()
+
+    def _on_password_fetched(self, profile_id, password):
+        fetcher, callbacks = self._fetches.pop(profile_id)
+        if not fetcher.invalidated:
+            self._secrets.setdefault(profile_id, password)
+        password = self._secrets.get(profile_id, password) # One edited meanwhile wins over what was read
+        for callback in callbacks:
+            callback(password)
+
+    def invalidate_password(self, profile_id=None):
+        """Drops the cached password of a profile (of every profile if None): the next use reads the keyring."""
+        for pid in ([profile_id] if profile_id else list(self._secrets)):
+            if pid not in self._dirty_secrets: # An unsaved edit is not in the keyring yet
+                self._secrets.pop(pid, None)
+        for pid, (fetcher, _) in self._fetches.items():
+            if profile_id in (None, pid):
+                fetcher.invalidated = True
+
     def update_profile(self, profile_id, data):
         for profile in self.profiles:
             if profile['id'] == profile_id:
+                data = dict(data)
+                if 'password' in data:
+                    self._set_secret(profile_id, data.pop('password'))
                 profile.update(data)
                 self.save_profiles() # Will handle keyring update
                 return True
         return False
 
-    def generate_openfortivpn_config(self, profile_id, gateway_index=0, runtime_password=None, runtime_otp=None):
+    def _set_secret(self, profile_id, password):
+        """Caches an edited password; the next save writes it to the keyring only if it changed."""
+        if self._secrets.get(profile_id) != password:
+            self._secrets[profile_id] = password
+            self._dirty_secrets.add(profile_id)
+
+    def connects_by_ip(self, profile):
+        """
+        Whether connect-by-IP applies to this profile. Only with a pinned
+        certificate: openfortivpn then accepts the gateway by its digest,
+        while a CA-signed certificate would be checked against the IP.
+        """
+        return bool(profile.get('connect_by_ip') and profile.get('trusted_cert', '').strip())
+
+    def render_openfortivpn_config(self, profile_id, gateway_index=0, runtime_password=None, runtime_otp=None,
+                                   address=None):
         """
-        Generates a temporary config file for the specified profile and gateway index.
-        Returns the path to the temporary file.
+        Renders the openfortivpn config for the specified profile and gateway index.
+        address: resolved IP of the gateway to connect to; the host name is
+        still sent as SNI.
+        Returns the config text; it is only ever kept in memory (see vpn_manager.config_fd).
         """
         profile = next((p for p in self.profiles if p['id'] == profile_id), None)
         if not profile:
@@ -154,41 +295,29 @@ class ProfileManager:
         
         gateway = profile['gateways'][gateway_index]
         
-        # Priority: Runtime > Profile (InMemory)
-        # Profile password should already be populated from keyring by load_profiles/update_profile
-        password = runtime_password if runtime_password is not None else profile.get('password', '')
-        
-        config_content = f"""host = {gateway['host']}
+        # Priority: Runtime > Profile (keyring, fetched on first use)
+        password = runtime_password if runtime_password is not None else self.get_password(profile_id)
+        trusted_cert = profile.get('trusted_cert', '').strip()
+        # One "key = value" per line: a line break in a value would add keys
+        values = (address or gateway['host'], str(gateway.get('port', 443)), profile['username'],
+                  password or '', trusted_cert, runtime_otp or '')
+        if any('\n' in value or '\r' in value for value in values):
+            raise ValueError("Los datos del perfil no pueden contener saltos de línea")
+
+        config_content = f"""host = {address or gateway['host']}
 port = {gateway.get('port', 443)}
 username = {profile['username']}
 password = {password}
 """
-        trusted_cert = profile.get('trusted_cert', '').strip()
         if trusted_cert:
             config_content += f"trusted-cert = {trusted_cert}\n"
+        if address:
+            config_content += f"sni = {gateway['host']}\n"
 
         if runtime_otp:
              config_content += f"otp = {runtime_otp}\n"
-        
-        fd, path = tempfile.mkstemp(prefix=f"ofvpn_{gateway_index}_", suffix=".conf", text=True)
-        with os.fdopen(fd, 'w') as f:
-            f.write(config_content)
-        
-        return path
-
-    def generate_all_openfortivpn_configs(self, profile_id, runtime_password=None, runtime_otp=None):
-        """
-        Generates a list of config files for all gateways in the profile (for failover).
-        """
-        profile = next((p for p in self.profiles if p['id'] == profile_id), None)
-        if not profile or not profile.get('gateways'):
-            raise ValueError("Profile invalid or no gateways")
 
-        paths = []
-        for i in range(len(profile['gateways'])):
-            paths.append(self.generate_openfortivpn_config(profile_id, i, runtime_password, runtime_otp))
-        
-        return paths
+        return config_content
 
     def get_profiles(self):
         return self.profiles
@@ -0,0 +1,365 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+
+import app_log
+import log_classifier
+
+log = app_log.get_logger("manager")
+
+ARCHIVE_DIR = "sessions" # Under the config dir, next to profiles.json
+INDEX_FILE = "index.jsonl"
+MAX_TOTAL_BYTES = 64 * 1024 * 1024 # Compressed size of the whole archive
+MAX_AGE = 90 * 24 * 3600 # Sessions older than this are deleted
+PART_BYTES = 8 * 1024 * 1024 # Uncompressed text per file before rotating to the next one
+PARTS_KEPT = 8 # Per session: a very long session drops its oldest parts
+EVENTS_KEPT = 200 # Occurrences indexed per event type and session (all are counted)
+COMPRESS_LEVEL = 3 # ~10x on openfortivpn output at over 100 MB/s
+STAMP_LEN = len("2026-01-01 00:00:00 ") # Prefix of every archived line
+QUEUE_SIZE = 2000 # Output batches waiting for the writer; past that they are dropped (and counted)
+STOP_TIMEOUT = 5.0 # Seconds given to the writer to drain on exit
+
+# Session-level events, besides the classifier's
+EVENT_FAILOVER = "failover"
+EVENT_RECONNECTING = "reconnecting"
+EVENT_CONNECTION_FAILED = "connection_failed"
+
+# Indexed events: what one searches for later
+ARCHIVED_EVENTS = log_classifier.FAILURE_EVENTS | {
+    log_classifier.EVENT_CERT_ERROR, log_classifier.EVENT_TUNNEL_UP,
+    EVENT_FAILOVER, EVENT_RECONNECTING, EVENT_CONNECTION_FAILED}
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name)[:40] or "vpn"
+
+
+class SessionLog:
+    """
+    Output of one session, from connect_vpn() until it is back to
+    disconnected, written gzip-compressed and rotated every PART_BYTES.
+    Each line gets a timestamp; events are indexed by the range of lines
+    of the batch they were classified from.
+
+    write(), event() and close() only queue the work: compression, file
+    I/O, the index and pruning run on the archive's ArchiveWriter, in
+    call order. Write errors disable the log (the connection must not
+    depend on it).
+    """
+
+    def __init__(self, archive, session_id, profile):
+        self.archive = archive
+        self.id = session_id
+        self.profile = profile
+        self.start = time.time()
+        self.lines = 0 # Written so far, also the number of the next line
+        self.parts = [] # [{"file", "first_line"}], oldest first
+        self.events = {} # type -> [{"first", "last", "t", "value"}]
+        self.counts = {} # type -> occurrences
+        self._batch = (0, 0) # Line range of the last write
+        self._file = None
+        self._part = 0
+        self._part_bytes = 0
+        self._dropped = 0 # Lines not queued since the last accepted write (caller's thread)
+
+    # --- Caller's thread ---
+
+    def write(self, text):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        if self.archive.submit(self._write, stamp, text, self._dropped, droppable=True):
+            self._dropped = 0
+        else:
+            self._dropped += text.count("\n") + 1
+
+    def event(self, kind, value=None):
+        """Indexes an event against the lines written last (the batch it came from)."""
+        self.archive.submit(self._event, kind, value, round(time.time(), 3))
+
+    def close(self):
+        self.archive.submit(self._close, time.time())
+
+    # --- Writer thread ---
+
+    def _open_part(self):
+        if self._file:
+            self._file.close()
+        name = f"{self.id}.{self._part}.log.gz"
+        self._part += 1
+        try:
+            self._file = gzip.open(os.path.join(self.archive.directory, name), "wb",
+                                   compresslevel=COMPRESS_LEVEL)
+        except OSError as e:
+            log.error(f"Error opening session log: {e}")
+            self._file = None
+            return
+        self._part_bytes = 0
+        self.parts.append({"file": name, "first_line": self.lines})
+        if len(self.parts) > PARTS_KEPT:
+            self.archive.remove_file(self.parts.pop(0)["file"])
+        self.archive.append_index({"id": self.id, "parts": self.parts})
+
+    def _write(self, stamp, text, dropped):
+        if not self._file:
+            return
+        if dropped:
+            text = f"[{dropped} líneas no archivadas: disco lento]\n{text}"
+        lines = text.split("\n")
+        data = "".join(f"{stamp} {line}\n" for line in lines).encode("utf-8", "replace")
+        try:
+            self._file.write(data)
+        except OSError as e:
+            log.error(f"Error writing session log: {e}")
+            self._file = None
+            return
+        self._batch = (self.lines, self.lines + len(lines) - 1)
+        self.lines += len(lines)
+        self._part_bytes += len(data)
+        if self._part_bytes >= PART_BYTES:
+            self._open_part()
+
+    def _event(self, kind, value, t):
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        entries = self.events.setdefault(kind, [])
+        if len(entries) < EVENTS_KEPT:
+            entries.append({"first": self._batch[0], "last": self._batch[1], "t": t, "value": value})
+        if self._file:
+            try:
+                self._file.flush() # Readable up to here even if the app dies
+            except OSError:
+                pass
+
+    def _close(self, end):
+        if self._file:
+            try:
+                self._file.close()
+            except OSError as e:
+                log.error(f"Error closing session log: {e}")
+            self._file = None
+        self.archive.append_index({"id": self.id, "end": end, "lines": self.lines,
+                                   "parts": self.parts, "events": self.events, "counts": self.counts})
+        self.archive.prune()
+
+
+class ArchiveWriter(threading.Thread):
+    """
+    Runs the archive's disk work (compression, flushes, index, pruning)
+    in order, off the GUI thread, like app_log.LogWriter. Output batches
+    are dropped and counted once QUEUE_SIZE items are waiting, so a slow
+    disk never blocks the caller; opens, events and closes always queue.
+    """
+
+    def __init__(self):
+        super().__init__(name="session-archive-writer", daemon=True)
+        self.queue = queue.Queue()
+
+    def submit(self, fn, args, droppable=False):
+        if droppable and self.queue.qsize() >= QUEUE_SIZE:
+            return False
+        self.queue.put((fn, args))
+        return True
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                log.error(f"Error in session archive: {e}")
+
+    def stop(self):
+        self.queue.put(None)
+        self.join(STOP_TIMEOUT) # A stalled disk: it is a daemon thread, do not wait longer
+
+
+class SessionArchive:
+    """
+    Per-session openfortivpn output (see SessionLog) plus index.jsonl: one
+    JSON record per session start, rotation and end, merged by id. The
+    index holds each session's time span, parts and the line ranges of
+    its events, so a search only decompresses the sessions (and parts)
+    that can match. Total size and age are capped by prune().
+    """
+
+    def __init__(self, config_dir, max_bytes=MAX_TOTAL_BYTES, max_age=MAX_AGE):
+        self.directory = os.path.join(config_dir, ARCHIVE_DIR)
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.open_ids = set() # Sessions being written by this process
+        self._writer = None # ArchiveWriter, started by the first session
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        except OSError as e:
+            log.error(f"Error creating session archive: {e}")
+
+    def open_session(self, profile):
+        session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(profile)}"
+        while session_id in self.open_ids or os.path.exists(os.path.join(self.directory, f"{session_id}.0.log.gz")):
+            session_id += "_"
+        self.open_ids.add(session_id)
+        log = SessionLog(self, session_id, profile)
+        self.submit(self.append_index, {"id": session_id, "profile": profile, "start": log.start})
+        self.submit(log._open_part)
+        return log
+
+    def submit(self, fn, *args, droppable=False):
+        """
+        Queues fn(*args) on the writer thread (see ArchiveWriter). Returns
+        False if a droppable item was dropped.
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = ArchiveWriter()
+                self._writer.start()
+            return self._writer.submit(fn, args, droppable)
+
+    def stop(self):
+        """Waits for the queued work (bounded by STOP_TIMEOUT). Also run at exit."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer:
+            writer.stop()
+
+    def append_index(self, record):
+        if record.get("end"):
+            self.open_ids.discard(record["id"])
+        try:
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            log.error(f"Error writing session index: {e}")
+
+    def remove_file(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def sessions(self):
+        """Index records merged by session id, oldest first."""
+        merged = {}
+        try:
+            with open(self.index_path, "r") as f:
+                for raw in f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        continue # Torn last line after a crash
+                    merged.setdefault(record["id"], {"parts": []}).update(record)
+        except OSError:
+            pass
+        return sorted((s for s in merged.values() if "start" in s), key=lambda s: s["start"])
+
+    def prune(self):
+        """Deletes finished sessions past max_age, then the oldest ones while over max_bytes."""
+        sessions = self.sessions()
+        now = time.time()
+        sizes = {}
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".log.gz"):
+                    sizes[entry.name] = entry.stat().st_size
+        except OSError:
+            return
+        total = sum(sizes.values())
+        keep = []
+        for session in sessions:
+            files = [p["file"] for p in session["parts"]]
+            size = sum(sizes.get(name, 0) for name in files)
+            # Sessions without an end record may still be written (another process)
+            expired = now - session["start"] > self.max_age
+            removable = session["id"] not in self.open_ids and ("end" in session or expired)
+            if removable and (expired or total > self.max_bytes):
+                for name in files:
+                    self.remove_file(name)
+                total -= size
+            else:
+                keep.append(session)
+        if len(keep) != len(sessions):
+            self._rewrite_index(keep)
+
+    def _rewrite_index(self, sessions):
+        tmp = self.index_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                for session in sessions:
+                    f.write(json.dumps(session, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            log.error(f"Error writing session index: {e}")
+
+    def read_lines(self, session, first=0, last=None):
+        """(line number, text) of the session's lines first..last still on disk."""
+        parts = session["parts"]
+        for i, part in enumerate(parts):
+            end = parts[i + 1]["first_line"] if i + 1 < len(parts) else None
+            if end is not None and end <= first:
+                continue
+            if last is not None and part["first_line"] > last:
+                return
+            number = part["first_line"]
+            try:
+                with gzip.open(os.path.join(self.directory, part["file"]), "rt",
+                               encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        if last is not None and number > last:
+                            return
+                        if number >= first:
+                            yield number, line.rstrip("\n")
+                        number += 1
+            except (OSError, EOFError, zlib.error):
+                continue # Rotated away, or cut short by a crash: keep what was readable
+
+    def search(self, event=None, since=None, profile=None, text=None):
+        """
+        Yields (session, line number, line) for the archived lines matching
+        every given filter: event type (see ARCHIVED_EVENTS), time (epoch
+        seconds), profile name and substring. Sessions whose index does not
+        list the event are skipped without being decompressed.
+        """
+        since_stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(since)) if since else None
+        for session in self.sessions():
+            if profile and session.get("profile") != profile:
+                continue
+            if since and session.get("end", time.time()) < since:
+                continue
+            if event and "events" in session:
+                # Finished session: read only the indexed line ranges
+                # (several events of one batch share its range)
+                ranges = sorted({(e["first"], e["last"]) for e in session["events"].get(event, ())
+                                 if not since or e["t"] >= since})
+                matches = (item for first, last in ranges for item in self.read_lines(session, first, last)
+                           if _is_event(item[1], event, item[0] == last))
+            elif event:
+                # Unfinished (or cut short by a crash): no event index, classify every line
+                matches = (item for item in self.read_lines(session) if _has_event(item[1], event))
+            else:
+                matches = self.read_lines(session)
+            for number, line in matches:
+                if since_stamp and line[:STAMP_LEN - 1] < since_stamp:
+                    continue
+                if text and text not in line:
+                    continue
+                yield session, number, line
+
+
+def _has_event(line, event):
+    return any(found == event for found, _ in log_classifier.classify_lines((line[STAMP_LEN:],)))
+
+
+def _is_event(line, event, last_of_batch):
+    """Whether an indexed line is the event itself (classifier events), or the message closing the batch."""
+    if event in (EVENT_FAILOVER, EVENT_RECONNECTING, EVENT_CONNECTION_FAILED):
+        return last_of_batch
+    return _has_event(line, event)
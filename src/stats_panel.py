@@ -1,5 +1,57 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QPushButton)
 from PySide6.QtCore import Qt
+from PySide6.QtGui import QPainter, QPen, QColor
+
+
+def format_rate(bps):
+    """Bits per second, decimal units as network tools show them."""
+    for unit in ("b/s", "Kb/s", "Mb/s", "Gb/s"):
+        if bps < 1000:
+            return f"{bps:.1f} {unit}"
+        bps /= 1000
+    return f"{bps:.1f} Tb/s"
+
+
+class Sparkline(QWidget):
+    """
+    Draws the latest rx/tx rates straight from a TrafficHistory tier.
+    Reads the ring buffers in place: nothing is copied or allocated per tick.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tier = None
+        self.setMinimumHeight(36)
+        self._rx_pen = QPen(QColor("#00e676"), 1.2)
+        self._tx_pen = QPen(QColor("#2979ff"), 1.2)
+
+    def set_tier(self, tier):
+        self.tier = tier
+        self.update()
+
+    def paintEvent(self, event):
+        if not self.tier or len(self.tier.rx) < 2:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        top = max(self.tier.rx.max(), self.tier.tx.max(), 1.0)
+        for ring, pen in ((self.tier.rx, self._rx_pen), (self.tier.tx, self._tx_pen)):
+            painter.setPen(pen)
+            self._draw_series(painter, ring, top)
+        painter.end()
+
+    def _draw_series(self, painter, ring, top):
+        w = self.width() - 1
+        h = self.height() - 2
+        step = w / (ring.capacity - 1)
+        # Right-aligned: the newest sample touches the right edge
+        x = w - (len(ring) - 1) * step
+        prev_y = h - ring[0] / top * h + 1
+        for i in range(1, len(ring)):
+            y = h - ring[i] / top * h + 1
+            painter.drawLine(x, prev_y, x + step, y)
+            x += step
+            prev_y = y
+
 
 class StatsPanel(QFrame):
     def __init__(self, parent=None):
@@ -40,6 +92,30 @@ class StatsPanel(QFrame):
         
         layout.addLayout(traffic_layout)
         
+        # Live rates (smoothed) and peaks
+        rates_layout = QHBoxLayout()
+        self.lbl_rx_rate = QLabel("↓ 0.0 b/s")
+        self.lbl_tx_rate = QLabel("↑ 0.0 b/s")
+        self.lbl_rx_rate.setStyleSheet("color: #00e676; font-size: 10px;")
+        self.lbl_tx_rate.setStyleSheet("color: #2979ff; font-size: 10px;")
+        rates_layout.addWidget(self.lbl_rx_rate)
+        rates_layout.addWidget(self.lbl_tx_rate)
+        layout.addLayout(rates_layout)
+        
+        self.sparkline = Sparkline()
+        layout.addWidget(self.sparkline)
+        
+        # In-tunnel latency
+        self.lbl_latency = QLabel("RTT p50/p95/p99: - · Pérdida: -")
+        self.lbl_latency.setStyleSheet("font-size: 10px; color: #cccccc;")
+        layout.addWidget(self.lbl_latency)
+        
+        # Link health (errors / drops)
+        self.lbl_errors = QLabel("Errores: 0/0 · Descartes: 0/0")
+        self.lbl_errors.setStyleSheet("font-size: 10px; color: #cccccc;")
+        layout.addWidget(self.lbl_errors)
+        
+        self.history = None
         self.hide() # Hidden by default until connected
 
     def update_details(self, data):
@@ -52,6 +128,36 @@ class StatsPanel(QFrame):
         self.lbl_rx.setText(f"↓ {self._format_bytes(rx)}")
         self.lbl_tx.setText(f"↑ {self._format_bytes(tx)}")
 
+    def set_history(self, history):
+        """TrafficHistory owned by the VPNSession; the sparkline reads it in place."""
+        self.history = history
+        self.sparkline.set_tier(history.recent())
+
+    def update_rates(self, rx_bps, tx_bps):
+        self.lbl_rx_rate.setText(f"↓ {format_rate(rx_bps)}")
+        self.lbl_tx_rate.setText(f"↑ {format_rate(tx_bps)}")
+        if self.history:
+            self.lbl_rx_rate.setToolTip(f"Pico: {format_rate(self.history.rx_peak)}")
+            self.lbl_tx_rate.setToolTip(f"Pico: {format_rate(self.history.tx_peak)}")
+        if self.isVisible():
+            self.sparkline.update()
+
+    def update_latency(self, data):
+        if data['p50'] is None:
+            text = "RTT p50/p95/p99: -"
+        else:
+            text = f"RTT p50/p95/p99: {data['p50']:.0f}/{data['p95']:.0f}/{data['p99']:.0f} ms"
+        self.lbl_latency.setText(f"{text} · Pérdida: {data['loss_pct']:.1f}%")
+        self.lbl_latency.setToolTip(f"Destino: {data['target']} ({data['sent']} sondeos)")
+
+    def update_link_stats(self, counters):
+        self.lbl_errors.setText(
+            f"Errores: {counters['rx_errors']}/{counters['tx_errors']} · "
+            f"Descartes: {counters['rx_drops']}/{counters['tx_drops']}")
+        # Highlight when the link is actually losing packets
+        bad = counters['rx_errors'] or counters['tx_errors'] or counters['rx_drops'] or counters['tx_drops']
+        self.lbl_errors.setStyleSheet(f"font-size: 10px; color: {'#ff9800' if bad else '#cccccc'};")
+
     def _format_bytes(self, size):
         power = 2**10
         n = 0
@@ -66,4 +172,9 @@ class StatsPanel(QFrame):
         self.lbl_remote_ip.setText("Remote IP: -")
         self.lbl_gateway.setText("Interface: -")
         self.update_traffic(0, 0)
+        self.update_rates(0.0, 0.0)
+        self.lbl_latency.setText("RTT p50/p95/p99: - · Pérdida: -")
+        self.lbl_latency.setToolTip("")
+        self.lbl_errors.setText("Errores: 0/0 · Descartes: 0/0")
+        self.lbl_errors.setStyleSheet("font-size: 10px; color: #cccccc;")
         self.hide()
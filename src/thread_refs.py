@@ -0,0 +1,25 @@
+"""
+Keeping worker QThreads referenced until they have really returned.
+
+'finished' is delivered just before run() fully returns: dropping the
+last reference to the QThread in that slot (or anywhere before it) aborts
+with "QThread destroyed while running". Every place that lets go of a
+worker goes through release().
+"""
+
+
+def release(thread):
+    """Call before dropping the last reference to a finished (or finishing) thread."""
+    if thread is not None:
+        thread.wait()
+
+
+def keep_until_finished(thread, refs):
+    """Holds thread in the set refs until it has returned, then drops it."""
+    refs.add(thread)
+
+    def on_finished():
+        release(thread)
+        refs.discard(thread)
+
+    thread.finished.connect(on_finished)
@@ -0,0 +1,127 @@
+from array import array
+
+# (period in seconds, samples kept): 5 min at 1 s, 1 h at 10 s, 24 h at 1 min.
+# Memory is fixed at construction, whatever the session length.
+TIERS = ((1, 300), (10, 360), (60, 1440))
+
+EWMA_ALPHA = 0.3 # Weight of the newest rate sample
+
+
+class RingBuffer:
+    """Fixed-size, array-backed ring of floats. Index 0 is the oldest sample."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = array('d', bytes(8 * capacity))
+        self._head = 0 # Next write position
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return self._data[(self._head - self._count + i) % self.capacity]
+
+    def max(self):
+        # Unused slots are zero and values are rates (>= 0), so no slicing needed
+        return max(self._data)
+
+    def clear(self):
+        for i in range(self.capacity):
+            self._data[i] = 0.0
+        self._head = 0
+        self._count = 0
+
+
+class _Tier:
+    """One resolution level: rx/tx rates averaged over `period` seconds."""
+
+    def __init__(self, period, capacity):
+        self.period = period
+        self.rx = RingBuffer(capacity)
+        self.tx = RingBuffer(capacity)
+        self._bucket = None
+        self._rx_sum = 0.0
+        self._tx_sum = 0.0
+        self._n = 0
+
+    def add(self, t, rx_bps, tx_bps):
+        bucket = int(t // self.period)
+        if self._bucket is not None and bucket != self._bucket and self._n:
+            self.rx.append(self._rx_sum / self._n)
+            self.tx.append(self._tx_sum / self._n)
+            self._rx_sum = self._tx_sum = 0.0
+            self._n = 0
+        self._bucket = bucket
+        self._rx_sum += rx_bps
+        self._tx_sum += tx_bps
+        self._n += 1
+
+    def clear(self):
+        self.rx.clear()
+        self.tx.clear()
+        self._bucket = None
+        self._rx_sum = self._tx_sum = 0.0
+        self._n = 0
+
+
+class TrafficHistory:
+    """
+    Turns cumulative rx/tx byte counters into bits-per-second rates, with
+    EWMA smoothing, peak tracking and downsampled history tiers.
+    """
+
+    def __init__(self, tiers=TIERS):
+        self.tiers = [_Tier(period, capacity) for period, capacity in tiers]
+        self.reset()
+
+    def reset(self):
+        for tier in self.tiers:
+            tier.clear()
+        self._last = None # (t, rx_bytes, tx_bytes)
+        self._has_rate = False
+        self.rx_bps = 0.0
+        self.tx_bps = 0.0
+        self.rx_ewma = 0.0
+        self.tx_ewma = 0.0
+        self.rx_peak = 0.0
+        self.tx_peak = 0.0
+
+    def add_sample(self, t, rx_bytes, tx_bytes):
+        """t: monotonic seconds. Returns False if no rate could be derived yet."""
+        last = self._last
+        self._last = (t, rx_bytes, tx_bytes)
+        if last is None:
+            return False
+        dt = t - last[0]
+        rx_delta = rx_bytes - last[1]
+        tx_delta = tx_bytes - last[2]
+        if dt <= 0 or rx_delta < 0 or tx_delta < 0:
+            return False # Clock hiccup or counters reset (interface recreated)
+
+        self.rx_bps = rx_delta * 8 / dt
+        self.tx_bps = tx_delta * 8 / dt
+        if not self._has_rate:
+            self.rx_ewma, self.tx_ewma = self.rx_bps, self.tx_bps
+            self._has_rate = True
+        else:
+            self.rx_ewma += EWMA_ALPHA * (self.rx_bps - self.rx_ewma)
+            self.tx_ewma += EWMA_ALPHA * (self.tx_bps - self.tx_ewma)
+        self.rx_peak = max(self.rx_peak, self.rx_bps)
+        self.tx_peak = max(self.tx_peak, self.tx_bps)
+
+        for tier in self.tiers:
+            tier.add(t, self.rx_bps, self.tx_bps)
+        return True
+
+    def recent(self):
+        """Finest tier (1 s samples), as used by the sparkline."""
+        return self.tiers[0]
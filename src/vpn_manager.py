@@ -2,155 +2,412 @@ import subprocess
 import os
 import signal
 import time
-import re
+import selectors
+import random
+import json
+import socket
 from PySide6.QtCore import QObject, Signal, QThread, QTimer
+from gateway_probe import GatewayProber
+from dns_cache import DNSCache, DNSPrefetcher
+from link_stats import LinkStatsCollector
+from traffic_history import TrafficHistory
+from latency_monitor import LatencyMonitor
+from connection_timing import PhaseTimer, PhaseHistory, format_record
+import log_classifier
+import session_archive
+import privileges
+import privileged_helper
+import thread_refs
+
+
+def config_fd(config_text):
+    """
+    Puts the rendered config in an anonymous in-memory file (memfd) and
+    returns a readable fd. openfortivpn gets it as stdin and reads it
+    through /proc/self/fd/0, so the password never touches the filesystem
+    and nothing needs cleanup.
+    No pipe fallback: openfortivpn fstat()s the config and rejects a size
+    of 0 as an empty file, which is what a pipe always reports.
+    """
+    try:
+        fd = os.memfd_create("ofvpn-config", os.MFD_CLOEXEC)
+    except (AttributeError, OSError) as e:
+        raise RuntimeError("memfd_create is not available (Linux >= 3.17 required): "
+                           f"the config cannot be passed to openfortivpn without a file ({e})")
+    os.write(fd, config_text.encode())
+    os.lseek(fd, 0, os.SEEK_SET)
+    return fd
+
 
 class VPNRunner(QThread):
     """
     Thread to run the openfortivpn process.
     """
-    output_received = Signal(str)
+    output_batch = Signal(list) # Lines coalesced by the reader (see _pump_output)
+    events_detected = Signal(list) # [(event_type, value)] classified from the same batch
     # error_occurred = Signal(str) # Not widely used, output covers it
     process_finished = Signal(int)
-    cert_error_detected = Signal(str) # Emits the hash found
+    stop_progress = Signal(str) # Shutdown steps: "terminating", "killing", "lingering"
 
-    def __init__(self, config_path):
+    BATCH_INTERVAL = 0.016 # Seconds, roughly one UI frame
+    BATCH_MAX_LINES = 200
+    STOP_GRACE = 3.0 # Seconds from SIGTERM to SIGKILL (openfortivpn logs out meanwhile)
+    KILL_GRACE = 2.0 # Seconds from SIGKILL until a surviving openfortivpn is reported
+    LINGER_TIMEOUT = 30.0 # Further seconds it is waited for before it is reported as left behind
+
+    def __init__(self, config_text, helper=None):
         super().__init__()
-        self.config_path = config_path
+        self.config_text = config_text
+        self.helper = helper # Optional privileged_helper.HelperClient
+        self.helper_conn = None
+        self.helper_exit_code = None
+        self.fatal_error = None # Set when no gateway can work either (helper unavailable)
         self.process = None
         self._is_running = False
-        # Regex to find: "trusted-cert = <hash>" or "--trusted-cert <hash>"
-        # The log output shows:
-        # ERROR:      trusted-cert = 18b3ca13afe20180d70f1efbb949b9dcafb793d0aae246518b6ef909646f23b8
-        self.cert_regex = re.compile(r"(?:--trusted-cert\s+|trusted-cert\s*=\s*)([a-f0-9]{64})")
-
-    def _is_passwordless_sudo_ok(self):
-        try:
-            # Check specific permission for openfortivpn instead of generic 'true'
-            # This aligns with the restricted sudoers rule.
-            return subprocess.call(
-                ["sudo", "-n", "openfortivpn", "--version"], 
-                stdout=subprocess.DEVNULL, 
-                stderr=subprocess.DEVNULL
-            ) == 0
-        except:
-            return False
+        self._escalation_pid = None # Polled until sudo/pkexec grants root
+        # The tunnel's openfortivpn (root, a child of sudo), found in /proc
+        # when stopping: its end, not the wrapper's, is what disconnects
+        self.tunnel_pid = None
+        self.give_up = False # Set on app exit: stop waiting for a surviving tunnel
+        self.leftover_pid = None # tunnel_pid if it was still running when the runner stopped waiting
+        # Shutdown pipeline: stop() only stamps the request and wakes the
+        # reader, which signals and escalates from this thread (_advance_shutdown)
+        self._stop_at = None
+        self._stop_stage = 0
+        self._wake = socket.socketpair()
 
     def run(self):
         self._is_running = True
         
-        # Check if we are running as root or have passwordless sudo
-        if os.geteuid() == 0:
-            cmd = ["openfortivpn", "-c", self.config_path]
-        elif self._is_passwordless_sudo_ok():
-            cmd = ["sudo", "openfortivpn", "-c", self.config_path]
-        else:
-            cmd = ["pkexec", "openfortivpn", "-c", self.config_path]
-        
-
         try:
+            if self.helper:
+                self._run_via_helper()
+                return
+
+            # Root, passwordless sudo or pkexec, as probed at startup (cached).
+            # The config travels as stdin: sudo closes any other inherited fd.
+            cmd = privileges.wrap_command([privileges.OPENFORTIVPN, "-c", "/proc/self/fd/0"])
+
             # Start the process with pipes for output
-            self.process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT, # Merge stderr into stdout
-                stdin=subprocess.PIPE,    # Enable stdin for graceful close
-                text=True,
-                bufsize=1, # Line buffered
-                preexec_fn=os.setsid 
-            )
-
-            # Read output line by line
-            while self._is_running and self.process.poll() is None:
-                line = self.process.stdout.readline()
-                if line:
-                    line = line.strip()
-                    self.output_received.emit(line)
-                    # Check for cert error
-                    match = self.cert_regex.search(line)
-                    if match:
-                         self.cert_error_detected.emit(match.group(1))
+            fd = config_fd(self.config_text)
+            try:
+                self.process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT, # Merge stderr into stdout
+                    stdin=fd,
+                    bufsize=0, # Raw pipe, read by the selector loop below
+                    preexec_fn=os.setsid 
+                )
+            finally:
+                os.close(fd) # The child holds its own copy
+            self.events_detected.emit([(log_classifier.EVENT_SPAWNED, None)])
+            self._escalation_pid = self.process.pid
+
+            self._pump_output(self.process.stdout.fileno())
             
-            # If process exits
+            # If process exits (bounded once a stop was requested: it may be unkillable)
             if self.process:
-                return_code = self.process.wait()
+                try:
+                    return_code = self.process.wait(timeout=None if self._stop_at is None else self.KILL_GRACE)
+                except subprocess.TimeoutExpired:
+                    return_code = -signal.SIGKILL
                 self.process_finished.emit(return_code)
 
+        except privileged_helper.HelperUnavailable as e:
+            self.fatal_error = str(e)
+            self.process_finished.emit(1)
         except Exception as e:
-            self.output_received.emit(f"Internal Error: {e}")
+            if isinstance(e, PermissionError):
+                privileges.invalidate()
+            self.output_batch.emit([f"Internal Error: {e}"])
             self.process_finished.emit(1)
         finally:
             self._is_running = False
-            # Security Hardening: Ensure config file is deleted
-            if os.path.exists(self.config_path):
-                try:
-                    os.remove(self.config_path)
-                except OSError as e:
-                    self.output_received.emit(f"Warning: Failed to delete temp config: {e}")
+            for sock in self._wake:
+                sock.close() # A late stop() now gets OSError instead of writing anywhere
+
+    def _run_via_helper(self):
+        """Same as run(), but openfortivpn is started by the long-lived helper."""
+        fd = config_fd(self.config_text)
+        try:
+            self.helper_conn = self.helper.open_tunnel(fd)
+        finally:
+            os.close(fd)
+        self.events_detected.emit([(log_classifier.EVENT_SPAWNED, None)])
+        self._pump_output(self.helper_conn.fileno(), decode=self._decode_helper_line)
+        self.helper_conn.close()
+        code = self.helper_exit_code
+        self.process_finished.emit(code if code is not None else 1)
+
+    def _decode_helper_line(self, raw):
+        """Turns a helper JSON message into an output line (or None)."""
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return None
+        if "out" in msg:
+            return msg["out"].strip()
+        if "pid" in msg:
+            # The helper is already root: started means privileged
+            self.events_detected.emit([(log_classifier.EVENT_PRIVILEGE_GRANTED, None)])
+        elif "exit" in msg:
+            self.helper_exit_code = msg["exit"]
+        elif "error" in msg:
+            return f"Helper Error: {msg['error']}"
+        return None
+
+    def _pump_output(self, fd, decode=None):
+        """
+        Event-driven reader: waits on the pipe with a selector and coalesces
+        complete lines into batches, flushed once per frame (BATCH_INTERVAL)
+        or every BATCH_MAX_LINES, whichever comes first.
+        """
+        sel = selectors.DefaultSelector()
+        sel.register(fd, selectors.EVENT_READ)
+        sel.register(self._wake[0], selectors.EVENT_READ)
+        pending = b""
+        batch = []
+        deadline = None
+        try:
+            while self._is_running:
+                if self._escalation_pid and privileges.escalated(self._escalation_pid):
+                    self._escalation_pid = None
+                    self.events_detected.emit([(log_classifier.EVENT_PRIVILEGE_GRANTED, None)])
+                if self._stop_at is not None:
+                    self._advance_shutdown()
+                    if not self._is_running:
+                        break
+
+                if batch:
+                    timeout = max(0.0, deadline - time.monotonic())
+                else:
+                    timeout = 0.1 # Also the granularity of the shutdown escalation
+
+                eof = False
+                ready = [key.fd for key, _ in sel.select(timeout)]
+                if self._wake[0].fileno() in ready:
+                    self._wake[0].recv(64) # stop() was called, handled at the top of the loop
+                if fd in ready:
+                    chunk = os.read(fd, 65536)
+                    if chunk:
+                        pending += chunk
+                        *lines, pending = pending.split(b"\n")
+                        for raw in lines:
+                            line = decode(raw) if decode else raw.decode("utf-8", "replace").strip()
+                            if line is None:
+                                continue
+                            if not batch:
+                                deadline = time.monotonic() + self.BATCH_INTERVAL
+                            batch.append(line)
+                    else:
+                        eof = True
+
+                if batch and (eof or len(batch) >= self.BATCH_MAX_LINES or time.monotonic() >= deadline):
+                    self._flush(batch)
+                    batch = []
+                if eof:
+                    if self._stop_at is None or self._tunnel_gone():
+                        break
+                    sel.unregister(fd) # Closed its output but still running: keep escalating
+
+            if pending and not decode:
+                batch.append(pending.decode("utf-8", "replace").strip())
+            if batch:
+                self._flush(batch)
+        finally:
+            sel.close()
+
+    def _flush(self, batch):
+        """Classifies the batch here, in the reader thread, and hands it to the GUI."""
+        events = log_classifier.classify_lines(batch)
+        self.output_batch.emit(batch)
+        if events:
+            self.events_detected.emit(events)
 
 
     def stop(self):
-        self._is_running = False
-        if self.process:
-            # Try graceful exit by closing stdin (EOF)
-            try:
-                if self.process.stdin:
-                    self.process.stdin.close()
-                    try:
-                        self.process.wait(timeout=2.0)
-                        return # Success, process exited gracefully
-                    except subprocess.TimeoutExpired:
-                        pass # Continue to force kill
-            except Exception:
-                pass
-            
-            # Signal termination
-            try:
-                os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
-            except (ProcessLookupError, PermissionError):
-                # Fallback: Process is likely owned by root (pkexec) and orphaned.
-                # 'pid' points to pkexec, which might have exited or not propagated signal.
-                # Force kill openfortivpn process globally to be safe.
+        """
+        Requests shutdown and returns at once: safe to call from the GUI
+        thread. Progress is reported through stop_progress, the end through
+        process_finished as usual.
+        """
+        if self._stop_at is None:
+            self._stop_at = time.monotonic()
+        try:
+            self._wake[1].send(b"x")
+        except OSError:
+            pass # The reader is already gone
+
+    def _advance_shutdown(self):
+        """
+        Reader thread: SIGTERM to the tunnel's process group on request,
+        SIGKILL after STOP_GRACE. Past KILL_GRACE, waits for the root
+        openfortivpn to be confirmed gone (reported as "lingering"), for
+        up to LINGER_TIMEOUT: then it is left behind as leftover_pid, so
+        the session can report it instead of disconnecting forever. Output
+        keeps being read meanwhile, so the logout lines still show.
+        """
+        elapsed = time.monotonic() - self._stop_at
+        if self._stop_stage == 0:
+            self._stop_stage = 1
+            self.stop_progress.emit("terminating")
+            self._signal_group(signal.SIGTERM)
+        elif self._stop_stage == 1 and elapsed >= self.STOP_GRACE:
+            self._stop_stage = 2
+            self.stop_progress.emit("killing")
+            self._signal_group(signal.SIGKILL)
+        elif self._stop_stage >= 2 and elapsed >= self.STOP_GRACE + self.KILL_GRACE:
+            gone = self._tunnel_gone()
+            if not gone and self._stop_stage == 2:
+                self._stop_stage = 3
+                self.stop_progress.emit("lingering")
+            if not gone and (self.give_up or
+                             elapsed >= self.STOP_GRACE + self.KILL_GRACE + self.LINGER_TIMEOUT):
+                self.leftover_pid = self.tunnel_pid
+            if gone or self.leftover_pid:
+                self._is_running = False
+
+    def _tunnel_gone(self):
+        return not (self.tunnel_pid and privileges.running(self.tunnel_pid))
+
+    def _signal_group(self, sig):
+        if self.helper_conn:
+            # The helper signals the exact PID and escalates to SIGKILL by itself
+            if sig == signal.SIGTERM:
                 try:
-                    if self._is_passwordless_sudo_ok():
-                         subprocess.run(["sudo", "killall", "openfortivpn"], 
-                                        stdout=subprocess.DEVNULL, 
-                                        stderr=subprocess.DEVNULL)
-                    else:
-                        # Use pkexec to ensure we can get a GUI prompt if auth is needed.
-                         subprocess.run(["pkexec", "killall", "openfortivpn"], 
-                                        stdout=subprocess.DEVNULL, 
-                                        stderr=subprocess.DEVNULL)
-                except Exception:
-                    pass 
+                    self.helper_conn.sendall(b'{"cmd": "stop"}\n')
+                except OSError:
+                    pass
+            return
+        if not self.process:
+            return
+        if self.tunnel_pid is None:
+            self.tunnel_pid = privileges.find_process(self.process.pid)
+        name = "KILL" if sig == signal.SIGKILL else "TERM"
+        try:
+            # Started with setsid: the group id is the child's PID
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            # The group is owned by root (pkexec execs in place)
+            self._privileged_kill(self.tunnel_pid or self.process.pid, name)
+        else:
+            # sudo forks: the group leader is the user's sudo, which relays
+            # SIGTERM but not SIGKILL, that only kills sudo itself
+            if sig == signal.SIGKILL and self.tunnel_pid and not privileges.can_signal(self.tunnel_pid):
+                self._privileged_kill(self.tunnel_pid, name)
 
-class VPNManager(QObject):
-    state_changed = Signal(str) # "connected", "disconnected", "connecting", "failover"
+    def _privileged_kill(self, pid, name):
+        """
+        Signals the tunnel's own openfortivpn by PID, never killall: other
+        sessions run theirs. Uses the cached mode: pkexec may prompt, which
+        is fine off the GUI thread. Failures go to the output, so the log
+        says why the tunnel is still running.
+        """
+        if privileges.kill_helper_missing():
+            self.output_batch.emit([
+                f"Falta {privileges.KILL_HELPER}: la regla de sudoers es de una versión anterior. "
+                "Se pide autorización con pkexec; vuelva a ejecutar ./configure_permissions.sh "
+                "para cerrar túneles sin contraseña."])
+        try:
+            result = subprocess.run(privileges.kill_command(pid, name),
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE,
+                                    timeout=60)
+            error = result.stderr.decode("utf-8", "replace").strip() or f"código {result.returncode}"
+            if result.returncode == 0:
+                return
+        except (OSError, subprocess.SubprocessError) as e:
+            error = str(e)
+        self.output_batch.emit([f"No se pudo enviar SIG{name} a openfortivpn (PID {pid}): {error}"])
+
+class VPNSession(QObject):
+    """
+    One tunnel: its runner, failover queue, reconnect backoff, interface,
+    session data and latency monitor. VPNManager keeps one per profile so
+    several tunnels can run side by side.
+    """
+    state_changed = Signal(str) # "connected", "disconnected", "connecting", "failover", "reconnecting", "disconnecting"
     log_message = Signal(str)
+    shutdown_progress = Signal(str) # VPNRunner.stop_progress steps, then "done"
     connection_failed = Signal(str) # Reason
     cert_trust_needed = Signal(str) # Hash
     
     # New signals
     connection_details_received = Signal(dict) # {interface, local_ip, remote_ip, gateway_ip}
     traffic_stats_updated = Signal(int, int) # (rx_bytes, tx_bytes)
+    link_stats_updated = Signal(dict) # rx/tx bytes, packets, errors, drops (see link_stats)
+    traffic_rates_updated = Signal(float, float) # Smoothed (rx_bps, tx_bps), see traffic_history
+    latency_updated = Signal(dict) # In-tunnel RTT percentiles and loss, see latency_monitor
+
+    LATENCY_LOG_EVERY = 12 # Probes between latency summaries in the log (1 min)
 
-    def __init__(self):
+    # Auto-reconnect backoff: base * 2^n seconds, capped, with jitter
+    RECONNECT_BASE_DELAY = 1.0
+    RECONNECT_MAX_DELAY = 60.0
+    RECONNECT_MAX_ATTEMPTS = 8
+
+    def __init__(self, session_id, stats_collector, helper=None, name=None, health=None, dns_cache=None,
+                 archive=None):
         super().__init__()
+        self.session_id = session_id # Profile id
+        self.name = name or session_id # For the log and the UI
+        self.state = "disconnected" # Last state emitted
+        self.state_changed.connect(self._remember_state)
+        # Optional session_archive.SessionArchive: output and events of each
+        # connect_vpn() .. disconnected span, in archive_log
+        self.archive = archive
+        self.archive_log = None
+        self.log_message.connect(self._archive_text)
+        self.connection_failed.connect(self._archive_failure)
+        # Optional privileged_helper.HelperClient shared by every attempt
+        self.helper = helper
+        # Optional gateway_health.GatewayHealth: orders the queue by track record
+        self.health = health
+        # Optional dns_cache.DNSCache filled ahead of time by VPNManager.prefetch_dns
+        self.dns_cache = dns_cache
+        self.connect_by_ip = False
+
         self.runner = None
-        self.connection_queue = [] 
+        self.prober = None
+        self.gateway_queue = [] # Gateway dicts, in attempt order
+        self.index_queue = [] # Profile gateway index of each queue entry
+        self.config_factory = None # callable(gateway_index) -> config text
         self.current_attempt_index = 0
         self.is_user_disconnected = False
+        self.stop_started = None # monotonic() of the disconnect request being served
+        self.last_disconnect_seconds = None # Request to process gone, last disconnect
+        
+        # Auto-reconnect: what is needed to relaunch stays in memory
+        self.auto_reconnect = False
+        self.is_connected = False
+        self.last_good_index = None # Profile gateway index of the last tunnel that came up
+        self.reconnect_attempt = 0
+        self.drop_time = None # monotonic() when the tunnel dropped
+        self.reconnect_timer = QTimer()
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self._reconnect)
+        # Delay before trying the next gateway (stoppable, unlike QTimer.singleShot)
+        self.failover_timer = QTimer()
+        self.failover_timer.setSingleShot(True)
+        self.failover_timer.setInterval(1000)
+        self.failover_timer.timeout.connect(self._start_attempt)
         
-        # Stats monitoring
+        # Stats monitoring (the collector is shared by all sessions, see VPNManager)
         self.vpn_interface = None
-        self.stats_timer = QTimer()
-        self.stats_timer.setInterval(1000)
-        self.stats_timer.timeout.connect(self._read_traffic_stats)
+        self.stats_collector = stats_collector
+        self.traffic_history = TrafficHistory()
+        self.latency_monitor = None
+        self.latency_target = None # host[:port] from the profile, remote IP if empty
+        self._retired_threads = set() # Stopped worker threads still returning
         
-        # IP Regex
-        self.re_interface = re.compile(r"Using interface (ppp\d+|tun\d+)")
-        self.re_local_ip = re.compile(r"local  IP address ([\d\.]+)")
-        self.re_remote_ip = re.compile(r"remote IP address ([\d\.]+)")
+        # Why the current attempt failed, from the classified output (if known)
+        self.last_failure_reason = None
+        # Per-attempt phase breakdown (pkexec vs gateway vs pppd), see connection_timing
+        self.phase_timer = None
+        self.phase_history = PhaseHistory()
         # Note: Gateway IP is usually the one we connect to, or resolved from host.
         
         self.session_data = {
@@ -160,15 +417,142 @@ class VPNManager(QObject):
             "gateway_ip": "N/A"
         }
 
-    def connect_vpn(self, config_paths):
+    def connect_vpn(self, config_factory, gateways, latency_target=None, auto_reconnect=False,
+                    connect_by_ip=False):
+        """
+        config_factory: callable(gateway_index[, address=ip]) -> config text.
+        Called lazily, once per attempt, so only the gateways actually tried
+        get rendered.
+        gateways: the profile's gateway dicts. With more than one, the queue is
+        ordered by past results (see gateway_health), then all are probed in
+        parallel and the unreachable ones move to the back.
+        latency_target: in-tunnel RTT target (host[:port]), remote IP if None.
+        connect_by_ip: hand openfortivpn the cached address of the gateway
+        (the factory gets address=), so it does not resolve it again.
+        """
         if self.runner and self.runner.isRunning():
             return
+        if self.prober and self.prober.isRunning():
+            return
             
-        self.connection_queue = config_paths
+        self.failover_timer.stop()
+        self.reconnect_timer.stop()
+        self.gateway_queue = list(gateways)
+        self.index_queue = list(range(len(self.gateway_queue)))
         self.current_attempt_index = 0
         self.is_user_disconnected = False
+        self.latency_target = latency_target or None
+        self.config_factory = config_factory
+        self.auto_reconnect = auto_reconnect
+        self.connect_by_ip = connect_by_ip
+        self.is_connected = False
+        self.last_good_index = None
+        self.reconnect_attempt = 0
+        self.drop_time = None
         self._reset_session_data()
+        if self.helper:
+            self.helper.reset() # A new request from the user: prompting again is expected
+        if self.archive:
+            self._close_archive_log(self.archive_log)
+            self.archive_log = self.archive.open_session(self.name)
+
+        if len(gateways) > 1:
+            self._order_by_health()
+            self._start_probe()
+        else:
+            self._start_attempt()
+
+    def _remember_state(self, state):
+        self.state = state
+        if not self.archive_log:
+            return
+        if state in (session_archive.EVENT_FAILOVER, session_archive.EVENT_RECONNECTING):
+            self.archive_log.event(state)
+        elif state == "disconnected":
+            # Next loop iteration: connection_failed and late messages follow this state
+            log = self.archive_log
+            QTimer.singleShot(0, lambda: self._close_archive_log(log))
+
+    def _archive_text(self, text):
+        if self.archive_log:
+            self.archive_log.write(text)
+
+    def _archive_failure(self, reason):
+        if self.archive_log:
+            self.archive_log.write(f"Conexión fallida: {reason}") # The line the event points at
+            self.archive_log.event(session_archive.EVENT_CONNECTION_FAILED, reason)
+
+    def _close_archive_log(self, log):
+        if log is not None and log is self.archive_log:
+            self.archive_log = None
+            log.close()
+
+    def is_active(self):
+        """True from connect_vpn() until the session is back to disconnected."""
+        return self.state != "disconnected" or bool(self.runner or self.prober)
+
+    def current_gateway(self):
+        """Gateway dict of the current attempt (None if unknown)."""
+        if self.current_attempt_index < len(self.gateway_queue):
+            return self.gateway_queue[self.current_attempt_index]
+        return None
+
+    def current_gateway_index(self):
+        """Profile gateway index of the current attempt (None if unknown)."""
+        if self.current_attempt_index < len(self.index_queue):
+            return self.index_queue[self.current_attempt_index]
+        return None
+
+    def _order_by_health(self):
+        if not self.health:
+            return
+        order = self.health.order(self.gateway_queue)
+        self.gateway_queue = [self.gateway_queue[i] for i in order]
+        self.index_queue = [self.index_queue[i] for i in order]
+        for index, gateway in zip(self.index_queue, self.gateway_queue):
+            summary = self.health.summary(gateway)
+            if summary:
+                self.log_message.emit(f"Historial gateway #{index + 1} ({gateway['host']}): {summary}")
+
+    def _start_probe(self):
+        self.state_changed.emit("connecting")
+        self.log_message.emit(f"Sondeando {len(self.gateway_queue)} gateways en paralelo...")
+        self.prober = GatewayProber(self.gateway_queue, dns_cache=self.dns_cache)
+        self.prober.probe_finished.connect(self._on_probe_finished)
+        self.prober.finished.connect(self._on_prober_finished)
+        self.prober.start()
+
+    def _on_probe_finished(self, results):
+        for r in results:
+            if r['ok']:
+                self.log_message.emit(
+                    f"Gateway #{r['index'] + 1} ({r['host']}:{r['port']}): "
+                    f"TCP {r['tcp_ms']:.0f} ms, TLS {r['tls_ms']:.0f} ms")
+            else:
+                self.log_message.emit(
+                    f"Gateway #{r['index'] + 1} ({r['host']}:{r['port']}): sin respuesta ({r['error']})")
+
+        if self.is_user_disconnected:
+            return
+
+        # Reorder the failover queue: unreachable last, then degraded ones (see
+        # gateway_health); within each bucket the measured latency (the
+        # probe's order) decides, so the fastest healthy gateway goes first
+        order = [r['index'] for r in results] # Already fastest first, unreachable last
+        if self.health:
+            reachable = {r['index'] for r in results if r['ok']}
+            now = time.time()
+            degraded = {i for i in order if self.health.degraded(self.gateway_queue[i], now)}
+            order.sort(key=lambda i: (i not in reachable, i in degraded))
+        self.gateway_queue = [self.gateway_queue[i] for i in order]
+        self.index_queue = [self.index_queue[i] for i in order]
         self._start_attempt()
+
+    def _on_prober_finished(self):
+        thread_refs.release(self.sender())
+        self.prober = None
+        if self.is_user_disconnected and not self.runner:
+            self.state_changed.emit("disconnected") # Disconnected while probing
         
     def _reset_session_data(self):
         self.session_data = {
@@ -177,99 +561,204 @@ class VPNManager(QObject):
             "remote_ip": "N/A",
             "gateway_ip": "N/A"
         }
-        self.vpn_interface = None
-        self.stats_timer.stop()
+        self._stop_stats()
+        self.traffic_history.reset()
         self.traffic_stats_updated.emit(0, 0)
+        self.traffic_rates_updated.emit(0.0, 0.0)
 
     # ... _start_attempt, disconnect_vpn ... keep as is but verify later
     def _start_attempt(self):
-        if self.current_attempt_index >= len(self.connection_queue):
+        if self.is_user_disconnected:
+            return # Disconnected while waiting for the failover delay
+        if self.current_attempt_index >= len(self.gateway_queue):
+            if self.drop_time is not None and self._schedule_reconnect():
+                return # Still restoring a dropped tunnel: next backoff round
             self.state_changed.emit("disconnected")
             self.connection_failed.emit("Todos los gateways fallaron.")
             return
 
-        config_path = self.connection_queue[self.current_attempt_index]
+        gateway = self.current_gateway()
+        address = None
+        if self.connect_by_ip and self.dns_cache and gateway:
+            address = self.dns_cache.address(gateway['host']) # None on a miss: openfortivpn resolves
+        try:
+            index = self.index_queue[self.current_attempt_index]
+            config_text = self.config_factory(index, address=address) if address else self.config_factory(index)
+        except Exception as e:
+            self.log_message.emit(f"No se pudo generar la configuración: {e}")
+            self.drop_time = None
+            self.state_changed.emit("disconnected")
+            self.connection_failed.emit(str(e))
+            return
+
         self.state_changed.emit("connecting")
         
-        # Try to extract host for "Gateway IP" display (approximate)
-        # We can pass plain host if needed, but parsing from file is tricky here.
-        # Let's assume we can get it later or update UI with config data separately.
-        self.log_message.emit(f"Intentando conectar con gateway #{self.current_attempt_index + 1}...")
+        if gateway:
+            self.session_data["gateway_ip"] = address or gateway['host']
+            target = f"{gateway['host']} [{address}]" if address else gateway['host']
+            self.log_message.emit(f"Intentando conectar con {target}:{gateway.get('port', 443)} "
+                                  f"(intento {self.current_attempt_index + 1}/{len(self.gateway_queue)})...")
+        else:
+            self.log_message.emit(f"Intentando conectar con gateway #{self.current_attempt_index + 1}...")
 
-        self.runner = VPNRunner(config_path)
-        self.runner.output_received.connect(self._on_output)
+        self.last_failure_reason = None
+        self.phase_timer = PhaseTimer(gateway['host'] if gateway else None)
+        self.runner = VPNRunner(config_text, helper=self.helper)
+        self.runner.output_batch.connect(self._on_output_batch)
+        self.runner.events_detected.connect(self._on_events)
         self.runner.process_finished.connect(self._on_finished)
-        self.runner.cert_error_detected.connect(self._on_cert_error)
+        self.runner.stop_progress.connect(self._on_stop_progress)
         self.runner.finished.connect(self._on_thread_finished)
         self.runner.start()
 
     def disconnect_vpn(self):
         self.is_user_disconnected = True
-        self.stats_timer.stop()
-        if self.runner:
+        self.failover_timer.stop()
+        self.reconnect_timer.stop()
+        self.drop_time = None
+        self._stop_stats()
+        if self.prober and self.prober.isRunning():
+            # A running probe cannot be interrupted (bounded by its timeouts)
+            # and connect_vpn() refuses to start until it is done: report
+            # "disconnected" only from _on_prober_finished
+            self.state_changed.emit("disconnecting")
+        elif self.runner and self.runner.isRunning():
+            # Never blocks: the runner signals and escalates from its own thread.
+            # "disconnected" follows from _on_finished once the process is gone.
+            if self.stop_started is None:
+                self.stop_started = time.monotonic()
             self.runner.stop()
-            # Wait for thread to finish via signal
-        self.state_changed.emit("disconnected")
-        # Do not cleanup configs yet, wait for process to die and thread to finish
-
-    def _cleanup_all_configs(self):
-        """Securely remove all config files in the queue."""
-        for path in self.connection_queue:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except OSError:
-                    pass
+            self.state_changed.emit("disconnecting")
+        else:
+            self.state_changed.emit("disconnected")
 
     def blocking_stop(self):
         """Stops and waits for the thread to finish. Used on app exit."""
         self.disconnect_vpn()
+        if self.prober:
+            self.prober.wait() # Bounded by the probe timeouts
         if self.runner:
-            self.runner.wait(2000) # Wait up to 2 seconds
+            # Bounded by the shutdown pipeline (usually well under a second).
+            # Exiting, so an openfortivpn that survives SIGKILL is left behind.
+            self.runner.give_up = True
+            self.runner.wait(int((VPNRunner.STOP_GRACE + VPNRunner.KILL_GRACE + 1) * 1000))
+        for thread in list(self._retired_threads):
+            thread.wait(3000)
+        self._close_archive_log(self.archive_log) # The loop may not run the deferred close
 
-    def _on_output(self, text):
-        self.log_message.emit(text)
-        
-        # Parse Info
-        m_iface = self.re_interface.search(text)
-        if m_iface:
-            self.session_data["interface"] = m_iface.group(1)
-            self.vpn_interface = m_iface.group(1)
-            
-        m_local = self.re_local_ip.search(text)
-        if m_local:
-            self.session_data["local_ip"] = m_local.group(1)
-            
-        m_remote = self.re_remote_ip.search(text)
-        if m_remote:
-            self.session_data["remote_ip"] = m_remote.group(1)
-
-        if "Tunnel is up and running" in text:
-            self.state_changed.emit("connected")
-            self.connection_details_received.emit(self.session_data)
-            if self.vpn_interface:
-                self.stats_timer.start()
-
-    def _read_traffic_stats(self):
-        if not self.vpn_interface:
+    def _on_output_batch(self, lines):
+        # One log update per batch instead of one per line
+        self.log_message.emit("\n".join(lines))
+
+    def _on_events(self, events):
+        """Structured events classified by the runner (see log_classifier)."""
+        now = time.monotonic()
+        for event, value in events:
+            if self.phase_timer:
+                self.phase_timer.mark(event, now)
+            if self.archive_log and event in session_archive.ARCHIVED_EVENTS:
+                self.archive_log.event(event, value)
+
+            if event == log_classifier.EVENT_INTERFACE:
+                self.session_data["interface"] = value
+                self.vpn_interface = value
+            elif event == log_classifier.EVENT_LOCAL_IP:
+                self.session_data["local_ip"] = value
+            elif event == log_classifier.EVENT_REMOTE_IP:
+                self.session_data["remote_ip"] = value
+            elif event == log_classifier.EVENT_TUNNEL_UP:
+                self.is_connected = True
+                self.last_good_index = self.index_queue[self.current_attempt_index]
+                if self.drop_time is not None:
+                    self.log_message.emit(
+                        f"Conexión restaurada en {time.monotonic() - self.drop_time:.1f} s "
+                        f"({self.reconnect_attempt} intento(s) de reconexión)")
+                    self.drop_time = None
+                    self.reconnect_attempt = 0
+                self._record_phases(ok=True)
+                self.state_changed.emit("connected")
+                self.connection_details_received.emit(self.session_data)
+                if self.vpn_interface:
+                    self.stats_collector.watch(self.vpn_interface)
+                self._start_latency_monitor()
+            elif event == log_classifier.EVENT_PERMISSION_DENIED:
+                # The cached privilege mode is stale (e.g. sudoers rule removed)
+                self.last_failure_reason = event
+                privileges.invalidate()
+            elif event == log_classifier.EVENT_CERT_ERROR:
+                self._on_cert_error(value)
+                return # Runner is being stopped, ignore the rest of the batch
+            elif event in log_classifier.FAILURE_EVENTS:
+                self.last_failure_reason = event
+
+    def _on_stop_progress(self, step):
+        if step == "terminating":
+            self.log_message.emit("Cerrando el túnel (SIGTERM)...")
+        elif step == "killing":
+            self.log_message.emit(f"openfortivpn no terminó en {VPNRunner.STOP_GRACE:.0f} s, forzando el cierre (SIGKILL)...")
+        elif step == "lingering":
+            pid = self.runner.tunnel_pid if self.runner else None
+            self.log_message.emit(f"openfortivpn (PID {pid}) sigue en ejecución tras SIGKILL, "
+                                  f"se espera hasta {VPNRunner.LINGER_TIMEOUT:.0f} s a que termine.")
+        self.shutdown_progress.emit(step)
+
+    def _record_phases(self, ok):
+        """Logs the attempt's phase breakdown and keeps it in the history."""
+        timer, self.phase_timer = self.phase_timer, None
+        if not timer or not timer.marks:
             return
-            
-        rx_path = f"/sys/class/net/{self.vpn_interface}/statistics/rx_bytes"
-        tx_path = f"/sys/class/net/{self.vpn_interface}/statistics/tx_bytes"
-        
-        try:
-            rx = 0
-            tx = 0
-            if os.path.exists(rx_path):
-                with open(rx_path, "r") as f:
-                    rx = int(f.read().strip())
-            if os.path.exists(tx_path):
-                with open(tx_path, "r") as f:
-                    tx = int(f.read().strip())
-            
-            self.traffic_stats_updated.emit(rx, tx)
-        except:
-            pass # Interface might be gone or perm issue
+        record = timer.record(ok)
+        self.phase_history.add(record)
+        self.log_message.emit(format_record(record))
+        gateway = self.current_gateway()
+        # Rejected credentials say nothing about the gateway itself
+        if self.health and gateway and self.last_failure_reason != log_classifier.EVENT_AUTH_FAILURE:
+            self.health.record(gateway, ok, record["total"], None if ok else self.last_failure_reason)
+
+    def _stop_stats(self):
+        if self.vpn_interface:
+            self.stats_collector.unwatch(self.vpn_interface)
+        self.vpn_interface = None
+        if self.latency_monitor:
+            # Keep a reference until the thread returns (a probe may be in flight)
+            self.latency_monitor.stop()
+            thread_refs.keep_until_finished(self.latency_monitor, self._retired_threads)
+            self.latency_monitor = None
+
+    def _start_latency_monitor(self):
+        target = self.latency_target
+        if not target and self.session_data["remote_ip"] != "N/A":
+            target = self.session_data["remote_ip"]
+        if not target:
+            return
+        self.latency_monitor = LatencyMonitor(target)
+        self.latency_monitor.latency_updated.connect(self._on_latency_updated)
+        self.latency_monitor.start()
+        self.log_message.emit(f"Monitor de latencia iniciado ({target})")
+
+    def _on_latency_updated(self, data):
+        if self.sender() is not self.latency_monitor:
+            return # Late result from a monitor already stopped
+        self.latency_updated.emit(data)
+        # Summary in the log once a minute, not on every probe
+        if data["sent"] % self.LATENCY_LOG_EVERY == 0:
+            if data["p50"] is None:
+                self.log_message.emit(f"Latencia túnel: sin respuesta de {data['target']} "
+                                      f"(pérdida {data['loss_pct']:.0f}%)")
+            else:
+                self.log_message.emit(
+                    f"Latencia túnel: p50 {data['p50']:.1f} ms, p95 {data['p95']:.1f} ms, "
+                    f"p99 {data['p99']:.1f} ms, pérdida {data['loss_pct']:.1f}% ({data['sent']} sondeos)")
+
+    def handle_stats_sample(self, sample):
+        """One tick of the shared collector: {iface: counters} for every tunnel."""
+        counters = sample.get(self.vpn_interface) if self.vpn_interface else None
+        if not counters:
+            return # Interface might be gone
+        self.traffic_stats_updated.emit(counters["rx_bytes"], counters["tx_bytes"])
+        self.link_stats_updated.emit(counters)
+        if self.traffic_history.add_sample(time.monotonic(), counters["rx_bytes"], counters["tx_bytes"]):
+            self.traffic_rates_updated.emit(self.traffic_history.rx_ewma, self.traffic_history.tx_ewma)
             
     def _on_cert_error(self, cert_hash):
         self.is_user_disconnected = True 
@@ -277,25 +766,184 @@ class VPNManager(QObject):
             self.runner.stop()
         self.state_changed.emit("disconnected")
         self.cert_trust_needed.emit(cert_hash)
-        # Cleanup will happen in _on_finished
 
     def _on_finished(self, code):
         # Do not nullify runner yet, wait for thread finished
-        self.stats_timer.stop()
+        self._stop_stats()
         
+        was_connected = self.is_connected
+        self.is_connected = False
         if self.is_user_disconnected:
+            self.phase_timer = None # Aborted on purpose, not a slow or failed attempt
+        else:
+            self._record_phases(ok=False) # No-op if the tunnel came up
+        leftover = self.runner.leftover_pid if self.runner else None
+        if self.stop_started is not None:
+            self.last_disconnect_seconds = time.monotonic() - self.stop_started
+            self.stop_started = None
+            if not leftover:
+                self.log_message.emit(f"Túnel cerrado en {self.last_disconnect_seconds * 1000:.0f} ms.")
+            self.shutdown_progress.emit("done")
+
+        if self.is_user_disconnected:
+            self.state_changed.emit("disconnected")
+            if leftover:
+                # Disconnected so the profile can be used again, but the old
+                # tunnel may still hold its routes: say so
+                reason = (f"openfortivpn (PID {leftover}) no terminó ni con SIGKILL y sigue en ejecución. "
+                          f"Ciérrelo manualmente (sudo kill -KILL {leftover}) antes de volver a conectar.")
+                self.log_message.emit(reason)
+                self.connection_failed.emit(reason)
+        elif was_connected and self.auto_reconnect:
+            # The tunnel was up and dropped: restore it instead of giving up
+            self.drop_time = time.monotonic()
+            self.reconnect_attempt = 0
+            self.log_message.emit(f"El túnel se cayó (código {code}).")
+            if not self._schedule_reconnect():
+                self.state_changed.emit("disconnected")
+                self.connection_failed.emit("No se pudo restablecer la conexión.")
+        elif self.runner and self.runner.fatal_error:
+            # Not this gateway's fault: the others would fail the same way
+            self.log_message.emit(self.runner.fatal_error)
+            self.drop_time = None
             self.state_changed.emit("disconnected")
-            self._cleanup_all_configs()
+            self.connection_failed.emit(self.runner.fatal_error)
         elif code != 0:
-            self.log_message.emit(f"Gateway falló con código {code}. Intentando siguiente...")
+            reason = f" ({self.last_failure_reason})" if self.last_failure_reason else ""
+            self.log_message.emit(f"Gateway falló con código {code}{reason}. Intentando siguiente...")
             self.state_changed.emit("failover")
             self.current_attempt_index += 1
-            QTimer.singleShot(1000, self._start_attempt)
+            self.failover_timer.start()
         else:
             self.state_changed.emit("disconnected")
-            self._cleanup_all_configs()
 
     def _on_thread_finished(self):
-        self.runner = None
+        runner = self.sender()
+        thread_refs.release(runner)
+        if runner is None or runner is self.runner:
+            self.runner = None
+
+    def _schedule_reconnect(self):
+        """Arms the next reconnect round. Returns False when giving up."""
+        if self.last_failure_reason == log_classifier.EVENT_AUTH_FAILURE:
+            self.log_message.emit("Reconexión cancelada: el gateway rechazó las credenciales.")
+            self.drop_time = None
+            return False
+        if self.reconnect_attempt >= self.RECONNECT_MAX_ATTEMPTS:
+            self.log_message.emit(f"Reconexión abandonada tras {self.reconnect_attempt} intentos.")
+            self.drop_time = None
+            return False
+
+        delay = min(self.RECONNECT_MAX_DELAY, self.RECONNECT_BASE_DELAY * 2 ** self.reconnect_attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2) # Jitter: spread clients after a shared outage
+        self.reconnect_attempt += 1
+        self.state_changed.emit("reconnecting")
+        self.log_message.emit(f"Reconectando en {delay:.1f} s "
+                              f"(intento {self.reconnect_attempt}/{self.RECONNECT_MAX_ATTEMPTS})...")
+        self.reconnect_timer.start(int(delay * 1000))
+        return True
 
+    def _reconnect(self):
+        if self.is_user_disconnected:
+            return
+        # Last good gateway first, then the rest in their current order
+        order = list(self.index_queue)
+        if self.last_good_index in order:
+            order.remove(self.last_good_index)
+            order.insert(0, self.last_good_index)
+
+        gateways = dict(zip(self.index_queue, self.gateway_queue))
+        self.gateway_queue = [gateways[i] for i in order]
+        self.index_queue = order
+        self.current_attempt_index = 0
+        self._reset_session_data()
+        self._start_attempt()
+
+
+class VPNManager(QObject):
+    """
+    Runs independent tunnels in parallel, one VPNSession per profile.
+    A single LinkStatsCollector samples every tunnel interface with one
+    read of /proc/net/dev per tick, whatever the number of tunnels.
+    """
+    session_added = Signal(object) # VPNSession, emitted once per profile
+    dns_resolved = Signal(list) # DNSPrefetcher results, see dns_cache
+
+    def __init__(self, helper=None, health=None, archive=None):
+        super().__init__()
+        # Resolve root/sudo/pkexec once, off the GUI thread
+        privileges.probe_in_background()
+        self.helper = helper # Optional privileged_helper.HelperClient shared by every session
+        self.health = health # Optional gateway_health.GatewayHealth shared by every session
+        self.archive = archive # Optional session_archive.SessionArchive shared by every session
+        self.dns_cache = DNSCache()
+        self._prefetchers = set() # Running DNSPrefetcher threads
+        self._resolving = set() # Hosts they are looking up
+        self.sessions = {} # Profile id -> VPNSession
+        self.stats_collector = LinkStatsCollector(interval=1.0)
+        self.stats_collector.stats_sampled.connect(self._on_stats_sampled)
+
+    def session(self, session_id, name=None):
+        """Session of a profile, created on first use."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = VPNSession(session_id, self.stats_collector, helper=self.helper, name=name,
+                                 health=self.health, dns_cache=self.dns_cache, archive=self.archive)
+            self.sessions[session_id] = session
+            self.session_added.emit(session)
+        elif name:
+            session.name = name
+        return session
+
+    def active_sessions(self):
+        return [s for s in self.sessions.values() if s.is_active()]
+
+    def connect_vpn(self, session_id, config_factory, gateways, name=None, **options):
+        """Starts (or keeps) the tunnel of one profile; see VPNSession.connect_vpn."""
+        session = self.session(session_id, name)
+        self.prefetch_dns(gateways) # Usually done already, when the profile was selected
+        session.connect_vpn(config_factory, gateways, **options)
+        return session
+
+    def prefetch_dns(self, gateways):
+        """Resolves, in the background, the gateway hosts not cached (or expired) yet."""
+        hosts = [h for h in self.dns_cache.missing(g['host'] for g in gateways) if h not in self._resolving]
+        if not hosts:
+            return
+        prefetcher = DNSPrefetcher(self.dns_cache, hosts)
+        prefetcher.resolved.connect(self.dns_resolved)
+        prefetcher.finished.connect(lambda: self._on_prefetcher_finished(prefetcher))
+        self._prefetchers.add(prefetcher)
+        self._resolving.update(hosts)
+        prefetcher.start()
+
+    def _on_prefetcher_finished(self, prefetcher):
+        thread_refs.release(prefetcher)
+        self._prefetchers.discard(prefetcher)
+        self._resolving.difference_update(prefetcher.hosts)
+
+    def disconnect_vpn(self, session_id=None):
+        """Disconnects one session, or all of them when session_id is None."""
+        if session_id is not None:
+            if session_id in self.sessions:
+                self.sessions[session_id].disconnect_vpn()
+            return
+        for session in self.active_sessions():
+            session.disconnect_vpn()
+
+    def blocking_stop(self):
+        """Stops every session and waits for their threads. Used on app exit."""
+        self.disconnect_vpn() # All shutdown pipelines run in parallel, then wait for each
+        for session in self.sessions.values():
+            session.blocking_stop()
+        self.stats_collector.wait(2000)
+        for prefetcher in list(self._prefetchers):
+            prefetcher.wait() # Bounded by the resolver timeout
+        if self.health:
+            self.health.flush() # Attempts recorded by the sessions just stopped
+        if self.archive:
+            self.archive.stop() # Writes the logs the sessions just closed
 
+    def _on_stats_sampled(self, sample):
+        for session in self.sessions.values():
+            session.handle_stats_sample(sample)